@@ -0,0 +1,192 @@
+"""
+Admission control for the device ingest path.
+
+nginx limits requests per client IP, but behind a ward's NAT every ESP32
+shares one address, so one device stuck in a send loop could use up the
+whole ward's allowance. Here each device_id has its own token bucket
+(INGEST_DEVICE_RATE per second, bursts of INGEST_DEVICE_BURST), and at most
+INGEST_MAX_CONCURRENCY ingest requests run at once per worker; the rest wait
+up to INGEST_QUEUE_TIMEOUT for a slot. Readings that carry an emergency flag
+(fall, emergency button) skip both checks, as does /api/emergency_event.
+
+The buckets live in process memory, or in Redis when INGEST_REDIS_URL is set
+so every worker shares them (requires the `redis` package). If Redis is
+unreachable, requests are admitted rather than dropped.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request
+
+from metrics import metrics
+
+INGEST_DEVICE_RATE = float(os.getenv('INGEST_DEVICE_RATE', 0.5))
+INGEST_DEVICE_BURST = float(os.getenv('INGEST_DEVICE_BURST', 10))
+INGEST_MAX_CONCURRENCY = int(os.getenv('INGEST_MAX_CONCURRENCY', 32))
+INGEST_QUEUE_TIMEOUT = float(os.getenv('INGEST_QUEUE_TIMEOUT', 0.5))
+INGEST_REDIS_URL = os.getenv('INGEST_REDIS_URL')
+
+# Payload flags that make a reading an emergency
+EMERGENCY_FLAGS = ('fall_detected', 'emergency_button_pressed')
+
+# device_id and a truthy emergency flag, found in the raw body without decoding it
+_DEVICE_ID = re.compile(rb'"device_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_EMERGENCY_FLAG = re.compile(rb'"(?:fall_detected|emergency_button_pressed)"\s*:\s*(?!\s|false|null|0(?:\.0+)?\b(?!\.)|"")')
+
+QUEUE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def peek_payload(body):
+    """
+    (device_id, is_emergency) of a raw JSON reading without decoding the whole
+    body; falls back to json.loads for bodies the patterns don't cover.
+    An emergency flag with any value but false/null/0/"" counts as set.
+    """
+    match = _DEVICE_ID.search(body)
+    if match is None or b'\\' in match.group(1):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None, False
+        if not isinstance(data, dict):
+            return None, False
+        return data.get('device_id'), any(data.get(flag) for flag in EMERGENCY_FLAGS)
+    return match.group(1).decode(), _EMERGENCY_FLAG.search(body) is not None
+
+
+class TokenBuckets:
+    """In-process token bucket per key"""
+
+    def __init__(self, rate=INGEST_DEVICE_RATE, burst=INGEST_DEVICE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + 60
+
+    def try_acquire(self, key):
+        """(allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if now >= self._next_sweep:
+                self._sweep(now)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+
+    def _sweep(self, now):
+        # Buckets idle long enough to be full again are the same as missing ones
+        refill = self.burst / self.rate
+        self._buckets = {key: state for key, state in self._buckets.items() if now - state[1] < refill}
+        self._next_sweep = now + 60
+
+
+class RedisTokenBuckets:
+    """Token bucket per key shared by all workers through Redis"""
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, rate=INGEST_DEVICE_RATE, burst=INGEST_DEVICE_BURST, prefix='ingest:bucket:'):
+        import redis
+
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._script = self._client.register_script(self.SCRIPT)
+        self._errors = metrics.registry.counter(
+            'ingest_rate_limit_backend_errors_total', 'Rate limit checks admitted because Redis failed')
+
+    def try_acquire(self, key):
+        try:
+            allowed, tokens = self._script(keys=[f'{self.prefix}{key}'], args=[self.rate, self.burst, time.time()])
+        except Exception as e:
+            self._errors.inc()
+            print(f'Rate limit backend error, admitting: {e}')
+            return True, 0.0
+        return bool(allowed), 0.0 if allowed else (1 - float(tokens)) / self.rate
+
+
+class AdmissionControl:
+    def __init__(self, buckets, max_concurrency=INGEST_MAX_CONCURRENCY, queue_timeout=INGEST_QUEUE_TIMEOUT):
+        self.buckets = buckets
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._decisions = metrics.registry.counter(
+            'ingest_admission_total', 'Ingest requests by admission decision', ('endpoint', 'decision'))
+        self._queue_time = metrics.registry.histogram(
+            'ingest_admission_queue_seconds', 'Time ingest requests wait for a concurrency slot', ('endpoint',),
+            buckets=QUEUE_BUCKETS)
+        self._in_flight = metrics.registry.gauge('ingest_in_flight', 'Ingest requests currently running')
+
+    def _reject(self, endpoint, decision, message, retry_after):
+        self._decisions.inc(endpoint, decision)
+        response = jsonify({'error': message, 'retry_after': round(retry_after, 1)})
+        response.headers['Retry-After'] = str(max(1, round(retry_after)))
+        return response, 429 if decision == 'rate_limited' else 503
+
+    def limit_ingest(self, view):
+        """Decorator for device ingest views: per-device rate limit plus the concurrency limit"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            endpoint = request.endpoint
+            # Peek instead of get_json: with the ingest pipeline the body is decoded in a worker process
+            device_id, emergency = peek_payload(request.get_data())
+            if emergency:
+                self._decisions.inc(endpoint, 'exempt')
+                return view(*args, **kwargs)
+
+            allowed, retry_after = self.buckets.try_acquire(str(device_id))
+            if not allowed:
+                return self._reject(endpoint, 'rate_limited', 'Device is sending too fast', retry_after)
+
+            started = time.perf_counter()
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+            self._queue_time.observe(endpoint, value=time.perf_counter() - started)
+            if not acquired:
+                return self._reject(endpoint, 'overloaded', 'Ingest is overloaded', self.queue_timeout)
+
+            self._decisions.inc(endpoint, 'admitted')
+            self._in_flight.inc()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self._in_flight.dec()
+                self._slots.release()
+        return wrapper
+
+
+def _buckets():
+    if INGEST_REDIS_URL:
+        return RedisTokenBuckets(INGEST_REDIS_URL)
+    return TokenBuckets()
+
+
+# Create global admission control instance
+admission_control = AdmissionControl(_buckets())
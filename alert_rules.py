@@ -0,0 +1,140 @@
+"""
+Alert rules applied to every sensor reading.
+
+The same rules are used by /api/sensor_data (one reading at a time, with
+messages) and by replay.py (NumPy columns of historical readings), so a rule
+change can be checked against history before it ships. Thresholds can be
+loaded from a JSON file to try new values:
+
+    {"heart_rate": {"warning": [60, 100], "critical": [40, 120]},
+     "oxygen_saturation": {"warning": [95, null], "critical": [90, null]}}
+
+A bound of null means no limit on that side. The level of a reading is the
+most severe level any rule gives it.
+"""
+
+import json
+
+LEVELS = ('normal', 'warning', 'critical')
+NORMAL, WARNING, CRITICAL = range(3)
+
+# field: (message, warning (low, high), critical (low, high) or None)
+DEFAULT_THRESHOLDS = {
+    'heart_rate': ('Nhịp tim: {} bpm', (60, 100), (40, 120)),                      # MH-ETLive
+    'body_temperature': ('Nhiệt độ cơ thể: {}°C', (36, 38), (35, 39)),              # DS18B20
+    'oxygen_saturation': ('Độ bão hòa oxy: {}%', (95, None), (90, None)),           # MH-ETLive
+    'room_temperature': ('Nhiệt độ phòng: {}°C', (18, 30), None),                   # DHT11
+    'humidity': ('Độ ẩm phòng: {}%', (30, 70), None),                               # DHT11
+}
+
+# Readings columns the rules look at
+FIELDS = tuple(DEFAULT_THRESHOLDS) + ('ecg_value', 'ecg_leads_connected', 'fall_detected', 'emergency_button_pressed')
+
+
+def _outside(value, bounds):
+    low, high = bounds
+    return (low is not None and value < low) or (high is not None and value > high)
+
+
+class AlertRules:
+    def __init__(self, thresholds=None):
+        self.thresholds = dict(thresholds or DEFAULT_THRESHOLDS)
+
+    @classmethod
+    def from_file(cls, path):
+        """Default rules with the thresholds in the JSON file replaced"""
+        with open(path) as f:
+            overrides = json.load(f)
+        thresholds = dict(DEFAULT_THRESHOLDS)
+        for field, limits in overrides.items():
+            if field not in thresholds:
+                raise ValueError(f"No alert rule for '{field}'")
+            message, warning, critical = thresholds[field]
+            warning = tuple(limits.get('warning', warning))
+            critical = limits.get('critical', critical)
+            thresholds[field] = (message, warning, tuple(critical) if critical is not None else None)
+        return cls(thresholds)
+
+    def evaluate(self, reading, reported=()):
+        """
+        (alert_level, is_emergency, messages) of one reading dict. Falls and
+        emergency-button presses in `reported` (already raised through the
+        emergency lane) still set the level but add no message.
+        """
+        level = NORMAL
+        is_emergency = False
+        messages = []
+
+        for field, (message, warning, critical) in self.thresholds.items():
+            value = reading.get(field)
+            if not value:
+                continue
+            if _outside(value, warning):
+                level = max(level, WARNING)
+                messages.append(message.format(value))
+            if critical is not None and _outside(value, critical):
+                level = CRITICAL
+                is_emergency = True
+
+        # ECG (AD8232): leads attached but no signal
+        if reading.get('ecg_leads_connected') and not reading.get('ecg_value'):
+            level = max(level, WARNING)
+            messages.append("Điện cực ECG bị ngắt kết nối")
+
+        if reading.get('fall_detected'):
+            level = CRITICAL
+            is_emergency = True
+            if 'fall' not in reported:
+                messages.append(f"Phát hiện té ngã (độ tin cậy: {reading.get('fall_confidence') or 0:.1%})")
+
+        if reading.get('emergency_button_pressed'):
+            level = CRITICAL
+            is_emergency = True
+            if 'emergency_button' not in reported:
+                messages.append("Nút cảnh báo khẩn cấp được nhấn")
+
+        return LEVELS[level], is_emergency, messages
+
+    def evaluate_columns(self, columns):
+        """
+        Vectorized evaluate() over {field: array} of many readings (NaN for NULL
+        numbers); returns (level codes int8 array, is_emergency bool array)
+        """
+        import numpy as np
+
+        size = len(next(iter(columns.values())))
+        level = np.zeros(size, dtype=np.int8)
+        is_emergency = np.zeros(size, dtype=bool)
+
+        def present(field):
+            values = columns[field]
+            return values, ~np.isnan(values) & (values != 0)
+
+        def outside(values, bounds):
+            low, high = bounds
+            result = np.zeros(size, dtype=bool)
+            if low is not None:
+                result |= values < low
+            if high is not None:
+                result |= values > high
+            return result
+
+        for field, (_, warning, critical) in self.thresholds.items():
+            values, has_value = present(field)
+            level = np.where(has_value & outside(values, warning), np.maximum(level, WARNING), level)
+            if critical is not None:
+                hit = has_value & outside(values, critical)
+                level = np.where(hit, CRITICAL, level)
+                is_emergency |= hit
+
+        _, has_ecg = present('ecg_value')
+        level = np.where(columns['ecg_leads_connected'] & ~has_ecg, np.maximum(level, WARNING), level)
+
+        flagged = columns['fall_detected'] | columns['emergency_button_pressed']
+        level = np.where(flagged, CRITICAL, level).astype(np.int8)
+        is_emergency |= flagged
+        return level, is_emergency
+
+
+# Rules used by the ingest path
+alert_rules = AlertRules()
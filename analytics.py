@@ -0,0 +1,298 @@
+"""
+Population analytics over sensor reading history.
+
+A time range of readings for many patients is streamed from the database
+(server-side cursor, ORDER BY patient_id, timestamp so the rows come off the
+(patient_id, timestamp, id) index already grouped) as chunks of NumPy columns,
+and vectorized accumulators fold each chunk in, so memory stays bounded by the
+chunk size and the number of groups however many readings the range holds:
+    - threshold episodes per patient ("SpO2 dips under 92%")
+    - per-bucket averages grouped by room or patient ("hourly average HR per room")
+Results are cached per query for ANALYTICS_CACHE_TTL, and concurrent identical
+queries share one computation. NumPy is imported on first use.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from database_config import SensorReading, database_service
+from metrics import metrics
+from replica_routing import replica_router
+
+ANALYTICS_CACHE_TTL = float(os.getenv('ANALYTICS_CACHE_TTL', 300))
+ANALYTICS_CACHE_SIZE = int(os.getenv('ANALYTICS_CACHE_SIZE', 64))
+ANALYTICS_FETCH_ROWS = int(os.getenv('ANALYTICS_FETCH_ROWS', 100000))
+ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', 31))
+
+VITALS = (
+    'heart_rate', 'body_temperature', 'oxygen_saturation', 'respiratory_rate',
+    'blood_pressure_systolic', 'blood_pressure_diastolic', 'room_temperature', 'humidity',
+)
+
+
+class ReadingColumns:
+    """A chunk of readings as parallel arrays; chunks arrive sorted by (patient_id, ts), ts in epoch seconds"""
+
+    def __init__(self, patient_id, ts, values):
+        self.patient_id = patient_id
+        self.ts = ts
+        self.values = values
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def iter_columns(vital, start, end, patient_ids=None, engine=None, fetch_rows=ANALYTICS_FETCH_ROWS):
+    """Stream one vital of the readings in [start, end) as ReadingColumns chunks (NULL values are skipped)"""
+    import numpy as np
+
+    column = getattr(SensorReading, vital)
+    if engine is None:
+        database_service.engine  # creates the engines (and configures the replica router) on first use
+        engine = replica_router.engine_for_read()
+    if engine.dialect.name == 'postgresql':
+        ts = func.extract('epoch', SensorReading.timestamp)
+    else:
+        ts = SensorReading.timestamp
+
+    query = select(SensorReading.patient_id, ts, column).where(
+        SensorReading.timestamp >= start,
+        SensorReading.timestamp < end,
+        column.isnot(None),
+    ).order_by(SensorReading.patient_id, SensorReading.timestamp)
+    if patient_ids is not None:
+        query = query.where(SensorReading.patient_id.in_(list(patient_ids)))
+
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=fetch_rows).execute(query)
+        while True:
+            rows = result.fetchmany(fetch_rows)
+            if not rows:
+                break
+            chunk_pids, chunk_ts, chunk_values = zip(*rows)
+            if isinstance(chunk_ts[0], datetime):
+                chunk_ts = [t.replace(tzinfo=timezone.utc).timestamp() for t in chunk_ts]
+            yield ReadingColumns(np.array(chunk_pids, dtype=np.int64), np.array(chunk_ts, dtype=np.float64),
+                                 np.array(chunk_values, dtype=np.float32))
+
+
+def _runs(patient_id):
+    """(first row index, length) of each patient's run in a sorted chunk"""
+    import numpy as np
+
+    change = np.empty(len(patient_id), dtype=bool)
+    change[:1] = True
+    np.not_equal(patient_id[1:], patient_id[:-1], out=change[1:])
+    starts = np.flatnonzero(change)
+    return starts, np.diff(np.append(starts, len(patient_id)))
+
+
+class EpisodeCounter:
+    """
+    Episodes per patient where the value is below `below` (or above `above`);
+    consecutive out-of-range readings of one patient are a single episode.
+    Chunks must be fed in (patient_id, ts) order.
+    """
+
+    def __init__(self, below=None, above=None):
+        if (below is None) == (above is None):
+            raise ValueError('Exactly one of below/above is required')
+        self.below = below
+        self.above = above
+        self.episodes = {}
+        self._last_patient = None
+        self._last_hit = False
+
+    def add(self, chunk):
+        import numpy as np
+
+        if len(chunk) == 0:
+            return
+        hit = chunk.values < self.below if self.below is not None else chunk.values > self.above
+        # An episode starts at a hit whose previous row is not a hit of the same patient
+        starts = hit.copy()
+        starts[1:] &= ~(hit[:-1] & (chunk.patient_id[1:] == chunk.patient_id[:-1]))
+        if self._last_hit and chunk.patient_id[0] == self._last_patient:
+            starts[0] = False
+        self._last_patient = chunk.patient_id[-1]
+        self._last_hit = bool(hit[-1])
+
+        patients, counts = np.unique(chunk.patient_id[starts], return_counts=True)
+        for patient_id, count in zip(patients.tolist(), counts.tolist()):
+            self.episodes[patient_id] = self.episodes.get(patient_id, 0) + count
+
+
+class BucketAverager:
+    """
+    Sum and count per (group, time bucket) over [start, end). group_of_patient maps
+    patient_id -> label (e.g. room); without it every patient is its own group.
+    """
+
+    def __init__(self, start, end, bucket_seconds, group_of_patient=None):
+        import numpy as np
+
+        self.start_epoch = start.replace(tzinfo=timezone.utc).timestamp()
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = max(1, -(-int((end - start).total_seconds()) // bucket_seconds))
+        self.group_of_patient = group_of_patient
+        if group_of_patient is not None:
+            self.labels = sorted({str(g) for g in group_of_patient.values()})
+            index = {label: i for i, label in enumerate(self.labels)}
+            self._room_of = {pid: index[str(g)] for pid, g in group_of_patient.items()}
+        else:
+            self.labels = []
+            self._room_of = None
+        self._index = {}
+        self.sums = np.zeros((len(self.labels), self.n_buckets))
+        self.counts = np.zeros((len(self.labels), self.n_buckets), dtype=np.int64)
+
+    def _group_index(self, chunk):
+        """Group index of every row (-1 for patients outside every group)"""
+        import numpy as np
+
+        run_starts, run_lengths = _runs(chunk.patient_id)
+        run_groups = []
+        for patient_id in chunk.patient_id[run_starts].tolist():
+            if self._room_of is not None:
+                run_groups.append(self._room_of.get(patient_id, -1))
+                continue
+            index = self._index.get(patient_id)
+            if index is None:
+                index = self._index[patient_id] = len(self.labels)
+                self.labels.append(patient_id)
+            run_groups.append(index)
+        if len(self.labels) > len(self.sums):
+            grow = max(len(self.labels), 2 * len(self.sums)) - len(self.sums)
+            self.sums = np.vstack([self.sums, np.zeros((grow, self.n_buckets))])
+            self.counts = np.vstack([self.counts, np.zeros((grow, self.n_buckets), dtype=np.int64)])
+        return np.repeat(np.array(run_groups, dtype=np.int64), run_lengths)
+
+    def add(self, chunk):
+        import numpy as np
+
+        if len(chunk) == 0:
+            return
+        groups = self._group_index(chunk)
+        buckets = ((chunk.ts - self.start_epoch) // self.bucket_seconds).astype(np.int64)
+        keep = (groups >= 0) & (buckets >= 0) & (buckets < self.n_buckets)
+        keys = groups[keep] * self.n_buckets + buckets[keep]
+        size = len(self.sums) * self.n_buckets
+        self.sums += np.bincount(keys, weights=chunk.values[keep], minlength=size).reshape(self.sums.shape)
+        self.counts += np.bincount(keys, minlength=size).reshape(self.counts.shape)
+
+    def result(self):
+        """{group: [(bucket start epoch, average, count), ...]} for non-empty buckets"""
+        import numpy as np
+
+        result = {}
+        for group, bucket in zip(*np.nonzero(self.counts[:len(self.labels)])):
+            count = int(self.counts[group, bucket])
+            result.setdefault(self.labels[group], []).append((
+                self.start_epoch + int(bucket) * self.bucket_seconds,
+                round(float(self.sums[group, bucket] / count), 2),
+                count,
+            ))
+        return result
+
+
+class AnalyticsService:
+    def __init__(self, ttl=ANALYTICS_CACHE_TTL, max_size=ANALYTICS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._results = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._requests = metrics.registry.counter(
+            'analytics_requests_total', 'Analytics queries by cache result', ('query', 'result'))
+        self._duration = metrics.registry.histogram(
+            'analytics_compute_seconds', 'Load and compute time of uncached analytics queries', ('query',))
+        self._rows = metrics.registry.counter('analytics_rows_total', 'Readings loaded for analytics', ('query',))
+
+    def _cached(self, name, key, compute):
+        """Result for key from the cache, or computed once even if requested concurrently"""
+        key = (name,) + key
+        while True:
+            with self._lock:
+                entry = self._results.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self._results.move_to_end(key)
+                    self._requests.inc(name, 'hit')
+                    return entry[1]
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = threading.Event()
+                    break
+            # Someone else is computing it; take their result
+            pending.wait()
+
+        self._requests.inc(name, 'miss')
+        started = time.perf_counter()
+        try:
+            value = compute()
+            with self._lock:
+                self._results[key] = (time.monotonic() + self.ttl, value)
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_size:
+                    self._results.popitem(last=False)
+            return value
+        finally:
+            self._duration.observe(name, value=time.perf_counter() - started)
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    @staticmethod
+    def _check(vital, start, end):
+        if vital not in VITALS:
+            raise ValueError(f"Unknown vital '{vital}'")
+        if end <= start:
+            raise ValueError('until must be after since')
+        if (end - start).days > ANALYTICS_MAX_DAYS:
+            raise ValueError(f'Time range is limited to {ANALYTICS_MAX_DAYS} days')
+
+    def threshold_events(self, vital, start, end, below=None, above=None, min_events=1, patient_ids=None):
+        """[{patient_id, episodes}] with at least min_events episodes, most first"""
+        self._check(vital, start, end)
+        counter = EpisodeCounter(below=below, above=above)
+
+        def compute():
+            for chunk in iter_columns(vital, start, end, patient_ids):
+                counter.add(chunk)
+                self._rows.inc('threshold_events', amount=len(chunk))
+            return sorted(({'patient_id': pid, 'episodes': n} for pid, n in counter.episodes.items() if n >= min_events),
+                          key=lambda row: (-row['episodes'], row['patient_id']))
+
+        key = (vital, start, end, below, above, min_events, tuple(sorted(patient_ids)) if patient_ids is not None else None)
+        return self._cached('threshold_events', key, compute)
+
+    def bucket_averages(self, vital, start, end, bucket_seconds=3600, group_of_patient=None, patient_ids=None):
+        """{group: [(bucket start epoch, average, count)]}; groups are patients unless group_of_patient is given"""
+        self._check(vital, start, end)
+        if bucket_seconds < 60:
+            raise ValueError('Buckets must be at least 60 seconds')
+        if group_of_patient is not None:
+            patient_ids = list(group_of_patient)
+
+        def compute():
+            averager = BucketAverager(start, end, bucket_seconds, group_of_patient)
+            for chunk in iter_columns(vital, start, end, patient_ids):
+                averager.add(chunk)
+                self._rows.inc('bucket_averages', amount=len(chunk))
+            return averager.result()
+
+        groups = tuple(sorted(group_of_patient.items())) if group_of_patient is not None else None
+        patients = tuple(sorted(patient_ids)) if patient_ids is not None else None
+        return self._cached('bucket_averages', (vital, start, end, bucket_seconds, groups, patients), compute)
+
+
+def patient_rooms(wards=None):
+    """{patient_id: room label} of the patients in `wards` (all wards when None)"""
+    return {p['id']: p.get('room_number') or 'N/A' for p in database_service.get_all_patients(wards)}
+
+
+# Create global analytics service instance
+analytics_service = AnalyticsService()
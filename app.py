@@ -1,11 +1,35 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from datetime import datetime, timedelta, timezone
 import json
 import math
+import threading
+import time
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from database_config import database_service
+from metrics import metrics
+from user_cache import user_cache
+from live_sync import sync_hub, CLINICIANS_ROOM
+from response_cache import response_cache
+from device_liveness import liveness_tracker
+from emergency_lane import emergency_lane, persistence_queue
+from sharding import ward_router, ward_room
+from replica_routing import replica_router
+from patient_summary import summary_store, reading_listeners
+from hot_tier import hot_tier
+from analytics import analytics_service, patient_rooms
+from admission import admission_control, peek_payload
+from plausibility import plausibility_filter, PLAUSIBLE_RANGES
+from fall_classifier import fall_classifier
+from position_tracker import position_tracker
+from alert_rules import alert_rules
+from serializers import to_isoformat, serialize_reading, serialize_alert, encode_cursor, decode_cursor, cursor_window
+from ingest_pipeline import (ingest_pipeline, EMERGENCY_KINDS, detect_fall_from_sensor, payload_message_id,
+                             reading_from_payload, vital_alert, geofence_alert)
+from notifications import notifier
+from ecg_stream import ecg_relay, ecg_room, ECG_NAMESPACE
+from scheduler import scheduler, READING_RETENTION_DAYS, READING_RETENTION_CRON, JOB_HISTORY_DAYS
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -27,52 +51,199 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    user_data = database_service.get_user_by_id(int(user_id))
-    if user_data:
-        return User(user_data)
-    return None
+    # Served from a short-TTL snapshot cache so polling endpoints don't hit the DB for auth
+    user_data = user_cache.get(int(user_id))
+    if user_data is None:
+        user_data = database_service.get_user_by_id(int(user_id))
+        if not user_data:
+            return None
+        user_data = user_cache.put(user_data['id'], user_data)
+    return User(user_data)
 
-# Helper function to detect falls based on Run MHsensor series
-def detect_fall_from_sensor(fall_signal):
-    """
-    Process fall detection signal from Run MHsensor series
-    Returns (fall_detected: bool, confidence: float)
-    """
-    try:
-        if fall_signal:
-            return True, 0.9  # High confidence for digital fall sensor
-        return False, 0.0
-    except (TypeError, ValueError):
-        return False, 0.0
-
-# Helper function to determine room based on GPS coordinates
-def determine_room_from_gps(latitude, longitude):
+def serialize_summary(summary):
+    latest = summary['latest_reading']
+    return dict(summary,
+                last_fall_at=to_isoformat(summary['last_fall_at']),
+                latest_reading=serialize_reading(latest) if latest else None)
+
+def patient_status_entry(patient, latest_reading):
+    return {
+        'id': patient['id'],
+        'name': patient['name'],
+        'room_number': patient.get('room_number'),
+        'ward': patient['ward'],
+        'status': 'active' if patient.get('is_active', True) else 'discharged',
+        'latest_reading': serialize_reading(latest_reading) if latest_reading else None
+    }
+
+def requested_wards():
+    """Wards selected with ?ward=... (repeatable), or None for all wards"""
+    return request.args.getlist('ward') or None
+
+def parse_wards(value):
+    """A JSON 'wards' field: None stays None, anything but a list of ward names is a ValueError"""
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(ward, str) and ward for ward in value):
+        raise ValueError('wards must be a list of ward names')
+    return value
+
+def get_patients_status_list(wards=None):
+    patients = database_service.get_all_patients(wards)
+    latest = database_service.get_latest_readings([p['id'] for p in patients])
+    return [patient_status_entry(patient, latest.get(patient['id'])) for patient in patients]
+
+def parse_since():
     """
-    Determine room location based on GPS coordinates from NEO-6M
-    This is a simplified example - in reality you'd have a mapping of GPS to rooms
+    Where a ?since= query starts: the cursor minus CURSOR_OVERLAP_SECONDS, so
+    rows committed late are not missed (clients drop the ids they already have).
+    None when empty (first request of a cursor client); ValueError if malformed.
     """
-    # Example hospital room coordinates (simplified)
-    rooms = {
-        'Phòng 101': {'lat_min': 10.7756, 'lat_max': 10.7757, 'lng_min': 106.7017, 'lng_max': 106.7018},
-        'Phòng 102': {'lat_min': 10.7757, 'lat_max': 10.7758, 'lng_min': 106.7017, 'lng_max': 106.7018},
-        'Phòng 103': {'lat_min': 10.7758, 'lat_max': 10.7759, 'lng_min': 106.7017, 'lng_max': 106.7018},
-        'Phòng Cấp Cứu': {'lat_min': 10.7759, 'lat_max': 10.7760, 'lng_min': 106.7017, 'lng_max': 106.7018},
-        'ICU': {'lat_min': 10.7760, 'lat_max': 10.7761, 'lng_min': 106.7017, 'lng_max': 106.7018},
+    since = request.args.get('since')
+    return cursor_window(decode_cursor(since)) if since else None
+
+def next_cursor(readings):
+    """Cursor after the newest of `readings`, never behind the request's own cursor"""
+    newest = max(readings, key=lambda reading: (reading['timestamp'], reading['id']), default=None)
+    since = request.args.get('since')
+    if newest is None or (since and (newest['timestamp'], newest['id']) < decode_cursor(since)):
+        return since or None
+    return encode_cursor(newest)
+
+def build_dashboard_snapshot(wards=None):
+    """Dashboard state of `wards` sent to a client on connect or after a sequence gap"""
+    return {
+        'patients': get_patients_status_list(wards),
+        'alerts': [serialize_alert(alert) for alert in database_service.get_unacknowledged_alerts(10, wards)]
     }
+
+sync_hub.init_app(socketio, build_dashboard_snapshot)
+
+def handle_device_event(kind, device):
+    """Liveness tracker callback for 'online', 'offline' and 'low_battery' transitions"""
+    sync_hub.publish('device_status', {
+        'device_id': device['device_id'],
+        'patient_id': device['patient_id'],
+        'event': kind,
+        'online': device['online'],
+        'last_seen': to_isoformat(device['last_seen']),
+        'battery_level': device['battery_level'],
+        'signal_strength': device['signal_strength']
+    }, device['ward'])
+    if kind == 'online' or not device['patient_id']:
+        return
     
-    for room_name, coords in rooms.items():
-        if (coords['lat_min'] <= latitude <= coords['lat_max'] and 
-            coords['lng_min'] <= longitude <= coords['lng_max']):
-            return room_name, 0.9  # High confidence for exact match
-    
-    return 'Phòng Không Xác Định', 0.1  # Low confidence if no match
+    if kind == 'offline':
+        alert_data = {
+            'alert_type': 'device_offline',
+            'severity': 'critical',
+            'message': f"Thiết bị {device['device_id']} mất kết nối, không nhận được dữ liệu từ {device['last_seen']:%H:%M:%S}"
+        }
+    else:
+        alert_data = {
+            'alert_type': 'low_battery',
+            'severity': 'warning',
+            'message': f"Pin thiết bị {device['device_id']} yếu: {device['battery_level']:.0f}%"
+        }
+    alert_data.update({'patient_id': device['patient_id'], 'device_id': device['id'], 'is_acknowledged': False})
+    alert = dict(alert_data, id=database_service.create_alert(alert_data), created_at=datetime.utcnow())
+    sync_hub.publish('alert_created', serialize_alert(alert), device['ward'])
+    notifier.notify(alert)
+
+liveness_tracker.writer = database_service.bulk_update_device_status
+liveness_tracker.on_event = handle_device_event
+
+def publish_emergency_event(event):
+    sync_hub.publish('emergency', {
+        'event_id': event['event_id'],
+        'kind': event['kind'],
+        'alert_type': event['alert_type'],
+        'patient_id': event['patient_id'],
+        'patient_name': event['patient_name'],
+        'room_number': event['room_number'],
+        'device_id': event['device_id'],
+        'message': event['message'],
+        'severity': 'critical',
+        'created_at': to_isoformat(event['received_at'])
+    }, event['ward'])
+    # Paged from the fast path too; the alert row written later is not notified again
+    notifier.notify({
+        'patient_id': event['patient_id'],
+        'alert_type': event['alert_type'],
+        'severity': 'critical',
+        'message': event['message'],
+        'created_at': event['received_at']
+    })
+
+def persist_emergency_event(event):
+    """Runs on the persistence worker after clinicians were already notified"""
+    reading_id = database_service.create_sensor_reading({
+        'patient_id': event['patient_id'],
+        'device_id': event['device_pk'],
+        'timestamp': event['received_at'],
+        'fall_detected': event['kind'] == 'fall',
+        'fall_confidence': event['fall_confidence'],
+        'emergency_button_pressed': event['kind'] == 'emergency_button',
+        'gps_latitude': event['gps_lat'],
+        'gps_longitude': event['gps_lng'],
+        'alert_level': 'critical',
+        'is_emergency': True
+    })
+    alert_data = {
+        'patient_id': event['patient_id'],
+        'device_id': event['device_pk'],
+        'alert_type': event['alert_type'],
+        'message': event['message'],
+        'severity': 'critical',
+        'is_acknowledged': False
+    }
+    alert = dict(alert_data, id=database_service.create_alert(alert_data), created_at=event['received_at'])
+    # event_id lets clients swap the provisional emergency banner for the acknowledgeable alert
+    sync_hub.publish('alert_created', dict(serialize_alert(alert), event_id=event['event_id'], reading_id=reading_id),
+                     event['ward'])
+
+summary_store.loader = database_service.get_patient_summary
+summary_store.rebuilder = database_service.get_patient_activity
+summary_store.writer = database_service.save_patient_summaries
+reading_listeners.append(hot_tier.apply)
+
+emergency_lane.patient_lookup = database_service.get_patient_by_device_id
+ecg_relay.emit = socketio.emit
+emergency_lane.publish = publish_emergency_event
+emergency_lane.persist = persist_emergency_event
+
+notifier.patient_lookup = database_service.get_patient_by_id
+notifier.user_lookup = database_service.get_user_by_id
+
+def purge_old_readings():
+    """Scheduled: drop readings past READING_RETENTION_DAYS"""
+    cutoff = datetime.utcnow() - timedelta(days=READING_RETENTION_DAYS)
+    deleted = database_service.delete_readings_before(cutoff)
+    print(f'🧹 Deleted {deleted} reading(s) older than {cutoff:%Y-%m-%d %H:%M}')
+
+def purge_job_history():
+    """Scheduled: drop job run history past JOB_HISTORY_DAYS"""
+    database_service.delete_job_runs_before(datetime.utcnow() - timedelta(days=JOB_HISTORY_DAYS))
+
+scheduler.history_writer = database_service.record_job_run
+scheduler.last_runs = database_service.get_last_job_runs
+scheduler.run_starter = database_service.start_job_run
+scheduler.run_heartbeat = database_service.heartbeat_job_runs
+if READING_RETENTION_DAYS > 0:
+    scheduler.add_job('reading_retention', purge_old_readings, cron=READING_RETENTION_CRON, jitter=300)
+scheduler.add_job('job_history_retention', purge_job_history, every=86400, jitter=600, timeout=300)
 
 # Routes
+def current_user_variant():
+    return current_user.get_id()
+
 @app.route('/')
 @login_required
+@response_cache.cached(variant=current_user_variant)
 def dashboard():
-    patients = database_service.get_all_patients()
-    recent_alerts = database_service.get_unacknowledged_alerts(10)
+    wards = requested_wards()
+    patients = database_service.get_all_patients(wards)
+    recent_alerts = database_service.get_unacknowledged_alerts(10, wards)
     return render_template('dashboard.html', patients=patients, alerts=recent_alerts)
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -94,13 +265,15 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
     return redirect(url_for('login'))
 
 @app.route('/patients')
 @login_required
+@response_cache.cached(variant=current_user_variant)
 def patients():
-    patients = database_service.get_all_patients()
+    patients = database_service.get_all_patients(requested_wards())
     return render_template('patients.html', patients=patients)
 
 @app.route('/patient/<patient_id>')
@@ -110,8 +283,9 @@ def patient_detail(patient_id):
     if not patient:
         return "Patient not found", 404
     
-    recent_readings = database_service.get_patient_readings(int(patient_id), hours=24)
-    return render_template('patient_detail.html', patient=patient, readings=recent_readings)
+    # The page renders from the incrementally maintained summary; the history table loads its rows itself
+    summary = serialize_summary(summary_store.get(int(patient_id)))
+    return render_template('patient_detail.html', patient=patient, summary=summary)
 
 @app.route('/add_patient', methods=['GET', 'POST'])
 @login_required
@@ -134,6 +308,7 @@ def add_patient():
             'email': request.form['email'],
             'medical_id': request.form['medical_id'],
             'room_number': request.form['room_number'],
+            'ward': request.form.get('ward') or None,
             'esp32_device_id': device['id'],  # Use internal device ID
             'status': 'active'
         }
@@ -163,6 +338,7 @@ def add_device():
             'ip_address': request.form.get('ip_address'),
             'mac_address': request.form.get('mac_address'),
             'room_location': request.form.get('room_location'),
+            'ward': request.form.get('ward') or None,
             'is_active': True,
             'battery_level': 100.0,
             'signal_strength': -50
@@ -172,6 +348,18 @@ def add_device():
     
     return render_template('add_device.html')
 
+def calibration_from_form(form):
+    """{vital: offset} from the calibration_<vital> fields of the device form, zero offsets left out"""
+    offsets = {}
+    for vital in PLAUSIBLE_RANGES:
+        try:
+            offset = float(form.get(f'calibration_{vital}') or 0)
+        except ValueError:
+            continue
+        if offset:
+            offsets[vital] = offset
+    return offsets
+
 @app.route('/edit_device/<device_id>', methods=['GET', 'POST'])
 @login_required
 def edit_device(device_id):
@@ -187,12 +375,16 @@ def edit_device(device_id):
             'ip_address': request.form.get('ip_address'),
             'mac_address': request.form.get('mac_address'),
             'room_location': request.form.get('room_location'),
+            'ward': request.form.get('ward') or None,
+            'calibration': json.dumps(calibration_from_form(request.form)),
             'is_active': 'is_active' in request.form
         }
         database_service.update_device(device_id, update_data)
+        plausibility_filter.forget(device['device_id'])
+        ingest_pipeline.forget(device_id=device['device_id'])
         return redirect(url_for('devices'))
     
-    return render_template('edit_device.html', device=device)
+    return render_template('edit_device.html', device=device, calibration_vitals=PLAUSIBLE_RANGES)
 
 @app.route('/api/delete_device/<device_id>', methods=['DELETE'])
 @login_required
@@ -208,8 +400,32 @@ def delete_device(device_id):
     return jsonify({'success': True})
 
 # API Endpoints for ESP32 - Updated for real sensors
+@app.route('/api/emergency_event', methods=['POST'])
+def receive_emergency_event():
+    """Fall / emergency button fast path: notify clinicians first, persist afterwards"""
+    received_at = time.perf_counter()
+    try:
+        data = request.json
+        patient = emergency_lane.patient_for(data.get('device_id'))
+        if patient is None:
+            return jsonify({'error': 'Patient not found for device ID'}), 404
+        owner_url = ward_router.redirect_url(patient['ward'], request.path)
+        if owner_url:
+            return redirect(owner_url, code=307)
+        event = emergency_lane.handle(data, patient, received_at)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    liveness_tracker.heartbeat(event['device_pk'], event['device_id'], event['patient_id'], event['ward'])
+    return jsonify({'status': 'accepted', 'event_id': event['event_id']}), 202
+
 @app.route('/api/sensor_data', methods=['POST'])
+@admission_control.limit_ingest
 def receive_sensor_data():
+    if ingest_pipeline.enabled:
+        return receive_sensor_data_in_worker()
     try:
         data = request.json
         device_id = data.get('device_id')
@@ -219,202 +435,133 @@ def receive_sensor_data():
         if not patient:
             return jsonify({'error': 'Patient not found for device ID'}), 404
         
-        # Update device last seen
-        database_service.update_device(device_id, {
-            'last_seen': datetime.now(timezone.utc),
-            'battery_level': data.get('battery_level', 100),
-            'signal_strength': data.get('signal_strength', -50)
-        })
+        # Each ward is ingested by the shard that owns it; 307 keeps the method and body
+        owner_url = ward_router.redirect_url(patient['ward'], request.path)
+        if owner_url:
+            return redirect(owner_url, code=307)
         
-        # Process fall detection from Run MHsensor series
-        fall_detected = False
-        fall_confidence = 0.0
-        if 'fall_detected' in data:
-            fall_detected, fall_confidence = detect_fall_from_sensor(data['fall_detected'])
+        # A retried payload that is already stored is acknowledged without a second reading
+        message_id = payload_message_id(data)
+        if message_id and database_service.get_stored_message_ids([(patient['device_id'], message_id)]):
+            return jsonify({'status': 'duplicate'})
         
-        # Process GPS location from NEO-6M
-        room_detected = 'Unknown'
-        location_confidence = 0.0
-        if 'gps_lat' in data and 'gps_lng' in data:
-            room_detected, location_confidence = determine_room_from_gps(
-                data['gps_lat'], data['gps_lng']
-            )
+        # Heartbeat: last_seen, battery and RSSI are flushed to esp32_devices in periodic batches
+        liveness_tracker.heartbeat(
+            patient['device_id'], device_id, patient['id'], patient['ward'],
+            battery_level=data.get('battery_level'),
+            signal_strength=data.get('signal_strength')
+        )
         
         # Create comprehensive sensor reading with all real sensor data
-        reading_data = {
-            'patient_id': patient['id'],
-            'device_id': device_id,
-            
-            # Vital signs from MH-ETLive
-            'heart_rate': data.get('heart_rate'),  # From MH-ETLive
-            'oxygen_saturation': data.get('oxygen_saturation'),  # From MH-ETLive
-            'blood_pressure_systolic': data.get('bp_systolic'),
-            'blood_pressure_diastolic': data.get('bp_diastolic'),
-            'respiratory_rate': data.get('respiratory_rate'),
-            
-            # Body temperature from DS18B20
-            'body_temperature': data.get('body_temperature'),  # From DS18B20
-            
-            # Room environment from DHT11
-            'room_temperature': data.get('room_temperature'),  # From DHT11
-            'humidity': data.get('humidity'),  # From DHT11
-            
-            # ECG data from AD8232
-            'ecg_value': data.get('ecg_value'),  # From AD8232
-            'ecg_leads_connected': data.get('ecg_leads_connected', False),
-            'ecg_status': data.get('ecg_status', 'Normal'),
-            'ecg_data': data.get('ecg_data'),  # ECG data buffer
-            
-            # Fall detection from Run MHsensor series
-            'fall_detected': fall_detected,
-            'fall_confidence': fall_confidence,
-            
-            # GPS location from NEO-6M
-            'gps_latitude': data.get('gps_lat'),
-            'gps_longitude': data.get('gps_lng'),
-            'gps_accuracy': data.get('gps_accuracy'),
-            'room_detected': room_detected,
-            'location_confidence': location_confidence,
-            
-            # Emergency button
-            'emergency_button_pressed': data.get('emergency_button_pressed', False),
-            
-            # Device status
-            'battery_level': data.get('battery_level'),
-            'signal_strength': data.get('signal_strength')
-        }
-        
-        # Check for critical values and set alerts based on real sensor data
-        alert_level = 'normal'
-        is_emergency = False
-        alert_messages = []
-        
-        # Heart rate checks (from MH-ETLive)
-        if reading_data['heart_rate']:
-            hr = reading_data['heart_rate']
-            if hr < 60 or hr > 100:
-                alert_level = 'warning'
-                alert_messages.append(f"Nhịp tim: {hr} bpm")
-            if hr < 40 or hr > 120:
-                alert_level = 'critical'
-                is_emergency = True
-        
-        # Body temperature checks (from DS18B20)
-        if reading_data['body_temperature']:
-            temp = reading_data['body_temperature']
-            if temp < 36 or temp > 38:
-                alert_level = 'warning'
-                alert_messages.append(f"Nhiệt độ cơ thể: {temp}°C")
-            if temp < 35 or temp > 39:
-                alert_level = 'critical'
-                is_emergency = True
+        reading_data = reading_from_payload(data, patient)
         
-        # Oxygen saturation checks (from MH-ETLive)
-        if reading_data['oxygen_saturation']:
-            spo2 = reading_data['oxygen_saturation']
-            if spo2 < 95:
-                alert_level = 'warning'
-                alert_messages.append(f"Độ bão hòa oxy: {spo2}%")
-            if spo2 < 90:
-                alert_level = 'critical'
-                is_emergency = True
-        
-        # Room environment checks (from DHT11)
-        if reading_data['room_temperature']:
-            room_temp = reading_data['room_temperature']
-            if room_temp < 18 or room_temp > 30:
-                alert_level = 'warning'
-                alert_messages.append(f"Nhiệt độ phòng: {room_temp}°C")
+        # Process fall detection from Run MHsensor series
+        if 'fall_detected' in data:
+            reading_data['fall_detected'], reading_data['fall_confidence'] = detect_fall_from_sensor(data['fall_detected'])
         
-        if reading_data['humidity']:
-            room_hum = reading_data['humidity']
-            if room_hum < 30 or room_hum > 70:
-                alert_level = 'warning'
-                alert_messages.append(f"Độ ẩm phòng: {room_hum}%")
+        # A raw accelerometer window gets a real confidence from the server-side classifier;
+        # the digital bit still raises a fall on its own, and keeps its confidence if higher
+        if data.get('accel_window'):
+            try:
+                classified, confidence = fall_classifier.classify(data['accel_window'])
+                reading_data['fall_detected'] = reading_data['fall_detected'] or classified
+                reading_data['fall_confidence'] = max(reading_data['fall_confidence'], confidence)
+            except (ValueError, TimeoutError) as e:
+                print(f"Fall classifier skipped for {device_id}: {e}")
         
-        # ECG checks (from AD8232)
-        if reading_data['ecg_leads_connected'] and not reading_data['ecg_value']:
-            alert_level = 'warning'
-            alert_messages.append("Điện cực ECG bị ngắt kết nối")
+        # Process GPS location from NEO-6M: the patient's smoothed track decides the room
+        geofence_events = []
+        if data.get('gps_lat') is not None and data.get('gps_lng') is not None:
+            position = position_tracker.update(
+                [patient['id']], [data['gps_lat']], [data['gps_lng']], [data.get('gps_accuracy')], [time.time()]
+            )[0]
+            reading_data['room_detected'], reading_data['location_confidence'] = position['room'], position['confidence']
+            geofence_events = position['events']
         
-        # Fall detection alert (from Run MHsensor series)
-        if fall_detected:
-            alert_level = 'critical'
-            is_emergency = True
-            alert_messages.append(f"Phát hiện té ngã (độ tin cậy: {fall_confidence:.1%})")
+        # Calibrate and drop implausible values and spikes so sensor glitches never reach alerting
+        rejected = plausibility_filter.process(device_id, [reading_data], patient['device_calibration'])[0]
         
-        # Emergency button alert
-        if reading_data['emergency_button_pressed']:
-            alert_level = 'critical'
-            is_emergency = True
-            alert_messages.append("Nút cảnh báo khẩn cấp được nhấn")
+        # Alert level and messages from the shared rules; falls and button presses already
+        # raised through /api/emergency_event don't get a second message
+        reported = {kind for kind in EMERGENCY_KINDS if emergency_lane.recently_reported(device_id, kind)}
+        alert_level, is_emergency, alert_messages = alert_rules.evaluate(reading_data, reported)
         
         reading_data['alert_level'] = alert_level
         reading_data['is_emergency'] = is_emergency
         
         # Save sensor reading
-        database_service.create_sensor_reading(reading_data)
+        reading_data['timestamp'] = datetime.utcnow()
+        reading_data['id'] = database_service.create_sensor_reading(reading_data)
         
         # Create alert if necessary
-        if alert_level != 'normal':
-            alert_message = f"Bệnh nhân {patient['name']} cảnh báo: " + "; ".join(alert_messages)
-            
-            alert_data = {
-                'patient_id': patient['id'],
-                'alert_type': 'fall_detection' if fall_detected else 'vital_signs',
-                'message': alert_message,
-                'severity': alert_level,
-                'is_acknowledged': False
-            }
-            database_service.create_alert(alert_data)
+        alert = vital_alert(patient, reading_data, alert_level, alert_messages)
+        if alert:
+            alert = dict(alert, id=database_service.create_alert(alert), created_at=reading_data['timestamp'])
+        
+        # Geofence rules (left the ward, entered a restricted area) get their own alerts
+        for fence in geofence_events:
+            fence_alert = geofence_alert(patient, fence, reading_data['room_detected'])
+            fence_alert = dict(fence_alert, id=database_service.create_alert(fence_alert), created_at=reading_data['timestamp'])
+            sync_hub.publish('alert_created', serialize_alert(fence_alert), patient['ward'])
+            notifier.notify(fence_alert)
         
-        # Emit comprehensive real-time update to connected clients
-        socketio.emit('sensor_update', {
+        # Push the reading (and alert) to connected dashboards
+        sync_hub.publish('reading', {
             'patient_id': patient['id'],
             'patient_name': patient['name'],
-            'reading': {
-                # Vital signs
-                'heart_rate': reading_data['heart_rate'],
-                'body_temperature': reading_data['body_temperature'],
-                'oxygen_saturation': reading_data['oxygen_saturation'],
-                'blood_pressure': f"{reading_data['blood_pressure_systolic']}/{reading_data['blood_pressure_diastolic']}" if reading_data['blood_pressure_systolic'] else None,
-                'respiratory_rate': reading_data['respiratory_rate'],
-                
-                # Room environment
-                'room_temperature': reading_data['room_temperature'],
-                'humidity': reading_data['humidity'],
-                
-                # ECG data
-                'ecg_value': reading_data['ecg_value'],
-                'ecg_leads_connected': reading_data['ecg_leads_connected'],
-                'ecg_status': reading_data['ecg_status'],
-                
-                # Fall detection
-                'fall_detected': fall_detected,
-                'fall_confidence': fall_confidence,
-                
-                # GPS location
-                'gps_latitude': reading_data['gps_latitude'],
-                'gps_longitude': reading_data['gps_longitude'],
-                'room_detected': room_detected,
-                
-                # Emergency
-                'emergency_button_pressed': reading_data['emergency_button_pressed'],
-                'alert_level': alert_level,
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            }
-        })
+            'reading': serialize_reading(reading_data)
+        }, patient['ward'])
+        if alert:
+            sync_hub.publish('alert_created', serialize_alert(alert), patient['ward'])
+            notifier.notify(alert)
         
         return jsonify({
             'status': 'success', 
             'alert_level': alert_level, 
-            'fall_detected': fall_detected,
-            'room_detected': room_detected
+            'fall_detected': reading_data['fall_detected'],
+            'room_detected': reading_data['room_detected'],
+            'rejected': rejected
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def receive_sensor_data_in_worker():
+    """INGEST_WORKERS > 0: hand the raw body to an ingest worker process and wait for its result"""
+    body = request.get_data()
+    device_id, emergency = peek_payload(body)
+    reported = [kind for kind in EMERGENCY_KINDS if emergency_lane.recently_reported(device_id, kind)]
+    try:
+        result = ingest_pipeline.process(body, device_id, reported, emergency)
+    except (TimeoutError, RuntimeError) as e:
+        return jsonify({'error': str(e)}), 503
+    if result['status'] == 307:
+        return redirect(result['location'], code=307)
+    return jsonify(result['body']), result['status']
+
+def apply_ingest_results(results):
+    """Pipeline receiver thread: the parts of ingest that need this process (liveness, sockets, summaries)"""
+    readings, alerts = [], []
+    for result in results:
+        if result['status'] != 200 or result.get('duplicate'):
+            continue
+        device_pk, device_id, patient_id, ward, battery_level, signal_strength = result['heartbeat']
+        liveness_tracker.heartbeat(device_pk, device_id, patient_id, ward,
+                                   battery_level=battery_level, signal_strength=signal_strength)
+        for event_type, data in result['events']:
+            sync_hub.publish(event_type, data, ward)
+        for alert in result['alerts']:
+            notifier.notify(alert)
+            alerts.append((alert['patient_id'], alert['id'], alert['severity'], alert['created_at']))
+        readings.append(result['reading'])
+    # The workers' inserts bypass this process's session hooks
+    if readings:
+        summary_store.apply(readings, alerts)
+        hot_tier.apply(readings)
+        response_cache.bump()
+
+ingest_pipeline.on_results = apply_ingest_results
+
 @app.route('/api/patient_status/<device_id>')
 def get_patient_status(device_id):
     patient = database_service.get_patient_by_device_id(device_id)
@@ -445,85 +592,321 @@ def get_patient_status(device_id):
 def handle_connect():
     print('Client connected')
 
+@socketio.on('sync_request')
+def handle_sync_request(data=None):
+    """Initial snapshot, or replay of missed events after a sequence gap"""
+    if not current_user.is_authenticated:
+        return
+    data = {} if data is None else data
+    try:
+        if not isinstance(data, dict):
+            raise ValueError('sync_request takes an object')
+        last_seqs = data.get('last_seqs')
+        wards = parse_wards(data.get('wards')) or None
+        if last_seqs is not None and not (isinstance(last_seqs, dict) and
+                                          all(isinstance(seq, int) for seq in last_seqs.values())):
+            raise ValueError('last_seqs must map wards to sequence numbers')
+    except ValueError as e:
+        emit('sync_error', {'error': str(e)})
+        return
+    # Follow the selected wards' rooms, or every ward
+    for room in ([ward_room(ward) for ward in wards] if wards else [CLINICIANS_ROOM]):
+        join_room(room)
+    event_name, payload = sync_hub.handle_sync_request(last_seqs, wards)
+    emit(event_name, payload)
+
 @socketio.on('disconnect')
 def handle_disconnect():
+    ecg_relay.unsubscribe(request.sid)
     print('Client disconnected')
 
+@socketio.on('ecg_subscribe')
+def handle_ecg_subscribe(data):
+    """Start receiving a patient's live ECG frames (patient_detail.html while it is open)"""
+    if not current_user.is_authenticated:
+        return
+    patient_id = int(data['patient_id'])
+    join_room(ecg_room(patient_id))
+    ecg_relay.subscribe(request.sid, patient_id)
+
+@socketio.on('ecg_unsubscribe')
+def handle_ecg_unsubscribe(data):
+    patient_id = int(data['patient_id'])
+    leave_room(ecg_room(patient_id))
+    ecg_relay.unsubscribe(request.sid, patient_id)
+
+# Devices streaming ECG sample blocks (see ecg_stream.py for the block layout)
+@socketio.on('connect', namespace=ECG_NAMESPACE)
+def handle_ecg_device_connect(auth=None):
+    device_id = (auth or {}).get('device_id')
+    patient = database_service.get_patient_by_device_id(device_id) if device_id else None
+    if not patient or not ward_router.is_local(patient['ward']):
+        return False
+    ecg_relay.connect_device(request.sid, patient['id'])
+
+@socketio.on('ecg_block', namespace=ECG_NAMESPACE)
+def handle_ecg_block(data):
+    ecg_relay.add_blocks(request.sid, data)
+
+@socketio.on('disconnect', namespace=ECG_NAMESPACE)
+def handle_ecg_device_disconnect():
+    ecg_relay.disconnect_device(request.sid)
+
 # Additional API endpoints
 @app.route('/api/patients_status')
+@response_cache.cached()
 def get_patients_status():
-    patients = database_service.get_all_patients()
-    result = []
-    
-    for patient in patients:
-        latest_reading = database_service.get_latest_reading(patient['id'])
-        
-        patient_data = {
-            'id': patient['id'],
-            'name': patient['name'],
-            'status': patient['status'],
-            'latest_reading': None
-        }
-        
-        if latest_reading:
-            patient_data['latest_reading'] = {
-                'heart_rate': latest_reading.get('heart_rate'),
-                'body_temperature': latest_reading.get('body_temperature'),
-                'oxygen_saturation': latest_reading.get('oxygen_saturation'),
-                'room_temperature': latest_reading.get('room_temperature'),
-                'humidity': latest_reading.get('humidity'),
-                'fall_detected': latest_reading.get('fall_detected', False),
-                'room_detected': latest_reading.get('room_detected', 'Unknown'),
-                'alert_level': latest_reading.get('alert_level', 'normal'),
-                'timestamp': latest_reading.get('timestamp')
-            }
-        
-        result.append(patient_data)
+    # Fallback for clients without a socket connection; dashboards normally sync over Socket.IO
+    if 'since' not in request.args:
+        return jsonify(get_patients_status_list(requested_wards()))
     
-    return jsonify(result)
+    # Cursor clients get only the patients whose latest reading is newer than ?since=
+    try:
+        after = parse_since()
+    except ValueError:
+        return jsonify({'error': 'Invalid since cursor'}), 400
+    patients = database_service.get_all_patients(requested_wards())
+    latest = database_service.get_latest_readings([p['id'] for p in patients], after)
+    if after is not None:
+        patients = [patient for patient in patients if patient['id'] in latest]
+    return jsonify({
+        'patients': [patient_status_entry(patient, latest.get(patient['id'])) for patient in patients],
+        'cursor': next_cursor(latest.values())
+    })
+
+@app.route('/api/ward_status')
+@login_required
+def get_ward_status():
+    """Per-ward summary of the wards this shard owns (the live device state only exists here)"""
+    devices = liveness_tracker.ward_counts()
+    patients = {}
+    for patient in database_service.get_all_patients():
+        patients[patient['ward']] = patients.get(patient['ward'], 0) + 1
+    wards = ward_router.local_wards(sorted(set(devices) | set(patients)))
+    alerts = database_service.count_unacknowledged_alerts_by_ward(wards) if wards else {}
+    seqs = sync_hub.seqs(wards)
+    return jsonify([{
+        'ward': ward,
+        'shard': ward_router.shard_id,
+        'patients': patients.get(ward, 0),
+        'devices_online': devices.get(ward, (0, 0))[0],
+        'devices_offline': devices.get(ward, (0, 0))[1],
+        'unacknowledged_alerts': alerts.get(ward, 0),
+        'seq': seqs.get(ward, 0)
+    } for ward in wards])
+
+@app.route('/api/wards')
+@login_required
+def get_wards():
+    """Cross-ward overview merged from every shard"""
+    local = get_ward_status().get_json()
+    # Shards share SECRET_KEY, so the session cookie authenticates the fan-out requests
+    wards, shards = ward_router.fan_out('/api/ward_status', local, headers={'Cookie': request.headers.get('Cookie', '')})
+    return jsonify({'wards': sorted(wards, key=lambda w: w['ward']), 'shards': shards})
 
 @app.route('/api/patient_readings/<patient_id>')
 def get_patient_readings(patient_id):
     hours = request.args.get('hours', 24, type=int)
-    readings = database_service.get_patient_readings(int(patient_id), hours)
-    
-    result = []
-    for reading in readings:
-        result.append({
-            'timestamp': reading.get('timestamp'),
-            'heart_rate': reading.get('heart_rate'),
-            'body_temperature': reading.get('body_temperature'),
-            'oxygen_saturation': reading.get('oxygen_saturation'),
-            'blood_pressure_systolic': reading.get('blood_pressure_systolic'),
-            'blood_pressure_diastolic': reading.get('blood_pressure_diastolic'),
-            'respiratory_rate': reading.get('respiratory_rate'),
-            'room_temperature': reading.get('room_temperature'),
-            'humidity': reading.get('humidity'),
-            'ecg_value': reading.get('ecg_value'),
-            'ecg_status': reading.get('ecg_status'),
-            'fall_detected': reading.get('fall_detected', False),
-            'room_detected': reading.get('room_detected', 'Unknown'),
-            'gps_latitude': reading.get('gps_latitude'),
-            'gps_longitude': reading.get('gps_longitude'),
-            'alert_level': reading.get('alert_level', 'normal')
-        })
+    limit = request.args.get('limit', type=int)
+    try:
+        after = parse_since()
+    except ValueError:
+        return jsonify({'error': 'Invalid since cursor'}), 400
+    # Recent ranges come from the in-memory hot tier when it covers them
+    readings = hot_tier.readings(int(patient_id), hours, limit, after)
+    if readings is None:
+        readings = database_service.get_patient_readings(int(patient_id), hours, limit, after)
     
-    return jsonify(result)
+    if 'since' not in request.args:
+        return jsonify([serialize_reading(reading) for reading in readings])
+    # Cursor clients append only the readings newer than ?since= and poll again with the returned cursor
+    return jsonify({'readings': [serialize_reading(reading) for reading in readings], 'cursor': next_cursor(readings)})
+
+@app.route('/api/patient_summary/<patient_id>')
+@login_required
+def get_patient_summary(patient_id):
+    return jsonify(serialize_summary(summary_store.get(int(patient_id))))
+
+@app.route('/api/hot_tier')
+@login_required
+def get_hot_tier():
+    """Memory held by the in-memory readings window, per patient"""
+    return jsonify(hot_tier.report())
+
+@app.route('/api/jobs')
+@login_required
+def get_jobs():
+    """Scheduled jobs as seen by this worker, plus the cluster-wide run history"""
+    report = scheduler.report()
+    for job in report['jobs']:
+        job['next_run'] = to_isoformat(job['next_run'])
+        if job['last_run']:
+            job['last_run'] = serialize_job_run(job['last_run'])
+    limit = request.args.get('limit', 50, type=int)
+    report['history'] = [serialize_job_run(run) for run in
+                         database_service.get_job_runs(request.args.get('job'), max(1, min(limit, 500)))]
+    return jsonify(report)
+
+def serialize_job_run(run):
+    return dict(run, **{key: to_isoformat(run[key]) for key in ('scheduled_for', 'started_at', 'finished_at', 'heartbeat_at')})
 
 @app.route('/health')
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.now(timezone.utc).isoformat()})
 
+def publish_acknowledged(alert_ids):
+    """One alert_acknowledged event per ward of the acknowledged alerts"""
+    by_ward = {}
+    for alert_id, ward in database_service.get_alert_wards(alert_ids).items():
+        by_ward.setdefault(ward, []).append(alert_id)
+    for ward, ids in by_ward.items():
+        sync_hub.publish('alert_acknowledged', {
+            'alert_ids': sorted(ids),
+            'acknowledged_by_id': current_user.id
+        }, ward)
+
 @app.route('/api/acknowledge_alert/<alert_id>', methods=['POST'])
 @login_required
 def acknowledge_alert(alert_id):
-    database_service.acknowledge_alert(int(alert_id), current_user.id)
+    if database_service.acknowledge_alert(int(alert_id), current_user.id):
+        publish_acknowledged([int(alert_id)])
     return jsonify({'success': True})
 
+def parse_timestamp(value):
+    """Naive UTC datetime from an ISO 8601 string (None stays None)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def encode_alert_cursor(cursor):
+    created_at, alert_id = cursor
+    return f'{created_at.isoformat()}_{alert_id}'
+
+def decode_alert_cursor(value):
+    created_at, _, alert_id = value.rpartition('_')
+    return datetime.fromisoformat(created_at), int(alert_id)
+
+@app.route('/api/alerts/acknowledge', methods=['POST'])
+@login_required
+def acknowledge_alerts():
+    """
+    Bulk acknowledge by ids ({"alert_ids": [...]}), by patient ({"patient_id": 1}) or by type
+    and time range ({"alert_type": "low_battery", "since": ..., "until": ...}); filters combine.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        alert_ids = database_service.acknowledge_alerts(
+            current_user.id,
+            alert_ids=[int(i) for i in data['alert_ids']] if data.get('alert_ids') is not None else None,
+            patient_id=int(data['patient_id']) if data.get('patient_id') is not None else None,
+            alert_type=data.get('alert_type'),
+            since=parse_timestamp(data.get('since')),
+            until=parse_timestamp(data.get('until')),
+            wards=parse_wards(data.get('wards'))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if alert_ids:
+        # The bulk UPDATE bypasses the ORM flush that normally invalidates cached views
+        response_cache.bump()
+        publish_acknowledged(alert_ids)
+    return jsonify({'success': True, 'acknowledged': len(alert_ids), 'alert_ids': alert_ids})
+
+@app.route('/api/alerts')
+@login_required
+def get_alerts():
+    """Alert history, newest first, paginated with ?cursor= from the previous page's next_cursor"""
+    acknowledged = request.args.get('acknowledged')
+    try:
+        alerts, cursor = database_service.get_alerts(
+            patient_id=request.args.get('patient_id', type=int),
+            severity=request.args.get('severity'),
+            alert_type=request.args.get('type'),
+            acknowledged=None if acknowledged is None else acknowledged.lower() in ('1', 'true', 'yes'),
+            wards=requested_wards(),
+            after=decode_alert_cursor(request.args['cursor']) if request.args.get('cursor') else None,
+            limit=min(max(request.args.get('limit', 50, type=int), 1), 200)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'alerts': [
+            dict(serialize_alert(alert),
+                 acknowledged_by_id=alert['acknowledged_by_id'],
+                 acknowledged_at=to_isoformat(alert['acknowledged_at']))
+            for alert in alerts
+        ],
+        'next_cursor': encode_alert_cursor(cursor) if cursor else None
+    })
+
+def analytics_window():
+    """(since, until) from the query string; defaults to the last 7 days, minute-aligned so results cache"""
+    until = parse_timestamp(request.args.get('until')) or datetime.utcnow().replace(second=0, microsecond=0)
+    since = parse_timestamp(request.args.get('since')) or until - timedelta(days=7)
+    return since, until
+
+@app.route('/api/analytics/threshold_events')
+@login_required
+def analytics_threshold_events():
+    """Patients with at least min_events episodes below/above a threshold, e.g. ?vital=oxygen_saturation&below=92&min_events=4"""
+    try:
+        since, until = analytics_window()
+        wards = requested_wards()
+        rows = analytics_service.threshold_events(
+            request.args.get('vital', ''), since, until,
+            below=request.args.get('below', type=float),
+            above=request.args.get('above', type=float),
+            min_events=request.args.get('min_events', 1, type=int),
+            patient_ids=[p['id'] for p in database_service.get_all_patients(wards)] if wards else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'since': to_isoformat(since), 'until': to_isoformat(until), 'patients': rows})
+
+@app.route('/api/analytics/bucket_averages')
+@login_required
+def analytics_bucket_averages():
+    """Average of a vital per time bucket and room (or patient), e.g. ?vital=heart_rate&bucket=3600&group_by=room"""
+    group_by = request.args.get('group_by', 'room')
+    if group_by not in ('room', 'patient'):
+        return jsonify({'error': "group_by must be 'room' or 'patient'"}), 400
+    try:
+        since, until = analytics_window()
+        wards = requested_wards()
+        groups = analytics_service.bucket_averages(
+            request.args.get('vital', ''), since, until,
+            bucket_seconds=request.args.get('bucket', 3600, type=int),
+            group_of_patient=patient_rooms(wards) if group_by == 'room' else None,
+            patient_ids=[p['id'] for p in database_service.get_all_patients(wards)] if wards else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'since': to_isoformat(since),
+        'until': to_isoformat(until),
+        'group_by': group_by,
+        'groups': {
+            str(group): [
+                {'start': datetime.fromtimestamp(start, timezone.utc).isoformat(), 'average': average, 'count': count}
+                for start, average, count in series
+            ]
+            for group, series in groups.items()
+        }
+    })
+
 @app.route('/api/delete_patient/<patient_id>', methods=['DELETE'])
 @login_required
 def delete_patient(patient_id):
     database_service.delete_patient(int(patient_id))
+    summary_store.forget(int(patient_id))
+    hot_tier.forget(int(patient_id))
+    position_tracker.forget(int(patient_id))
+    ingest_pipeline.forget(patient_id=int(patient_id))
     return jsonify({'success': True})
 
 # Initialize database and create default admin user
@@ -540,7 +923,89 @@ def create_default_admin():
         database_service.create_user(admin_data)
         print("Created default admin user: admin/admin123")
 
+_services_lock = threading.Lock()
+
+def start_background_services():
+    """Seed in-memory trackers from the DB and start their background loops, once per process"""
+    # Concurrent first requests wait here, so none is served before the trackers are seeded
+    with _services_lock:
+        if not app.extensions.get('background_services'):
+            _start_background_services()
+            app.extensions['background_services'] = True
+
+def _start_background_services():
+    # Only this shard's wards; a device takes the ward of the patient wearing it
+    device_patients = {p['device_id']: p for p in database_service.get_all_patients()}
+    devices = []
+    for device in database_service.get_all_devices():
+        patient = device_patients.get(device['id'])
+        ward = patient['ward'] if patient else device['ward']
+        if ward_router.is_local(ward):
+            devices.append(dict(device, patient_id=patient['id'] if patient else None, ward=ward))
+    liveness_tracker.seed(devices)
+    socketio.start_background_task(liveness_tracker.run)
+    persistence_queue.start()
+    if notifier.enabled:
+        notifier.start()
+    if ingest_pipeline.enabled:
+        ingest_pipeline.start()
+    socketio.start_background_task(summary_store.run)
+    socketio.start_background_task(ecg_relay.run)
+    if sync_hub.relay_url:
+        socketio.start_background_task(sync_hub.run_relay)
+    if scheduler.enabled:
+        scheduler.engine = database_service.engine
+        socketio.start_background_task(scheduler.run)
+    if hot_tier.enabled:
+        socketio.start_background_task(warm_hot_tier, [p['id'] for p in device_patients.values()
+                                                      if ward_router.is_local(p['ward'])])
+
+def warm_hot_tier(patient_ids):
+    """Load the readings window of this shard's patients; queries use the database until each is loaded"""
+    started = time.perf_counter()
+    try:
+        loaded = hot_tier.warm(patient_ids)
+    except Exception as e:
+        print(f'Hot tier warm-up failed: {e}')
+        return
+    print(f'🔥 Hot tier loaded {loaded} readings of {len(patient_ids)} patient(s) in {time.perf_counter() - started:.1f}s')
+
+def create_app():
+    """
+    App factory for servers and the flask CLI (FLASK_APP="app:create_app()").
+    Nothing here touches the database: engines are created by the first query
+    and the schema by `flask init-db`.
+    """
+    if not app.extensions.get('patient_monitor'):
+        # Per-route query count, DB time and latency histograms, exported on /metrics
+        metrics.init_app(app)
+        database_service.on_engine_created(metrics.instrument_engine)
+        
+        # Read-your-writes stickiness for the optional read replica
+        replica_router.init_app(app)
+        
+        # Background loops start with the first request a process serves, whatever runs it
+        # (python app.py, flask run, a WSGI server), and so never in the reloader's watcher
+        # process or in CLI commands like `flask init-db`
+        app.config.setdefault('BACKGROUND_SERVICES', True)
+        app.before_request(ensure_background_services)
+        app.extensions['patient_monitor'] = True
+    return app
+
+def ensure_background_services():
+    if app.config['BACKGROUND_SERVICES'] and not app.extensions.get('background_services'):
+        start_background_services()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Apply pending schema migrations and create the default admin user"""
+    from migrations import MigrationRunner
+    MigrationRunner(database_service.engine).upgrade()
+    create_default_admin()
+    print('Database initialized')
+
 if __name__ == '__main__':
-    # Initialize default admin user
+    create_app()
+    # Initialize default admin user (tables come from `flask init-db`)
     create_default_admin()
     socketio.run(app, debug=True, host='0.0.0.0', port=5000, allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,7 @@
+"""
+Benchmarks and load generators for the Patient Monitor server.
+
+simulator         - asyncio fleet of simulated ESP32 devices (also used by the esp32-simulator container)
+ingest_bench      - drives /api/sensor_data at a fixed rate and reports latency, throughput and DB rows/sec
+emergency_latency - device POST to dashboard socket event latency of the emergency lane (p99 target)
+"""
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Throughput of the population analytics kernels (analytics.py).
+
+By default the readings are synthetic columns generated in memory, chunk by
+chunk, in the (patient_id, timestamp) order the database streams them, so
+100M readings need no database and only one chunk of memory; only the time
+spent inside the accumulators is counted. With --database-url the whole
+query path (server-side cursor, column conversion, kernels) is timed
+against a real table instead.
+
+    python -m benchmarks.analytics_bench --rows 100000000 --patients 5000
+    python -m benchmarks.analytics_bench --database-url postgresql://... --days 7
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision
+
+
+def synthetic_chunks(rows, patients, start, days, chunk_rows, seed=7):
+    """ReadingColumns chunks of SpO2-like values, every patient sampled evenly over the window"""
+    import numpy as np
+
+    from analytics import ReadingColumns
+
+    rng = np.random.default_rng(seed)
+    per_patient = rows // patients
+    interval = days * 86400 / per_patient
+    start_epoch = start.replace(tzinfo=timezone.utc).timestamp()
+    for first in range(0, per_patient * patients, chunk_rows):
+        index = np.arange(first, min(first + chunk_rows, per_patient * patients))
+        patient_id = index // per_patient + 1
+        ts = start_epoch + (index % per_patient) * interval
+        values = rng.normal(95.5, 2.0, len(index)).astype(np.float32)
+        yield ReadingColumns(patient_id, ts, values)
+
+
+def time_synthetic(args, start, end, rooms):
+    from analytics import BucketAverager, EpisodeCounter
+
+    counter = EpisodeCounter(below=args.below)
+    by_room = BucketAverager(start, end, args.bucket, group_of_patient=rooms)
+    by_patient = BucketAverager(start, end, args.bucket)
+    kernels = {'threshold_events': counter, 'bucket_averages_room': by_room, 'bucket_averages_patient': by_patient}
+    elapsed = dict.fromkeys(kernels, 0.0)
+
+    rows = 0
+    last_report = time.monotonic()
+    for chunk in synthetic_chunks(args.rows, args.patients, start, args.days, args.chunk_rows):
+        for name, kernel in kernels.items():
+            started = time.perf_counter()
+            kernel.add(chunk)
+            elapsed[name] += time.perf_counter() - started
+        rows += len(chunk)
+        if time.monotonic() - last_report > 5:
+            print(f'   ⏩ {rows}/{args.rows} readings')
+            last_report = time.monotonic()
+
+    started = time.perf_counter()
+    flagged = sum(1 for n in counter.episodes.values() if n >= args.min_events)
+    by_room.result()
+    by_patient.result()
+    return rows, elapsed, time.perf_counter() - started, flagged
+
+
+def time_database(args, start, end, rooms):
+    from sqlalchemy import create_engine
+
+    from analytics import BucketAverager, EpisodeCounter, iter_columns
+
+    engine = create_engine(args.database_url)
+    elapsed = {}
+    rows = 0
+    flagged = 0
+    for name in ('threshold_events', 'bucket_averages_room'):
+        if name == 'threshold_events':
+            kernel = EpisodeCounter(below=args.below)
+        else:
+            kernel = BucketAverager(start, end, args.bucket, group_of_patient=rooms)
+        started = time.perf_counter()
+        rows = 0
+        for chunk in iter_columns('oxygen_saturation', start, end, engine=engine, fetch_rows=args.chunk_rows):
+            kernel.add(chunk)
+            rows += len(chunk)
+        if name == 'threshold_events':
+            flagged = sum(1 for n in kernel.episodes.values() if n >= args.min_events)
+        else:
+            kernel.result()
+        elapsed[name] = time.perf_counter() - started
+    return rows, elapsed, 0.0, flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure analytics kernel throughput')
+    parser.add_argument('--rows', type=int, default=10_000_000, help='Synthetic readings')
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--bucket', type=int, default=3600, help='Bucket size in seconds')
+    parser.add_argument('--below', type=float, default=92.0)
+    parser.add_argument('--min-events', type=int, default=4)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    parser.add_argument('--database-url', help='Time the full query path against this database instead')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/analytics-<time>.json)')
+    args = parser.parse_args()
+
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=args.days)
+    rooms = {patient_id: str(100 + patient_id % args.rooms) for patient_id in range(1, args.patients + 1)}
+
+    if args.database_url:
+        print(f'⏱️  Analytics over {args.days} day(s) of {args.database_url.split("@")[-1]}')
+        rows, elapsed, finish_s, flagged = time_database(args, start, end, rooms)
+    else:
+        print(f'⏱️  Analytics over {args.rows} synthetic readings, {args.patients} patients')
+        rows, elapsed, finish_s, flagged = time_synthetic(args, start, end, rooms)
+
+    result = {
+        'benchmark': 'analytics',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'database_url')},
+        'source': 'database' if args.database_url else 'synthetic',
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'git_revision': _git_revision(),
+        },
+        'rows': rows,
+        'patients_flagged': flagged,
+        'finish_ms': round(finish_s * 1000, 1),
+        'queries': {
+            name: {'seconds': round(seconds, 3), 'rows_per_sec': round(rows / seconds) if seconds else None}
+            for name, seconds in elapsed.items()
+        },
+    }
+
+    for name, stats in result['queries'].items():
+        print(f"✅ {name}: {stats['seconds']} s ({stats['rows_per_sec']} readings/s)")
+    print(f"   {flagged} patient(s) with >= {args.min_events} episodes below {args.below}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"analytics-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Sustained live ECG relay throughput (ecg_stream.py).
+
+Runs the app in-process: --patients simulated devices connect to the /ecg
+namespace through Flask-SocketIO test clients and send --block-ms blocks of
+--rate Hz samples on schedule, and --viewers logged-in dashboard clients per
+viewed patient subscribe to its live trace. The socket transport itself is
+not measured, only the server side: the ecg_block handlers, batching, and
+binary frame encoding and fan-out to the patient rooms.
+
+Reports the schedule lag of the senders (sustained means it stays bounded),
+samples delivered per second to viewers, sample age at relay, and the CPU
+cost per block for viewed and unviewed patients (--viewed-fraction).
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.ingest_bench --setup --devices 200
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.ecg_bench --patients 200 --rate 250 --duration 30
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision, latency_summary
+from benchmarks.simulator import build_fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure live ECG relay throughput')
+    parser.add_argument('--patients', type=int, default=200, help='Streaming devices (fixture patients)')
+    parser.add_argument('--rate', type=int, default=250, help='Samples per second per device')
+    parser.add_argument('--block-ms', type=float, default=100.0, help='Samples per block, in milliseconds')
+    parser.add_argument('--viewers', type=int, default=1, help='Dashboards per viewed patient')
+    parser.add_argument('--viewed-fraction', type=float, default=1.0, help='Fraction of patients being viewed')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+    parser.add_argument('--flush-ms', type=float, default=100.0)
+    parser.add_argument('--prefix', default='BENCH')
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/ecg-<time>.json)')
+    args = parser.parse_args()
+
+    import app as appmod
+    from ecg_stream import BLOCK_HEADER, ECG_NAMESPACE, FRAME_HEADER, ecg_relay, pack_block
+
+    appmod.create_app()
+    ecg_relay.flush_ms = args.flush_ms
+    threading.Thread(target=ecg_relay.run, daemon=True).start()
+
+    appmod.create_default_admin()
+    http = appmod.app.test_client()
+    http.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    fleet = build_fleet(args.patients, seed=args.seed, prefix=args.prefix)
+    devices = []
+    for device in fleet:
+        client = appmod.socketio.test_client(appmod.app, namespace=ECG_NAMESPACE, auth={'device_id': device.device_id})
+        if not client.is_connected(ECG_NAMESPACE):
+            print(f'❌ {device.device_id} was refused, run ingest_bench --setup --devices {args.patients} first')
+            sys.exit(1)
+        devices.append((device, client))
+
+    viewed = int(round(args.patients * args.viewed_fraction))
+    viewers = []
+    patient_by_device = {device.device_id: appmod.database_service.get_patient_by_device_id(device.device_id)['id']
+                         for device, _ in devices}
+    for device, _ in devices[:viewed]:
+        for _ in range(args.viewers):
+            viewer = appmod.socketio.test_client(appmod.app, flask_test_client=http)
+            viewer.emit('ecg_subscribe', {'patient_id': patient_by_device[device.device_id]})
+            viewers.append(viewer)
+    for viewer in viewers:
+        viewer.get_received()
+
+    samples_per_block = max(1, int(args.rate * args.block_ms / 1000))
+    block_seconds = samples_per_block / args.rate
+    # Pre-generated waveform per device, so the simulator is not part of the measured loop
+    waveforms = [device.ecg_stream(samples_per_block * 10) for device, _ in devices]
+    print(f'⏱️  {args.patients} devices x {args.rate} Hz in {samples_per_block}-sample blocks, '
+          f'{viewed} viewed by {args.viewers} dashboard(s) each, {os.cpu_count()} CPU(s)')
+
+    lags = []
+    blocks_sent = 0
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    epoch_started = time.time()
+    tick = 0
+    while True:
+        scheduled = started + tick * block_seconds
+        if scheduled - started >= args.duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lags.append(max(0.0, time.perf_counter() - scheduled))
+        # Each block is sent once its last sample has been taken
+        t0_ms = (epoch_started + (tick - 1) * block_seconds) * 1000
+        for index, (device, client) in enumerate(devices):
+            wave = waveforms[index]
+            first = tick % 10 * samples_per_block
+            client.emit('ecg_block', pack_block(t0_ms, args.rate, wave[first:first + samples_per_block]),
+                        namespace=ECG_NAMESPACE)
+            blocks_sent += 1
+        tick += 1
+    elapsed = time.perf_counter() - started
+    time.sleep(args.flush_ms / 1000 * 3)
+    cpu_seconds = time.process_time() - cpu_started
+
+    frames = 0
+    samples = 0
+    ages = []
+    for viewer in viewers:
+        for packet in viewer.get_received():
+            if packet['name'] != 'ecg':
+                continue
+            frame = packet['args'][0]
+            _, relayed_ms, blocks = FRAME_HEADER.unpack_from(frame)
+            frames += 1
+            offset = FRAME_HEADER.size
+            for _ in range(blocks):
+                t0, rate, count = BLOCK_HEADER.unpack_from(frame, offset)
+                offset += BLOCK_HEADER.size + 2 * count
+                samples += count
+                # Age of the block's last sample when its frame left the server
+                ages.append((relayed_ms - (t0 + count * 1000 / rate)) / 1000)
+
+    target = args.patients * args.rate
+    result = {
+        'benchmark': 'ecg_stream',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'git_revision': _git_revision(),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'blocks_sent': blocks_sent,
+        'samples_sent_per_sec': round(blocks_sent * samples_per_block / elapsed, 1),
+        'target_samples_per_sec': target,
+        'sender_lag': latency_summary(lags),
+        'frames_received': frames,
+        'samples_delivered_per_sec': round(samples / elapsed, 1),
+        'expected_delivered_per_sec': viewed * args.viewers * args.rate,
+        'sample_age_at_relay': latency_summary(ages),
+        'cpu_utilization': round(cpu_seconds / elapsed, 3),
+        'cpu_us_per_block': round(cpu_seconds / blocks_sent * 1e6, 1) if blocks_sent else None,
+    }
+    print(f"✅ sent {result['samples_sent_per_sec']:,.0f}/{target:,} samples/s, sender lag p99 "
+          f"{result['sender_lag']['p99_ms']} ms, delivered {result['samples_delivered_per_sec']:,.0f}"
+          f"/{result['expected_delivered_per_sec']:,} samples/s")
+    print(f"   sample age at relay p50 {result['sample_age_at_relay']['p50_ms']} ms, "
+          f"p99 {result['sample_age_at_relay']['p99_ms']} ms; CPU {result['cpu_utilization']:.0%}, "
+          f"{result['cpu_us_per_block']} µs/block")
+
+    ecg_relay.stop()
+    output = args.output or os.path.join(RESULTS_DIR, f"ecg-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
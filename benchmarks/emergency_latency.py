@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency of the emergency lane: device POST to /api/emergency_event
+until a logged-in dashboard client receives the 'emergency' sync event.
+
+A Socket.IO client logs in like a nurse station and listens; fall and
+emergency-button events are posted at a fixed rate, optionally on top of
+routine /api/sensor_data load, and the p99 is checked against a target.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.ingest_bench --setup --devices 200
+    python -m benchmarks.emergency_latency --events 500 --background-devices 200 --background-rate 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision, latency_summary
+from benchmarks.simulator import AsyncHTTPClient, build_fleet, device_id_for, run_device
+
+
+class DashboardListener:
+    """Logged-in Socket.IO client recording when each emergency event arrives"""
+
+    def __init__(self, base_url, username, password):
+        import requests
+        import socketio
+
+        self.base_url = base_url
+        self.http = requests.Session()
+        response = self.http.post(urljoin(base_url, '/login'),
+                                  data={'username': username, 'password': password}, allow_redirects=False)
+        if response.status_code != 302:
+            raise RuntimeError(f'Login as {username} failed ({response.status_code})')
+
+        self.received = {}
+        self._lock = threading.Lock()
+        self.synced = threading.Event()
+        self.client = socketio.Client(reconnection=False, http_session=self.http)
+        self.client.on('sync_event', self._on_event)
+        self.client.on('sync_snapshot', lambda snapshot: self.synced.set())
+
+    def _on_event(self, event):
+        if event.get('type') == 'emergency':
+            now = time.perf_counter()
+            with self._lock:
+                self.received.setdefault(event['data']['event_id'], now)
+
+    def connect(self):
+        self.client.connect(self.base_url, wait_timeout=10)
+        # Subscribes to every ward, like a dashboard without a ward filter
+        self.client.emit('sync_request', {})
+        if not self.synced.wait(10):
+            raise RuntimeError('No sync snapshot from the server')
+
+    def close(self):
+        self.client.disconnect()
+
+
+async def post_emergencies(args, sent):
+    client = AsyncHTTPClient(urljoin(args.base_url, '/api/emergency_event'), pool_size=8, timeout=args.timeout)
+    rng = random.Random(args.seed)
+    statuses = {}
+    loop = asyncio.get_running_loop()
+    next_at = loop.time()
+    try:
+        for _ in range(args.events):
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_at += 1.0 / args.rate
+            event_id = str(uuid.uuid4())
+            kind = 'fall' if rng.random() < 0.5 else 'emergency_button'
+            payload = {
+                'device_id': device_id_for(rng.randrange(args.devices), args.prefix),
+                'event': kind,
+                'event_id': event_id,
+            }
+            if kind == 'fall':
+                payload['fall_confidence'] = 0.9
+            sent[event_id] = time.perf_counter()
+            status, _ = await client.post_json(payload)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+    finally:
+        await client.close()
+    # Give the last emits time to arrive
+    await asyncio.sleep(args.drain)
+    return statuses
+
+
+async def run_benchmark(args):
+    sent = {}
+    background = []
+    if args.background_devices:
+        fleet = build_fleet(args.background_devices, seed=args.seed, prefix=args.prefix)
+        routine = AsyncHTTPClient(urljoin(args.base_url, '/api/sensor_data'), pool_size=args.concurrency,
+                                  timeout=args.timeout)
+        interval = args.background_devices / args.background_rate
+        stop_at = asyncio.get_running_loop().time() + args.events / args.rate + args.drain
+        spread = random.Random(args.seed)
+        background = [run_device(device, routine, interval, stop_at, start_offset=spread.uniform(0, interval))
+                      for device in fleet]
+    try:
+        results = await asyncio.gather(post_emergencies(args, sent), *background)
+    finally:
+        if args.background_devices:
+            await routine.close()
+    return sent, results[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure device-to-dashboard latency of emergency events')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--devices', type=int, default=200, help='Fixture devices to pick emergencies from')
+    parser.add_argument('--prefix', default='BENCH')
+    parser.add_argument('--events', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=10.0, help='Emergency events per second')
+    parser.add_argument('--background-devices', type=int, default=0, help='Devices sending routine readings meanwhile')
+    parser.add_argument('--background-rate', type=float, default=50.0, help='Routine readings per second')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--drain', type=float, default=2.0, help='Seconds to wait for the last events')
+    parser.add_argument('--target-p99-ms', type=float, default=100.0)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/emergency-<time>.json)')
+    args = parser.parse_args()
+
+    listener = DashboardListener(args.base_url, args.username, args.password)
+    listener.connect()
+    try:
+        print(f'🚨 {args.events} emergency events at {args.rate:g}/s, '
+              f'{args.background_rate if args.background_devices else 0:g} routine readings/s in the background')
+        sent, statuses = asyncio.run(run_benchmark(args))
+    finally:
+        listener.close()
+
+    latencies = [listener.received[event_id] - at for event_id, at in sent.items() if event_id in listener.received]
+    summary = latency_summary(latencies)
+    passed = summary['p99_ms'] is not None and summary['p99_ms'] <= args.target_p99_ms and len(latencies) == len(sent)
+    result = {
+        'benchmark': 'emergency_latency',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('password', 'output')},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'git_revision': _git_revision(),
+        },
+        'statuses': statuses,
+        'sent': len(sent),
+        'received': len(latencies),
+        'latency': summary,
+        'target_p99_ms': args.target_p99_ms,
+        'passed': passed,
+    }
+
+    print(f"{'✅' if passed else '❌'} {len(latencies)}/{len(sent)} received, statuses {statuses}")
+    print(f"   p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, max {summary['max_ms']} ms "
+          f"(target p99 < {args.target_p99_ms:g} ms)")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"emergency-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Throughput of the fall classifier in windows/sec.
+
+Measures classify_windows() directly at several batch sizes (how much the
+vectorization buys), then the micro-batching FallClassifier with several
+threads submitting one window at a time, as request threads do.
+
+    python -m benchmarks.fall_bench --windows 20000
+    python -m benchmarks.fall_bench --batch-sizes 1 64 1024 --threads 32
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fall_eval import RATE_HZ, synthetic_dataset
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision, latency_summary
+
+
+def time_batches(windows, batch_size):
+    from fall_classifier import classify_windows
+
+    started = time.perf_counter()
+    for first in range(0, len(windows), batch_size):
+        classify_windows(windows[first:first + batch_size])
+    return len(windows) / (time.perf_counter() - started)
+
+
+def time_pool(windows, threads, args):
+    from fall_classifier import FallClassifier
+
+    classifier = FallClassifier(batch_size=args.pool_batch_size, batch_wait=args.pool_wait_ms / 1000,
+                                workers=args.workers)
+    latencies = []
+    lock = threading.Lock()
+
+    def submitter(share):
+        mine = []
+        for rate, samples in share:
+            started = time.perf_counter()
+            classifier.submit(rate, samples).result(timeout=30)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=submitter, args=(windows[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(windows) / (time.perf_counter() - started), latencies
+
+
+def main():
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description='Measure fall classifier throughput')
+    parser.add_argument('--windows', type=int, default=20000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 256, 1024])
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent submitters for the pool run')
+    parser.add_argument('--workers', type=int, default=2, help='Classifier pool threads')
+    parser.add_argument('--pool-batch-size', type=int, default=256)
+    parser.add_argument('--pool-wait-ms', type=float, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/fall-<time>.json)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    _, _, samples = synthetic_dataset(args.windows, rng)
+    windows = [(float(RATE_HZ), window) for window in samples]
+    print(f'⏱️  {args.windows} windows of {samples.shape[1]} samples at {RATE_HZ} Hz')
+
+    batches = {}
+    for batch_size in args.batch_sizes:
+        rates = [time_batches(windows, batch_size) for _ in range(args.repeat)]
+        batches[batch_size] = round(statistics.median(rates))
+        print(f'   batch {batch_size:>5}: {batches[batch_size]:>10} windows/s')
+
+    pool_rate, latencies = time_pool(windows, args.threads, args)
+    print(f'   pool ({args.threads} submitters, {args.workers} workers): {round(pool_rate)} windows/s')
+
+    result = {
+        'benchmark': 'fall_classifier',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'git_revision': _git_revision(),
+        },
+        'windows_per_sec_by_batch': batches,
+        'pool': {'windows_per_sec': round(pool_rate), 'latency': latency_summary(latencies)},
+    }
+    print(f"✅ pool p99 {result['pool']['latency']['p99_ms']} ms per window")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"fall-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
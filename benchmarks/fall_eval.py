@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the fall classifier (fall_classifier.py) on synthetic
+accelerometer windows.
+
+Falls (forward/backward/sideways, with or without a little movement after)
+are mixed with activities that look partly like one: walking, sitting down
+hard, jumping, lying down slowly, and stumbling without falling. Reports
+precision/recall/F1 at FALL_THRESHOLD, ROC AUC, the per-activity detection
+rate and the mean of every feature, so weight changes can be compared.
+
+    python -m benchmarks.fall_eval --windows 5000
+    python -m benchmarks.fall_eval --threshold 0.6 --seed 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision
+
+RATE_HZ = 50
+SECONDS = 4
+
+FALLS = ('fall_forward', 'fall_backward', 'fall_sideways', 'fall_then_moving')
+ACTIVITIES = ('walking', 'sit_down_hard', 'jump', 'lie_down_slowly', 'stumble')
+
+
+def _rotate(gravity_axis_from, gravity_axis_to, progress):
+    """Unit gravity vectors turning from one axis to another as progress goes 0 -> 1"""
+    import numpy as np
+
+    angle = np.clip(progress, 0, 1)[:, None] * (np.pi / 2)
+    return np.cos(angle) * gravity_axis_from + np.sin(angle) * gravity_axis_to
+
+
+def synthetic_window(kind, rng, rate=RATE_HZ, seconds=SECONDS):
+    """(length, 3) samples in g for one activity; upright gravity is +z"""
+    import numpy as np
+
+    length = int(rate * seconds)
+    t = np.arange(length) / rate
+    up = np.array([0.0, 0.0, 1.0])
+    side = {'fall_forward': [1.0, 0, 0], 'fall_backward': [-1.0, 0, 0]}.get(kind, [0, 1.0, 0])
+    side = np.array(side)
+    noise = rng.normal(0, rng.uniform(0.02, 0.06), (length, 3))
+    gravity = np.tile(up, (length, 1))
+    extra = np.zeros(length)
+
+    impact_at = rng.uniform(1.2, 2.0)
+    if kind in FALLS:
+        fall_time = rng.uniform(0.3, 0.6)
+        falling = (t >= impact_at - fall_time) & (t < impact_at)
+        gravity[falling] *= rng.uniform(0.1, 0.5)
+        progress = (t - (impact_at - fall_time)) / fall_time
+        turned = _rotate(up, side, progress)
+        gravity[t >= impact_at] = turned[t >= impact_at]
+        gravity[falling] = turned[falling] * np.linalg.norm(gravity[falling], axis=1, keepdims=True)
+        extra += rng.uniform(1.5, 5.0) * np.exp(-((t - impact_at) / rng.uniform(0.02, 0.05)) ** 2)
+        if kind == 'fall_then_moving':
+            moving = t > impact_at + rng.uniform(1.0, 1.5)
+            extra[moving] += 0.25 * np.sin(2 * np.pi * 1.5 * t[moving])
+    elif kind == 'walking':
+        extra += rng.uniform(0.2, 0.4) * np.sin(2 * np.pi * rng.uniform(1.6, 2.2) * t)
+    elif kind == 'sit_down_hard':
+        sitting = (t >= impact_at - 0.4) & (t < impact_at)
+        gravity[sitting] *= rng.uniform(0.5, 0.8)
+        extra += rng.uniform(0.6, 1.4) * np.exp(-((t - impact_at) / 0.05) ** 2)
+        gravity[t >= impact_at] = _rotate(up, side, np.full(length, rng.uniform(0.1, 0.3)))[t >= impact_at]
+    elif kind == 'jump':
+        airborne = (t >= impact_at - 0.35) & (t < impact_at)
+        gravity[airborne] *= rng.uniform(0.05, 0.3)
+        extra += rng.uniform(1.5, 3.5) * np.exp(-((t - impact_at) / 0.03) ** 2)
+        walking = t > impact_at + 0.3
+        extra[walking] += 0.3 * np.sin(2 * np.pi * 2 * t[walking])
+    elif kind == 'lie_down_slowly':
+        progress = (t - impact_at) / rng.uniform(1.5, 2.5)
+        gravity = _rotate(up, side, progress)
+    elif kind == 'stumble':
+        extra += rng.uniform(0.8, 1.8) * np.exp(-((t - impact_at) / 0.04) ** 2)
+        extra += 0.3 * np.sin(2 * np.pi * 2 * t)
+    else:
+        raise ValueError(kind)
+
+    direction = gravity / np.maximum(np.linalg.norm(gravity, axis=1, keepdims=True), 1e-6)
+    return (gravity + direction * extra[:, None] + noise).astype(np.float32)
+
+
+def synthetic_dataset(count, rng, fall_share=0.3):
+    """(kinds, labels, windows (count, length, 3)); fall_share of the windows are falls"""
+    import numpy as np
+
+    kinds = [
+        FALLS[rng.integers(len(FALLS))] if rng.random() < fall_share else ACTIVITIES[rng.integers(len(ACTIVITIES))]
+        for _ in range(count)
+    ]
+    windows = np.stack([synthetic_window(kind, rng) for kind in kinds])
+    labels = np.array([kind in FALLS for kind in kinds])
+    return kinds, labels, windows
+
+
+def roc_auc(labels, scores):
+    """Probability a random fall scores above a random non-fall (ties count half)"""
+    import numpy as np
+
+    # 1-based ranks, tied scores sharing their average rank
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    ranks = (np.cumsum(counts) - (counts - 1) / 2)[inverse]
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    if not positives or not negatives:
+        return None
+    return float((ranks[labels].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def main():
+    import numpy as np
+
+    from fall_classifier import FALL_THRESHOLD, FEATURES, score_features, window_features
+
+    parser = argparse.ArgumentParser(description='Evaluate the fall classifier on synthetic windows')
+    parser.add_argument('--windows', type=int, default=5000)
+    parser.add_argument('--fall-share', type=float, default=0.3)
+    parser.add_argument('--threshold', type=float, default=FALL_THRESHOLD)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/fall-eval-<time>.json)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f'🧪 Generating {args.windows} synthetic windows ({RATE_HZ} Hz, {SECONDS} s)')
+    kinds, labels, windows = synthetic_dataset(args.windows, rng, args.fall_share)
+
+    features = window_features(windows, RATE_HZ)
+    scores = score_features(features)
+    predicted = scores >= args.threshold
+
+    true_positive = int((predicted & labels).sum())
+    false_positive = int((predicted & ~labels).sum())
+    false_negative = int((~predicted & labels).sum())
+    precision = true_positive / (true_positive + false_positive) if true_positive + false_positive else None
+    recall = true_positive / (true_positive + false_negative) if true_positive + false_negative else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+
+    kinds = np.array(kinds)
+    per_kind = {}
+    for kind in FALLS + ACTIVITIES:
+        mask = kinds == kind
+        if mask.any():
+            per_kind[kind] = {
+                'windows': int(mask.sum()),
+                'detected_rate': round(float(predicted[mask].mean()), 3),
+                'mean_score': round(float(scores[mask].mean()), 3),
+                'mean_features': {name: round(float(features[mask, i].mean()), 3) for i, name in enumerate(FEATURES)},
+            }
+
+    result = {
+        'benchmark': 'fall_eval',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'git_revision': _git_revision(),
+        },
+        'precision': round(precision, 4) if precision is not None else None,
+        'recall': round(recall, 4) if recall is not None else None,
+        'f1': round(f1, 4) if f1 is not None else None,
+        'roc_auc': round(roc_auc(labels, scores), 4) if labels.any() and not labels.all() else None,
+        'confusion': {'tp': true_positive, 'fp': false_positive, 'fn': false_negative,
+                      'tn': int((~predicted & ~labels).sum())},
+        'per_kind': per_kind,
+    }
+
+    print(f"✅ precision {result['precision']}, recall {result['recall']}, F1 {result['f1']}, AUC {result['roc_auc']}")
+    for kind, stats in per_kind.items():
+        print(f"   {kind:<18} detected {stats['detected_rate']:>6.1%}  mean score {stats['mean_score']:.3f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"fall-eval-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
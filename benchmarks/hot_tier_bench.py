@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Recent-readings queries from the in-memory hot tier (hot_tier.py) against
+the database query they replace.
+
+Seeds --interval-spaced readings over the last day for --patients fixture
+patients (see ingest_bench --setup), warms the hot tier from the database,
+then times /api/patient_readings-shaped lookups (hours=24, with and without
+a row limit) from memory and from the database for random patients.
+Reports warm-up time and memory per patient.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.ingest_bench --setup --devices 200
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.hot_tier_bench --patients 200 --interval 30 --seed-readings
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision, latency_summary
+
+
+def seed_readings(database_service, patients, interval, hours, batch_rows=5000):
+    """Readings every `interval` seconds over the last `hours` for each patient"""
+    rng = random.Random(11)
+    now = datetime.utcnow()
+    per_patient = int(hours * 3600 // interval)
+    batch = []
+    for patient in patients:
+        for i in range(per_patient):
+            batch.append({
+                'patient_id': patient['id'],
+                'device_id': patient['device_id'],
+                'timestamp': now - timedelta(seconds=(per_patient - i) * interval),
+                'heart_rate': round(rng.gauss(78, 8), 1),
+                'oxygen_saturation': round(rng.gauss(97, 1), 1),
+                'body_temperature': round(rng.gauss(36.8, 0.3), 1),
+                'respiratory_rate': round(rng.gauss(16, 2), 1),
+                'room_temperature': 26.5,
+                'humidity': 60.0,
+                'ecg_leads_connected': True,
+                'ecg_status': 'Normal',
+                'fall_detected': False,
+                'fall_confidence': 0.0,
+                'room_detected': 'Phòng 101',
+                'emergency_button_pressed': False,
+                'alert_level': 'normal',
+                'is_emergency': False,
+            })
+            if len(batch) >= batch_rows:
+                database_service.create_readings_and_alerts(batch, [])
+                batch = []
+    if batch:
+        database_service.create_readings_and_alerts(batch, [])
+    return per_patient * len(patients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare hot tier and database reading queries')
+    parser.add_argument('--patients', type=int, default=200, help='Fixture patients to query')
+    parser.add_argument('--interval', type=float, default=30.0, help='Seconds between seeded readings')
+    parser.add_argument('--seed-readings', action='store_true', help='Insert a day of readings first')
+    parser.add_argument('--queries', type=int, default=200, help='Lookups per source and shape')
+    parser.add_argument('--limit', type=int, default=50, help='Row limit of the limited lookups')
+    parser.add_argument('--prefix', default='BENCH')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/hot-tier-<time>.json)')
+    args = parser.parse_args()
+
+    from database_config import database_service
+    from hot_tier import HotTier
+
+    patients = [p for p in database_service.get_all_patients() if (p['medical_id'] or '').startswith(f'MED-{args.prefix}')]
+    patients = patients[:args.patients]
+    if not patients:
+        print('❌ No fixture patients, run ingest_bench --setup first')
+        sys.exit(1)
+    if args.seed_readings:
+        started = time.perf_counter()
+        seeded = seed_readings(database_service, patients, args.interval, 24)
+        print(f'🌱 Seeded {seeded} readings in {time.perf_counter() - started:.1f}s')
+
+    tier = HotTier(hours=24)
+    started = time.perf_counter()
+    loaded = tier.warm([p['id'] for p in patients])
+    warm_seconds = time.perf_counter() - started
+    report = tier.report()
+    print(f"🔥 Warmed {loaded} readings of {len(patients)} patients in {warm_seconds:.2f}s, "
+          f"{report['bytes'] / 1024 / 1024:.1f} MiB ({report['row_bytes']} bytes/reading)")
+
+    rng = random.Random(5)
+    lookups = {}
+    for label, limit in (('24h', None), (f'24h_limit_{args.limit}', args.limit)):
+        for source in ('memory', 'database'):
+            latencies = []
+            for _ in range(args.queries):
+                patient_id = rng.choice(patients)['id']
+                call = time.perf_counter()
+                if source == 'memory':
+                    rows = tier.readings(patient_id, 24, limit)
+                else:
+                    rows = database_service.get_patient_readings(patient_id, 24, limit)
+                latencies.append(time.perf_counter() - call)
+                assert rows is not None
+            lookups[f'{label}_{source}'] = latency_summary(latencies)
+            print(f"✅ {label:<16} {source:<8} p50 {lookups[f'{label}_{source}']['p50_ms']} ms, "
+                  f"p99 {lookups[f'{label}_{source}']['p99_ms']} ms ({len(rows)} rows)")
+
+    per_patient = [patient['bytes'] for patient in report['patients']]
+    result = {
+        'benchmark': 'hot_tier',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': database_service.engine.dialect.name,
+            'git_revision': _git_revision(),
+        },
+        'warm': {'readings': loaded, 'seconds': round(warm_seconds, 3)},
+        'memory': {
+            'bytes': report['bytes'],
+            'row_bytes': report['row_bytes'],
+            'max_patient_bytes': max(per_patient, default=0),
+            'mean_patient_bytes': round(sum(per_patient) / len(per_patient)) if per_patient else 0,
+        },
+        'lookups': lookups,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"hot-tier-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Ingest load test for /api/sensor_data.
+
+Drives a fleet of simulated devices at a fixed aggregate rate against a
+running server and reports p50/p99 latency, throughput and database
+rows/sec. Results are written as JSON so runs can be compared later.
+
+    # Server against a SQLite stand-in
+    DATABASE_URL=sqlite:///bench.db python app.py
+
+    # Create fixture devices/patients once, then run
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.ingest_bench --setup --devices 2000
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.ingest_bench --devices 2000 --rate 200 --duration 60
+
+    # Compare with a stored baseline (non-zero exit on regression)
+    python -m benchmarks.ingest_bench ... --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.simulator import AsyncHTTPClient, build_fleet, device_id_for, run_device
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def latency_summary(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3) if values else None,
+        'p90_ms': round(percentile(values, 90) * 1000, 3) if values else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 3) if values else None,
+        'max_ms': round(values[-1] * 1000, 3) if values else None,
+    }
+
+
+def _engine(database_url):
+    from sqlalchemy import create_engine
+    return create_engine(database_url)
+
+
+def count_rows(database_url):
+    """Return {table: row count} for the tables the ingest path writes to"""
+    from sqlalchemy import text
+    counts = {}
+    with _engine(database_url).connect() as connection:
+        for table in ('sensor_readings', 'alerts'):
+            counts[table] = connection.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+    return counts
+
+
+def setup_fixtures(database_url, devices, prefix):
+    """Create one ESP32 device and one patient per simulated device (idempotent)"""
+    os.environ['DATABASE_URL'] = database_url
+    from sqlalchemy import insert, select
+    from sqlalchemy.orm import Session
+    from database_config import ESP32Device, Patient, database_service
+
+    database_service.create_tables()
+    engine = database_service.engine
+    wanted = [device_id_for(i, prefix) for i in range(devices)]
+    with Session(engine) as session:
+        existing = set(session.scalars(select(ESP32Device.device_id).where(ESP32Device.device_id.in_(wanted))))
+        missing = [d for d in wanted if d not in existing]
+        if missing:
+            session.execute(insert(ESP32Device), [
+                {'device_id': d, 'name': f'Benchmark {d}', 'device_type': 'patient_monitor',
+                 'location': 'Benchmark', 'is_active': True}
+                for d in missing
+            ])
+            session.flush()
+            ids = dict(session.execute(
+                select(ESP32Device.device_id, ESP32Device.id).where(ESP32Device.device_id.in_(missing))).all())
+            session.execute(insert(Patient), [
+                {'name': f'Bệnh nhân {d}', 'medical_id': f'MED-{d}', 'room_number': 'Benchmark',
+                 'device_id': ids[d], 'is_active': True}
+                for d in missing
+            ])
+        session.commit()
+    print(f'📱 Fixtures ready: {devices} device(s), {len(missing)} created')
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args):
+    fleet = build_fleet(args.devices, seed=args.seed, prefix=args.prefix,
+                        fall_rate=args.fall_rate, emergency_rate=args.emergency_rate)
+    client = AsyncHTTPClient(args.url, pool_size=args.concurrency, timeout=args.timeout)
+    interval = args.devices / args.rate
+    spread = random.Random(args.seed)
+
+    service_latencies = []
+    scheduled_latencies = []
+    statuses = {}
+    warmup_until = None
+
+    def on_result(device, payload, status, scheduled, sent, done):
+        key = str(status)
+        statuses[key] = statuses.get(key, 0) + 1
+        if done < warmup_until:
+            return
+        if status == 200:
+            service_latencies.append(done - sent)
+            # Measured from the intended send time so server stalls are not hidden (coordinated omission)
+            scheduled_latencies.append(done - scheduled)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    warmup_until = start + args.warmup
+    stop_at = start + args.warmup + args.duration
+    try:
+        await asyncio.gather(*[
+            run_device(device, client, interval, stop_at, on_result, start_offset=spread.uniform(0, interval))
+            for device in fleet
+        ])
+    finally:
+        await client.close()
+    elapsed = loop.time() - warmup_until
+    return service_latencies, scheduled_latencies, statuses, elapsed
+
+
+def compare(result, baseline_path, tolerance):
+    """Print deltas against a stored result and return False on a regression beyond tolerance"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    ok = True
+    checks = [
+        ('throughput_rps', result['throughput_rps'], baseline.get('throughput_rps'), True),
+        ('latency.p50_ms', result['latency']['p50_ms'], baseline.get('latency', {}).get('p50_ms'), False),
+        ('latency.p99_ms', result['latency']['p99_ms'], baseline.get('latency', {}).get('p99_ms'), False),
+        ('db.sensor_rows_per_sec', result['db']['sensor_rows_per_sec'],
+         baseline.get('db', {}).get('sensor_rows_per_sec'), True),
+    ]
+    print(f'\n📊 Comparison with {baseline_path}')
+    for name, current, previous, higher_is_better in checks:
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        ok = ok and not regressed
+        print(f"   {'❌' if regressed else '✅'} {name}: {previous} -> {current} ({change:+.1%})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the sensor ingest endpoint')
+    parser.add_argument('--url', default='http://localhost:5000/api/sensor_data')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'),
+                        help='Used to count rows written; the same database the server uses')
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=100.0, help='Aggregate readings per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Seconds excluded from latency stats')
+    parser.add_argument('--concurrency', type=int, default=64, help='Maximum open connections')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--prefix', default='BENCH')
+    parser.add_argument('--fall-rate', type=float, default=0.001)
+    parser.add_argument('--emergency-rate', type=float, default=0.0005)
+    parser.add_argument('--setup', action='store_true', help='Create fixture devices and patients, then exit')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/ingest-<time>.json)')
+    parser.add_argument('--compare', help='Baseline result JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative regression')
+    args = parser.parse_args()
+
+    if args.setup:
+        if not args.database_url:
+            parser.error('--setup needs --database-url or DATABASE_URL')
+        setup_fixtures(args.database_url, args.devices, args.prefix)
+        return
+
+    rows_before = count_rows(args.database_url) if args.database_url else None
+    print(f'🚀 {args.devices} devices, {args.rate:g} readings/s, {args.duration:g}s (+{args.warmup:g}s warmup)')
+    service, scheduled, statuses, elapsed = asyncio.run(run_benchmark(args))
+    rows_after = count_rows(args.database_url) if args.database_url else None
+
+    total_ok = statuses.get('200', 0)
+    result = {
+        'benchmark': 'ingest',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('database_url', 'compare', 'output', 'setup')},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'git_revision': _git_revision(),
+        },
+        'statuses': statuses,
+        'throughput_rps': round(len(service) / elapsed, 2) if elapsed > 0 else None,
+        'latency': latency_summary(service),
+        'latency_from_schedule': latency_summary(scheduled),
+        'db': {
+            'sensor_rows': None,
+            'alert_rows': None,
+            'sensor_rows_per_sec': None,
+        },
+    }
+    if rows_before is not None:
+        window = args.warmup + args.duration
+        sensor_rows = rows_after['sensor_readings'] - rows_before['sensor_readings']
+        result['db'] = {
+            'sensor_rows': sensor_rows,
+            'alert_rows': rows_after['alerts'] - rows_before['alerts'],
+            'sensor_rows_per_sec': round(sensor_rows / window, 2),
+        }
+
+    print(f"✅ {total_ok} ok, statuses {statuses}")
+    print(f"   throughput {result['throughput_rps']} req/s, "
+          f"p50 {result['latency']['p50_ms']} ms, p99 {result['latency']['p99_ms']} ms "
+          f"(from schedule: p99 {result['latency_from_schedule']['p99_ms']} ms)")
+    if rows_before is not None:
+        print(f"   DB: {result['db']['sensor_rows']} readings, {result['db']['alert_rows']} alerts, "
+              f"{result['db']['sensor_rows_per_sec']} readings/s")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"ingest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+    if args.compare and not compare(result, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
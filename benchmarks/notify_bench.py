@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency of the notification dispatcher (notifications.py)
+against local stand-ins: a minimal SMTP server and an HTTP gateway standing
+in for the SMS and pager services, both with configurable per-message latency
+and failure rate.
+
+--alerts critical alerts are offered at --rate per second (0 = all at once),
+each routed to the assigned doctor plus --recipients on-call shifts (email,
+SMS and pager each).
+Reports the cost of notify() on the caller's thread, deliveries/sec,
+alert-to-accepted latency per channel, retries and per-recipient rate limiting.
+
+    python -m benchmarks.notify_bench --alerts 2000 --recipients 3
+    python -m benchmarks.notify_bench --alerts 1000 --rate 50
+    python -m benchmarks.notify_bench --alerts 500 --latency 0.05 --failure-rate 0.1
+    python -m benchmarks.notify_bench --alerts 500 --per-minute 6     # default recipient caps
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision, latency_summary
+
+
+class StandIn:
+    """Latency, failure injection and a message count shared by both stand-ins"""
+
+    def __init__(self, latency, failure_rate):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # What the HTTP stand-in answers a refused message with (4xx ones are not retried)
+        self.refused_status = 503
+        self.accepted = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def handle_message(self):
+        if self.latency:
+            time.sleep(self.latency)
+        ok = random.random() >= self.failure_rate
+        with self._lock:
+            if ok:
+                self.accepted += 1
+            else:
+                self.failed += 1
+        return ok
+
+
+def start_smtp(stand_in):
+    """Just enough SMTP for smtplib: EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, line):
+            self.wfile.write(line.encode() + b'\r\n')
+
+        def handle(self):
+            self.reply('220 stand-in ESMTP')
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line[:4].upper()
+                if command in (b'EHLO', b'HELO'):
+                    self.reply('250 stand-in')
+                elif command == b'DATA':
+                    self.reply('354 end with <CRLF>.<CRLF>')
+                    while self.rfile.readline() not in (b'.\r\n', b''):
+                        pass
+                    self.reply('250 queued' if stand_in.handle_message() else '451 try again later')
+                elif command == b'QUIT':
+                    self.reply('221 bye')
+                    return
+                else:
+                    self.reply('250 ok')
+
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_http(stand_in):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            status = 202 if stand_in.handle_message() else stand_in.refused_status
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    from notifications import NotificationDispatcher, SmtpChannel, WebhookChannel
+
+    parser = argparse.ArgumentParser(description='Measure notification dispatcher throughput and latency')
+    parser.add_argument('--alerts', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=0.0, help='Alerts per second (0 = one burst)')
+    parser.add_argument('--recipients', type=int, default=3, help='On-call shifts covering the ward')
+    parser.add_argument('--pool-size', type=int, default=4, help='Connections and workers per channel')
+    parser.add_argument('--latency', type=float, default=0.0, help='Stand-in seconds per accepted message')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of sends the stand-ins refuse')
+    parser.add_argument('--per-minute', type=float, default=1e9, help='Per-recipient cap on every channel')
+    parser.add_argument('--retry-base', type=float, default=0.05)
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/notify-<time>.json)')
+    args = parser.parse_args()
+
+    smtp_stand_in = StandIn(args.latency, args.failure_rate)
+    http_stand_in = StandIn(args.latency, args.failure_rate)
+    smtp_server = start_smtp(smtp_stand_in)
+    http_server = start_http(http_stand_in)
+    http_url = f'http://127.0.0.1:{http_server.server_address[1]}/send'
+
+    channels = [
+        SmtpChannel(f'smtp://127.0.0.1:{smtp_server.server_address[1]}', pool_size=args.pool_size),
+        WebhookChannel('sms', http_url, pool_size=args.pool_size),
+        WebhookChannel('pager', http_url, pool_size=args.pool_size),
+    ]
+    roster = [
+        {'name': f'on-call {i}', 'wards': ['ICU'], 'email': f'oncall{i}@bv.local',
+         'sms': f'+8490000{i:04d}', 'pager': f'{200 + i}'}
+        for i in range(args.recipients)
+    ]
+    dispatcher = NotificationDispatcher(
+        channels, roster, queue_size=max(1000, args.alerts), retry_base=args.retry_base,
+        per_minute={name: args.per_minute for name in ('email', 'sms', 'pager')})
+    dispatcher.patient_lookup = lambda patient_id: {
+        'id': patient_id, 'name': f'Bệnh nhân {patient_id}', 'ward': 'ICU', 'room_number': '101',
+        'assigned_doctor_id': 1}
+    dispatcher.user_lookup = lambda user_id: {'id': user_id, 'email': 'doctor@bv.local'}
+
+    latencies = defaultdict(list)
+    outcomes = Counter()
+    attempts = Counter()
+    lock = threading.Lock()
+
+    def on_result(delivery, outcome):
+        elapsed = time.perf_counter() - delivery.queued_at
+        with lock:
+            outcomes[f'{delivery.channel}:{outcome}'] += 1
+            attempts[delivery.attempts] += 1
+            if outcome == 'sent':
+                latencies[delivery.channel].append(elapsed)
+
+    dispatcher.on_result = on_result
+    dispatcher.start()
+
+    print(f'⏱️  {args.alerts} alerts x {1 + 3 * args.recipients} recipients '
+          f'(stand-in latency {args.latency * 1000:.0f} ms, failure rate {args.failure_rate:.0%})')
+    notify_times = []
+    started = time.perf_counter()
+    for i in range(args.alerts):
+        if args.rate:
+            time.sleep(max(0.0, started + i / args.rate - time.perf_counter()))
+        alert = {'id': i, 'patient_id': i % 50 + 1, 'alert_type': 'vital_signs', 'severity': 'critical',
+                 'message': f'Bệnh nhân {i % 50 + 1} cảnh báo: Nhịp tim: 130 bpm', 'created_at': datetime.utcnow()}
+        call = time.perf_counter()
+        dispatcher.notify(alert)
+        notify_times.append(time.perf_counter() - call)
+    drained = dispatcher.join(timeout=600)
+    elapsed = time.perf_counter() - started
+
+    sent = sum(len(values) for values in latencies.values())
+    result = {
+        'benchmark': 'notifications',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'git_revision': _git_revision(),
+        },
+        'drained': drained,
+        'elapsed_s': round(elapsed, 3),
+        'deliveries_sent': sent,
+        'deliveries_per_sec': round(sent / elapsed, 1),
+        'notify_call': latency_summary(notify_times),
+        'delivery_latency': {channel: latency_summary(values) for channel, values in sorted(latencies.items())},
+        'outcomes': dict(sorted(outcomes.items())),
+        'attempts_per_delivery': {str(k): v for k, v in sorted(attempts.items())},
+        'stand_ins': {
+            'smtp': {'accepted': smtp_stand_in.accepted, 'refused': smtp_stand_in.failed},
+            'http': {'accepted': http_stand_in.accepted, 'refused': http_stand_in.failed},
+        },
+    }
+
+    print(f"✅ {sent} deliveries in {result['elapsed_s']}s ({result['deliveries_per_sec']}/s), "
+          f"notify() p99 {result['notify_call']['p99_ms']} ms")
+    for channel, summary in result['delivery_latency'].items():
+        print(f"   {channel:<6} p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms")
+    print(f"   outcomes {result['outcomes']}")
+
+    for channel in channels:
+        channel.close()
+    smtp_server.shutdown()
+    http_server.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"notify-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
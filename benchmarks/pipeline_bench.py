@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Scaling of /api/sensor_data across ingest worker processes (ingest_pipeline.py).
+
+Runs the app in-process and posts pre-generated simulator payloads from
+--acceptors threads through the Flask test client, so only the server side
+is measured. Each run uses a fresh pipeline with N worker processes; N = 0
+is the in-thread path (everything on request threads under the GIL).
+Per-device admission limits are lifted for the run. Expect scaling only up
+to the cores actually available (reported in the results) and, on SQLite,
+until the single writer becomes the bottleneck.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.ingest_bench --setup --devices 500
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.pipeline_bench --devices 500 --workers 0 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision, latency_summary
+from benchmarks.simulator import build_fleet
+
+
+def run(client, payloads, acceptors):
+    """Post every payload from `acceptors` threads; (elapsed seconds, latencies, status counts)"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    chunks = [payloads[i::acceptors] for i in range(acceptors)]
+
+    def post_all(chunk):
+        local, codes = [], {}
+        for body in chunk:
+            started = time.perf_counter()
+            response = client.post('/api/sensor_data', data=body, content_type='application/json')
+            local.append(time.perf_counter() - started)
+            codes[response.status_code] = codes.get(response.status_code, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    threads = [threading.Thread(target=post_all, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure ingest scaling across worker processes')
+    parser.add_argument('--devices', type=int, default=500, help='Fixture devices (see ingest_bench --setup)')
+    parser.add_argument('--readings', type=int, default=5000, help='Readings per run')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, 8])
+    parser.add_argument('--acceptors', type=int, default=32, help='Concurrent request threads')
+    parser.add_argument('--prefix', default='BENCH')
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/pipeline-<time>.json)')
+    args = parser.parse_args()
+
+    import app as appmod
+    from admission import TokenBuckets
+    from ingest_pipeline import IngestPipeline
+
+    appmod.create_app()
+    appmod.admission_control.buckets = TokenBuckets(rate=1e9, burst=1e9)
+    client = appmod.app.test_client()
+
+    fleet = build_fleet(args.devices, seed=args.seed, prefix=args.prefix)
+    payloads = [json.dumps(fleet[i % len(fleet)].next_payload()).encode() for i in range(args.readings)]
+    warmup = [json.dumps(device.next_payload()).encode() for device in fleet]
+    print(f'⏱️  {args.readings} readings from {args.devices} devices, {args.acceptors} acceptor threads, '
+          f'{os.cpu_count()} CPU(s)')
+
+    runs = {}
+    for workers in args.workers:
+        pipeline = IngestPipeline(workers=workers)
+        pipeline.on_results = appmod.apply_ingest_results
+        appmod.ingest_pipeline = pipeline
+        if pipeline.enabled:
+            pipeline.start()
+        run(client, warmup, args.acceptors)  # worker start-up, patient caches, first track fixes
+
+        elapsed, latencies, statuses = run(client, payloads, args.acceptors)
+        pipeline.stop()
+        runs[workers] = {
+            'elapsed_s': round(elapsed, 3),
+            'readings_per_sec': round(len(payloads) / elapsed, 1),
+            'latency': latency_summary(latencies),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        }
+        label = f'{workers} worker(s)' if workers else 'in-thread'
+        print(f"✅ {label:<12} {runs[workers]['readings_per_sec']:>8}/s, "
+              f"p50 {runs[workers]['latency']['p50_ms']} ms, p99 {runs[workers]['latency']['p99_ms']} ms, "
+              f"statuses {runs[workers]['statuses']}")
+
+    result = {
+        'benchmark': 'ingest_pipeline',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': appmod.database_service.engine.dialect.name,
+            'git_revision': _git_revision(),
+        },
+        'runs': runs,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Throughput of the position tracker (position_tracker.py) with many patients.
+
+Simulates --patients patients wandering around the ward with GPS jitter and
+feeds one fix per patient per tick, either as one batch per tick (how a bulk
+ingest would call it) or one fix at a time (how /api/sensor_data calls it).
+Reports fixes/sec, per-batch latency, state memory, and how much room
+flapping the tracker removes compared with classifying raw fixes.
+
+    python -m benchmarks.position_bench --patients 10000 --ticks 50
+    python -m benchmarks.position_bench --patients 10000 --single-ticks 2
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision, latency_summary
+
+FIX_INTERVAL = 30.0
+JITTER_M = 4.0
+
+
+def simulate(patients, ticks, rng):
+    """(lats, lngs) arrays (ticks, patients): slow walks inside the default rooms plus GPS jitter"""
+    import numpy as np
+
+    from position_tracker import METERS_PER_DEGREE, ROOMS
+
+    boxes = np.array(list(ROOMS.values()))
+    lat_min, lat_max = boxes[:, 0].min(), boxes[:, 1].max()
+    lng_min, lng_max = boxes[:, 2].min(), boxes[:, 3].max()
+    lat = rng.uniform(lat_min, lat_max, patients)
+    lng = rng.uniform(lng_min, lng_max, patients)
+    lats, lngs = np.empty((ticks, patients)), np.empty((ticks, patients))
+    degree = 1 / METERS_PER_DEGREE
+    for tick in range(ticks):
+        # Mostly still, some patients walking a few metres per interval
+        walking = rng.random(patients) < 0.1
+        lat = np.clip(lat + walking * rng.normal(0, 3 * degree, patients), lat_min, lat_max)
+        lng = np.clip(lng + walking * rng.normal(0, 3 * degree, patients), lng_min, lng_max)
+        lats[tick] = lat + rng.normal(0, JITTER_M * degree, patients)
+        lngs[tick] = lng + rng.normal(0, JITTER_M * degree, patients)
+    return lats, lngs
+
+
+def raw_room_changes(lats, lngs):
+    import numpy as np
+
+    from position_tracker import ROOMS, _inside
+
+    changes = 0
+    previous = None
+    for lat, lng in zip(lats, lngs):
+        inside = _inside(list(ROOMS.values()), lat, lng)
+        room = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+        if previous is not None:
+            changes += int((room != previous).sum())
+        previous = room
+    return changes
+
+
+def main():
+    import numpy as np
+
+    from position_tracker import PositionTracker
+
+    parser = argparse.ArgumentParser(description='Measure position tracker throughput')
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--ticks', type=int, default=50, help='Fixes per patient in the batched run')
+    parser.add_argument('--single-ticks', type=int, default=2, help='Fixes per patient in the one-at-a-time run')
+    parser.add_argument('--seed', type=int, default=5)
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/position-<time>.json)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    lats, lngs = simulate(args.patients, args.ticks, rng)
+    patient_ids = list(range(1, args.patients + 1))
+    accuracies = [JITTER_M] * args.patients
+    print(f'⏱️  {args.patients} tracked patients, {args.ticks} fixes each')
+
+    tracker = PositionTracker()
+    batch_times = []
+    tracked_changes = 0
+    previous = None
+    for tick in range(args.ticks):
+        started = time.perf_counter()
+        results = tracker.update(patient_ids, lats[tick], lngs[tick], accuracies,
+                                 [tick * FIX_INTERVAL] * args.patients)
+        batch_times.append(time.perf_counter() - started)
+        rooms = [result['room'] for result in results]
+        if previous is not None:
+            tracked_changes += sum(a != b for a, b in zip(rooms, previous))
+        previous = rooms
+    batched_rate = args.patients * args.ticks / sum(batch_times)
+
+    single = PositionTracker()
+    started = time.perf_counter()
+    for tick in range(args.single_ticks):
+        for k, patient_id in enumerate(patient_ids):
+            single.update([patient_id], [lats[tick, k]], [lngs[tick, k]], [JITTER_M], [tick * FIX_INTERVAL])
+    single_rate = args.patients * args.single_ticks / (time.perf_counter() - started)
+
+    result = {
+        'benchmark': 'position_tracker',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'git_revision': _git_revision(),
+        },
+        'batched_fixes_per_sec': round(batched_rate),
+        'batch_latency': latency_summary(batch_times),
+        'single_fixes_per_sec': round(single_rate),
+        'state_bytes': tracker.state_bytes(),
+        'state_bytes_per_patient': round(tracker.state_bytes() / args.patients, 1),
+        'room_changes': {'raw': raw_room_changes(lats, lngs), 'tracked': tracked_changes},
+    }
+
+    print(f"✅ batched {result['batched_fixes_per_sec']} fixes/s (p99 batch {result['batch_latency']['p99_ms']} ms), "
+          f"one at a time {result['single_fixes_per_sec']} fixes/s")
+    print(f"   state {result['state_bytes'] / 1024:.0f} KiB ({result['state_bytes_per_patient']} B/patient), "
+          f"room changes raw {result['room_changes']['raw']} -> tracked {result['room_changes']['tracked']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"position-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Throughput of replay.py in readings/minute (target: 1M/min on a laptop).
+
+--setup inserts synthetic readings (mostly normal vitals with occasional
+excursions and sensor dropouts) for the first patient in DATABASE_URL; the
+run then replays them under the current rules, or --rules, and reports
+readings/minute for each worker count.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.replay_bench --setup --rows 1000000
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.replay_bench --workers 1 4
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.ingest_bench import RESULTS_DIR, _git_revision
+
+
+def setup(engine, rows, batch=50000, seed=11):
+    import numpy as np
+    from sqlalchemy import insert, select
+
+    from database_config import Patient, SensorReading
+
+    with engine.connect() as connection:
+        patient = connection.execute(select(Patient.id, Patient.device_id).limit(1)).first()
+    if patient is None:
+        raise SystemExit('❌ No patient to attach readings to; run `flask init-db` and add one first')
+
+    rng = np.random.default_rng(seed)
+    start = datetime.utcnow() - timedelta(days=30)
+    step = timedelta(days=30) / rows
+    print(f'🧪 Inserting {rows} readings for patient {patient.id}')
+    for first in range(0, rows, batch):
+        n = min(batch, rows - first)
+        heart_rate = rng.normal(80, 12, n).round()
+        spo2 = np.minimum(rng.normal(97, 1.8, n), 100).round(1)
+        temperature = rng.normal(36.9, 0.5, n).round(1)
+        dropout = rng.random(n) < 0.02
+        heart_rate[dropout] = np.nan
+        values = [
+            {
+                'patient_id': patient.id, 'device_id': patient.device_id,
+                'timestamp': start + step * (first + i),
+                'heart_rate': None if np.isnan(heart_rate[i]) else float(heart_rate[i]),
+                'oxygen_saturation': float(spo2[i]), 'body_temperature': float(temperature[i]),
+                'room_temperature': 25.0, 'humidity': 55.0,
+                'fall_detected': False, 'emergency_button_pressed': False, 'ecg_leads_connected': False,
+                'alert_level': 'normal', 'is_emergency': False,
+            }
+            for i in range(n)
+        ]
+        with engine.begin() as connection:
+            connection.execute(insert(SensorReading), values)
+        print(f'   ⏩ {first + n}/{rows}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure replay throughput')
+    parser.add_argument('--setup', action='store_true', help='Insert synthetic readings first')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--rules', help='JSON thresholds to replay under')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/replay-<time>.json)')
+    args = parser.parse_args()
+
+    from database_config import database_service
+    from replay import replay
+
+    engine = database_service.engine
+    if args.setup:
+        setup(engine, args.rows)
+
+    runs = {}
+    for workers in args.workers:
+        report = replay(engine, datetime(1970, 1, 1), rules_path=args.rules, workers=workers,
+                        chunk_rows=args.chunk_rows)
+        runs[workers] = {k: report[k] for k in ('rows', 'changed', 'elapsed_s', 'rows_per_minute', 'transitions')}
+        print(f"✅ {workers} worker(s): {report['rows']} readings in {report['elapsed_s']}s "
+              f"({report['rows_per_minute']:,}/min), {report['changed']} would change")
+
+    result = {
+        'benchmark': 'replay',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': engine.dialect.name,
+            'git_revision': _git_revision(),
+        },
+        'runs': runs,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"replay-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'💾 Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Simulated ESP32 patient monitors.
+
+Each device produces payloads with the same keys the firmware sends and
+receive_sensor_data reads: vitals from MH-ETLive/DS18B20, room climate from
+DHT11, an AD8232 ECG buffer, fall and emergency-button events, NEO-6M GPS
+and battery/RSSI. Every device has its own seeded RNG so a run is fully
+reproducible from (seed, device index).
+
+Run standalone to keep a fleet posting to a server:
+    python -m benchmarks.simulator --url http://localhost:5000/api/sensor_data --devices 50 --interval 30
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import uuid
+from urllib.parse import urlsplit
+
+ECG_BUFFER_SIZE = 100          # Same as ECG_BUFFER_SIZE in patient_monitor.ino
+ECG_SAMPLE_RATE = 250          # Hz
+ROOM_CENTERS = [
+    (10.77565, 106.70175),     # Phòng 101
+    (10.77575, 106.70175),     # Phòng 102
+    (10.77585, 106.70175),     # Phòng 103
+    (10.77595, 106.70175),     # Phòng Cấp Cứu
+    (10.77605, 106.70175),     # ICU
+]
+
+
+def device_id_for(index, prefix='BENCH'):
+    return f'{prefix}_{index + 1:03d}'
+
+
+class SimulatedDevice:
+    """One ESP32 monitor with a patient whose vitals drift around a personal baseline"""
+
+    def __init__(self, index, seed=0, prefix='BENCH', fall_rate=0.001, emergency_rate=0.0005,
+                 abnormal_rate=0.01, ecg_rate=1.0):
+        self.index = index
+        self.device_id = device_id_for(index, prefix)
+        self.rng = random.Random(seed * 1_000_003 + index)
+        self.fall_rate = fall_rate
+        self.emergency_rate = emergency_rate
+        self.abnormal_rate = abnormal_rate
+        self.ecg_rate = ecg_rate
+
+        rng = self.rng
+        self.baseline = {
+            'heart_rate': rng.gauss(78, 9),
+            'oxygen_saturation': min(99.5, rng.gauss(97.2, 1.0)),
+            'body_temperature': rng.gauss(36.8, 0.25),
+            'respiratory_rate': rng.gauss(16, 2),
+            'bp_systolic': rng.gauss(122, 10),
+            'bp_diastolic': rng.gauss(78, 7),
+        }
+        self.state = dict(self.baseline)
+        self.room = rng.randrange(len(ROOM_CENTERS))
+        self.room_temperature = rng.uniform(22, 28)
+        self.humidity = rng.uniform(45, 65)
+        self.battery_level = rng.uniform(40, 100)
+        self.signal_strength = rng.randint(-80, -45)
+        self.abnormal_left = 0
+        self.ecg_phase = 0.0
+        # message_id like the firmware's: a per-boot prefix (not seeded, so reruns are not duplicates) and a counter
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.messages = itertools.count(1)
+
+    def _drift(self, key, sigma, pull=0.1):
+        # Ornstein-Uhlenbeck style walk that stays near the baseline
+        value = self.state[key]
+        value += pull * (self.baseline[key] - value) + self.rng.gauss(0, sigma)
+        self.state[key] = value
+        return value
+
+    def _ecg_sample(self, t, beat_period):
+        """One AD8232 ADC sample (0-4095) `t` seconds into a beat, with a QRS spike at its start"""
+        value = 1900 + 60 * math.sin(2 * math.pi * t / beat_period)
+        if t < 0.02:
+            value += 1400 * (1 - t / 0.02)
+        elif t < 0.04:
+            value -= 300
+        return int(value + self.rng.gauss(0, 15))
+
+    def ecg_buffer(self, heart_rate):
+        """AD8232 ADC samples with a QRS spike once per beat"""
+        beat_period = 60.0 / max(heart_rate, 20)
+        phase = self.rng.random() * beat_period
+        return ','.join(str(self._ecg_sample((phase + i / ECG_SAMPLE_RATE) % beat_period, beat_period))
+                        for i in range(ECG_BUFFER_SIZE))
+
+    def ecg_stream(self, count):
+        """The next `count` samples of a continuous trace at ECG_SAMPLE_RATE, for live streaming (ecg_stream.py)"""
+        beat_period = 60.0 / max(self.state['heart_rate'], 20)
+        samples = []
+        for _ in range(count):
+            self.ecg_phase = (self.ecg_phase + 1 / ECG_SAMPLE_RATE) % beat_period
+            samples.append(self._ecg_sample(self.ecg_phase, beat_period))
+        return samples
+
+    def next_payload(self):
+        rng = self.rng
+
+        if self.abnormal_left == 0 and rng.random() < self.abnormal_rate:
+            # Start a short abnormal episode: tachycardia with desaturation or fever
+            self.abnormal_left = rng.randint(3, 10)
+            if rng.random() < 0.5:
+                self.state['heart_rate'] += rng.uniform(30, 50)
+                self.state['oxygen_saturation'] -= rng.uniform(4, 9)
+            else:
+                self.state['body_temperature'] += rng.uniform(1.5, 2.5)
+        if self.abnormal_left:
+            self.abnormal_left -= 1
+
+        heart_rate = self._drift('heart_rate', 2.0, pull=0.05 if self.abnormal_left else 0.2)
+        spo2 = min(100.0, self._drift('oxygen_saturation', 0.4, pull=0.05 if self.abnormal_left else 0.3))
+        body_temp = self._drift('body_temperature', 0.05, pull=0.05 if self.abnormal_left else 0.2)
+        respiratory = self._drift('respiratory_rate', 0.8)
+        systolic = self._drift('bp_systolic', 3)
+        diastolic = self._drift('bp_diastolic', 2)
+
+        self.room_temperature += rng.gauss(0, 0.1)
+        self.humidity = min(95.0, max(10.0, self.humidity + rng.gauss(0, 0.5)))
+        self.battery_level = max(0.0, self.battery_level - rng.uniform(0.0, 0.05))
+        self.signal_strength = max(-95, min(-30, self.signal_strength + rng.randint(-2, 2)))
+        if rng.random() < 0.02:
+            self.room = rng.randrange(len(ROOM_CENTERS))
+        lat, lng = ROOM_CENTERS[self.room]
+
+        ecg_leads_connected = rng.random() > 0.02
+        ecg_value = int(rng.gauss(1900, 150)) if ecg_leads_connected else 0
+
+        payload = {
+            'device_id': self.device_id,
+            'message_id': f'{self.boot_id}-{next(self.messages)}',
+            'heart_rate': round(heart_rate, 1),
+            'oxygen_saturation': round(spo2, 1),
+            'body_temperature': round(body_temp, 2),
+            'respiratory_rate': round(respiratory, 1),
+            'bp_systolic': round(systolic),
+            'bp_diastolic': round(diastolic),
+            'room_temperature': round(self.room_temperature, 1),
+            'humidity': round(self.humidity, 1),
+            'ecg_value': ecg_value,
+            'ecg_leads_connected': ecg_leads_connected,
+            'ecg_status': 'Normal' if ecg_leads_connected else 'No Signal',
+            'fall_detected': rng.random() < self.fall_rate,
+            'emergency_button_pressed': rng.random() < self.emergency_rate,
+            'gps_lat': round(lat + rng.gauss(0, 0.00002), 7),
+            'gps_lng': round(lng + rng.gauss(0, 0.00002), 7),
+            'gps_accuracy': round(abs(rng.gauss(2.5, 1.0)), 2),
+            'battery_level': round(self.battery_level, 1),
+            'signal_strength': self.signal_strength,
+        }
+        if ecg_leads_connected and rng.random() < self.ecg_rate:
+            payload['ecg_data'] = self.ecg_buffer(heart_rate)
+        return payload
+
+
+class AsyncHTTPClient:
+    """Minimal HTTP/1.1 JSON client on asyncio streams with a keep-alive connection pool"""
+
+    def __init__(self, url, pool_size=64, timeout=10.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or '/'
+        self.timeout = timeout
+        self._idle = asyncio.Queue()
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def _connect(self):
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def post_json(self, payload, path=None):
+        """POST payload and return (status, body bytes)"""
+        body = json.dumps(payload).encode()
+        request = (
+            f'POST {path or self.path} HTTP/1.1\r\n'
+            f'Host: {self.host}:{self.port}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: keep-alive\r\n\r\n'
+        ).encode() + body
+
+        async with self._slots:
+            reused = not self._idle.empty()
+            conn = self._idle.get_nowait() if reused else await self._connect()
+            try:
+                status, keep_alive, response_body = await self._roundtrip(conn, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # The server dropped an idle keep-alive connection, retry once on a fresh one
+                conn = await self._connect()
+                status, keep_alive, response_body = await self._roundtrip(conn, request)
+            if keep_alive:
+                self._idle.put_nowait(conn)
+            else:
+                conn[1].close()
+            return status, response_body
+
+    async def _roundtrip(self, conn, request):
+        reader, writer = conn
+        try:
+            writer.write(request)
+            await writer.drain()
+            return await asyncio.wait_for(self._read_response(reader), self.timeout)
+        except Exception:
+            writer.close()
+            raise
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return int(status), keep_alive, body
+
+    async def close(self):
+        while not self._idle.empty():
+            _, writer = self._idle.get_nowait()
+            writer.close()
+
+
+async def run_device(device, client, interval, stop_at, on_result=None, start_offset=0.0):
+    """Post one reading every `interval` seconds on a fixed schedule until `stop_at` (loop time)"""
+    loop = asyncio.get_running_loop()
+    scheduled = loop.time() + start_offset
+    while scheduled < stop_at:
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = device.next_payload()
+        sent = loop.time()
+        try:
+            status, _ = await client.post_json(payload)
+        except Exception as e:
+            status = f'error:{type(e).__name__}'
+        done = loop.time()
+        if on_result is not None:
+            on_result(device, payload, status, scheduled, sent, done)
+        scheduled += interval
+
+
+def build_fleet(devices, seed=0, prefix='BENCH', **kwargs):
+    return [SimulatedDevice(i, seed=seed, prefix=prefix, **kwargs) for i in range(devices)]
+
+
+async def _simulate(args):
+    client = AsyncHTTPClient(args.url, pool_size=args.concurrency)
+    fleet = build_fleet(args.devices, seed=args.seed, prefix=args.prefix)
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + (args.duration if args.duration > 0 else float('inf'))
+    spread = random.Random(args.seed)
+
+    def on_result(device, payload, status, scheduled, sent, done):
+        print(f"{'✅' if status == 200 else '❌'} {device.device_id}: HR={payload['heart_rate']}, "
+              f"Temp={payload['body_temperature']}°C -> {status} ({(done - sent) * 1000:.0f} ms)")
+
+    print('🚀 ESP32 Simulator started')
+    print(f'📡 Sending data to: {args.url}')
+    print(f'⏱️  {args.devices} device(s), interval {args.interval} seconds')
+    try:
+        await asyncio.gather(*[
+            run_device(device, client, args.interval, stop_at, on_result,
+                       start_offset=spread.uniform(0, args.interval))
+            for device in fleet
+        ])
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a fleet of ESP32 patient monitors')
+    parser.add_argument('--url', default=os.getenv('FLASK_SERVER_URL', 'http://localhost:5000/api/sensor_data'))
+    parser.add_argument('--devices', type=int, default=int(os.getenv('SIMULATION_DEVICES', 1)))
+    parser.add_argument('--interval', type=float, default=float(os.getenv('SIMULATION_INTERVAL', 30)))
+    parser.add_argument('--duration', type=float, default=0, help='Seconds to run, 0 = forever')
+    parser.add_argument('--prefix', default=os.getenv('SIMULATION_DEVICE_PREFIX', 'ESP32_PATIENT_MONITOR'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrency', type=int, default=64)
+    asyncio.run(_simulate(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
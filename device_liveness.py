@@ -0,0 +1,237 @@
+"""
+In-memory device heartbeat tracker.
+
+Every reading is a heartbeat. Instead of an UPDATE on esp32_devices per
+reading, the tracker keeps last_seen/battery/RSSI in memory and flushes the
+changed devices to the DB in one batch every few seconds. Each device's
+expected next report time sits in a min-heap (O(log n) per heartbeat, stale
+entries are skipped lazily), so a sweep every second finds devices that
+missed their interval and raises offline alerts within seconds.
+"""
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+
+from metrics import metrics
+
+DEVICE_REPORT_INTERVAL = float(os.getenv('DEVICE_REPORT_INTERVAL', 30))   # Firmware DATA_SEND_INTERVAL
+DEVICE_OFFLINE_GRACE = float(os.getenv('DEVICE_OFFLINE_GRACE', 2.5))       # Missed intervals before offline
+DEVICE_OFFLINE_MIN_SECONDS = float(os.getenv('DEVICE_OFFLINE_MIN_SECONDS', 10))
+LOW_BATTERY_THRESHOLD = float(os.getenv('LOW_BATTERY_THRESHOLD', 20))
+LOW_BATTERY_HYSTERESIS = 5.0
+LIVENESS_SWEEP_INTERVAL = float(os.getenv('LIVENESS_SWEEP_INTERVAL', 1))
+LIVENESS_FLUSH_INTERVAL = float(os.getenv('LIVENESS_FLUSH_INTERVAL', 10))
+
+
+class _DeviceState:
+    __slots__ = ('device_pk', 'device_id', 'patient_id', 'ward', 'last_seen', 'last_heartbeat', 'interval',
+                 'battery_level', 'signal_strength', 'generation', 'online', 'low_battery')
+
+    def __init__(self, device_pk, device_id, patient_id, ward=None):
+        self.device_pk = device_pk
+        self.device_id = device_id
+        self.patient_id = patient_id
+        self.ward = ward
+        self.last_seen = None
+        self.last_heartbeat = None
+        self.interval = DEVICE_REPORT_INTERVAL
+        self.battery_level = None
+        self.signal_strength = None
+        self.generation = 0
+        self.online = True
+        self.low_battery = False
+
+    def snapshot(self):
+        return {
+            'id': self.device_pk,
+            'device_id': self.device_id,
+            'patient_id': self.patient_id,
+            'ward': self.ward,
+            'online': self.online,
+            'last_seen': self.last_seen,
+            'battery_level': self.battery_level,
+            'signal_strength': self.signal_strength,
+        }
+
+
+class DeviceLivenessTracker:
+    def __init__(self, grace=DEVICE_OFFLINE_GRACE, min_offline_seconds=DEVICE_OFFLINE_MIN_SECONDS,
+                 low_battery_threshold=LOW_BATTERY_THRESHOLD, clock=time.monotonic):
+        self.grace = grace
+        self.min_offline_seconds = min_offline_seconds
+        self.low_battery_threshold = low_battery_threshold
+        self.clock = clock
+        # Callbacks wired by the app: writer(rows) persists a batch, on_event(kind, state) reacts
+        # to 'online', 'offline' and 'low_battery' transitions
+        self.writer = None
+        self.on_event = None
+
+        self._states = {}
+        self._heap = []
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._running = False
+
+        self._online = metrics.registry.gauge('devices_online', 'Devices currently reporting')
+        self._offline_total = metrics.registry.counter('device_offline_events_total', 'Devices that missed their interval')
+        self._flushed_rows = metrics.registry.counter('device_status_rows_flushed_total', 'Device rows written by batch flush')
+
+    def _deadline(self, state, now):
+        return now + max(state.interval * self.grace, self.min_offline_seconds)
+
+    def _schedule(self, state, now):
+        state.generation += 1
+        heapq.heappush(self._heap, (self._deadline(state, now), state.device_pk, state.generation))
+        # Lazy deletion leaves stale entries behind; rebuild once they dominate the heap
+        if len(self._heap) > 4 * len(self._states) + 64:
+            self._heap = [(self._deadline(s, s.last_heartbeat), s.device_pk, s.generation)
+                          for s in self._states.values() if s.online and s.last_heartbeat is not None]
+            heapq.heapify(self._heap)
+
+    def seed(self, devices):
+        """Register known devices from the DB without raising events for ones already silent"""
+        now_mono = self.clock()
+        now_wall = datetime.utcnow()
+        with self._lock:
+            for device in devices:
+                state = self._states.get(device['id'])
+                if state is None:
+                    state = self._states[device['id']] = _DeviceState(
+                        device['id'], device['device_id'], device.get('patient_id'), device.get('ward'))
+                state.battery_level = device.get('battery_level')
+                state.low_battery = state.battery_level is not None and state.battery_level < self.low_battery_threshold
+                state.signal_strength = device.get('signal_strength')
+                state.last_seen = device.get('last_seen')
+                age = (now_wall - state.last_seen).total_seconds() if state.last_seen else float('inf')
+                state.last_heartbeat = now_mono - age
+                state.online = age < max(state.interval * self.grace, self.min_offline_seconds)
+                if state.online:
+                    self._schedule(state, state.last_heartbeat)
+            self._online.set(value=sum(1 for s in self._states.values() if s.online))
+
+    def heartbeat(self, device_pk, device_id, patient_id=None, ward=None, battery_level=None, signal_strength=None):
+        """Record a report from a device; O(log n)"""
+        now = self.clock()
+        events = []
+        with self._lock:
+            state = self._states.get(device_pk)
+            if state is None:
+                state = self._states[device_pk] = _DeviceState(device_pk, device_id, patient_id, ward)
+                self._online.inc()
+            elif state.last_heartbeat is not None:
+                # Learn the device's real reporting interval (EWMA, clamped against bursts and gaps)
+                gap = min(max(now - state.last_heartbeat, 1.0), 3600.0)
+                state.interval = 0.8 * state.interval + 0.2 * gap if state.online else state.interval
+
+            if not state.online:
+                state.online = True
+                self._online.inc()
+                events.append('online')
+
+            state.patient_id = patient_id if patient_id is not None else state.patient_id
+            state.ward = ward if ward is not None else state.ward
+            state.last_heartbeat = now
+            state.last_seen = datetime.utcnow()
+            if battery_level is not None:
+                state.battery_level = battery_level
+                if not state.low_battery and battery_level < self.low_battery_threshold:
+                    state.low_battery = True
+                    events.append('low_battery')
+                elif state.low_battery and battery_level > self.low_battery_threshold + LOW_BATTERY_HYSTERESIS:
+                    state.low_battery = False
+            if signal_strength is not None:
+                state.signal_strength = signal_strength
+
+            self._schedule(state, now)
+            self._dirty.add(device_pk)
+            snapshot = state.snapshot() if events else None
+
+        for kind in events:
+            self._emit(kind, snapshot)
+
+    def sweep(self):
+        """Mark devices whose deadline passed as offline; returns their snapshots"""
+        now = self.clock()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, device_pk, generation = heapq.heappop(self._heap)
+                state = self._states.get(device_pk)
+                if state is None or generation != state.generation or not state.online:
+                    continue
+                state.online = False
+                self._online.dec()
+                expired.append(state.snapshot())
+        for snapshot in expired:
+            self._offline_total.inc()
+            self._emit('offline', snapshot)
+        return expired
+
+    def flush(self):
+        """Write last_seen/battery/RSSI of devices that reported since the last flush in one batch"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = []
+            for pk in dirty:
+                state = self._states[pk]
+                row = {'id': pk, 'last_seen': state.last_seen}
+                # Devices that never reported battery/RSSI keep the stored values
+                if state.battery_level is not None:
+                    row['battery_level'] = state.battery_level
+                if state.signal_strength is not None:
+                    row['signal_strength'] = state.signal_strength
+                rows.append(row)
+        if not rows or self.writer is None:
+            return 0
+        try:
+            self.writer(rows)
+        except Exception:
+            # Keep the rows for the next attempt
+            with self._lock:
+                self._dirty.update(dirty)
+            raise
+        self._flushed_rows.inc(amount=len(rows))
+        return len(rows)
+
+    def ward_counts(self):
+        """Return {ward: (online, offline)} device counts"""
+        counts = {}
+        with self._lock:
+            for state in self._states.values():
+                online, offline = counts.get(state.ward, (0, 0))
+                counts[state.ward] = (online + 1, offline) if state.online else (online, offline + 1)
+        return counts
+
+    def status(self, device_pk):
+        with self._lock:
+            state = self._states.get(device_pk)
+            return state.snapshot() if state else None
+
+    def _emit(self, kind, snapshot):
+        if self.on_event is not None:
+            self.on_event(kind, snapshot)
+
+    def run(self, sleep=time.sleep):
+        """Background loop: sweep every LIVENESS_SWEEP_INTERVAL, flush every LIVENESS_FLUSH_INTERVAL"""
+        self._running = True
+        next_flush = self.clock() + LIVENESS_FLUSH_INTERVAL
+        while self._running:
+            try:
+                self.sweep()
+                if self.clock() >= next_flush:
+                    next_flush = self.clock() + LIVENESS_FLUSH_INTERVAL
+                    self.flush()
+            except Exception as e:
+                print(f'Device liveness tracker error: {e}')
+            sleep(LIVENESS_SWEEP_INTERVAL)
+
+    def stop(self):
+        self._running = False
+        self.flush()
+
+
+# Create global liveness tracker instance
+liveness_tracker = DeviceLivenessTracker()
@@ -0,0 +1,224 @@
+"""
+Live ECG waveform relay over Socket.IO.
+
+Devices connect to the /ecg namespace and stream blocks of raw AD8232
+samples as binary 'ecg_block' events. Dashboards viewing a patient
+subscribe to that patient's 'ecg:<patient_id>' room; every ECG_FLUSH_MS the
+blocks received for a viewed patient are relayed to its room as one binary
+'ecg' frame. Devices are told with 'ecg_demand' whether anyone is watching,
+so unviewed patients are not streamed at all, and blocks that arrive anyway
+are dropped after a single dict lookup.
+
+Block (little-endian), relayed unchanged:
+    float64 t0      time of the first sample, epoch milliseconds (0 = stamped on arrival)
+    uint16  rate    samples per second
+    uint16  n       number of samples
+    int16   x n     ADC samples
+Frame: uint32 patient_id, float64 relay time (epoch milliseconds), uint16 block count, then the blocks.
+A flush that buffered more than FRAME_MAX_BLOCKS blocks for a patient sends several frames.
+"""
+
+import os
+import struct
+import threading
+import time
+
+from metrics import metrics
+
+ECG_FLUSH_MS = float(os.getenv('ECG_FLUSH_MS', 100))
+ECG_MAX_BLOCK_SAMPLES = int(os.getenv('ECG_MAX_BLOCK_SAMPLES', 2048))
+# Blocks buffered per patient between flushes; older ones are dropped if a flush falls behind
+ECG_MAX_PENDING_BLOCKS = int(os.getenv('ECG_MAX_PENDING_BLOCKS', 64))
+
+ECG_NAMESPACE = '/ecg'
+
+BLOCK_HEADER = struct.Struct('<dHH')
+FRAME_HEADER = struct.Struct('<IdH')
+FRAME_MAX_BLOCKS = 0xFFFF
+
+
+def ecg_room(patient_id):
+    """Socket.IO room of the dashboards viewing a patient's live ECG"""
+    return f'ecg:{patient_id}'
+
+
+def pack_block(t0_ms, rate, samples):
+    """One block from int samples, as a device sends it"""
+    return BLOCK_HEADER.pack(t0_ms, rate, len(samples)) + struct.pack(f'<{len(samples)}h', *samples)
+
+
+def iter_blocks(data):
+    """(offset, t0, rate, n) of each block in a payload; ValueError if it is not made of whole blocks"""
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < BLOCK_HEADER.size:
+            raise ValueError('truncated block header')
+        t0, rate, count = BLOCK_HEADER.unpack_from(data, offset)
+        if not rate or not count or count > ECG_MAX_BLOCK_SAMPLES:
+            raise ValueError(f'invalid block (rate {rate}, {count} samples)')
+        end = offset + BLOCK_HEADER.size + 2 * count
+        if end > len(data):
+            raise ValueError('truncated block samples')
+        yield offset, t0, rate, count
+        offset = end
+
+
+def group_frames(payloads):
+    """Split buffered (arrival, data, blocks, samples) entries into frames of at most FRAME_MAX_BLOCKS blocks"""
+    frame, blocks = [], 0
+    for entry in payloads:
+        if frame and blocks + entry[2] > FRAME_MAX_BLOCKS:
+            yield frame
+            frame, blocks = [], 0
+        frame.append(entry)
+        blocks += entry[2]
+    if frame:
+        yield frame
+
+
+class EcgRelay:
+    def __init__(self, flush_ms=ECG_FLUSH_MS, max_pending=ECG_MAX_PENDING_BLOCKS):
+        # Wired by the app: emit(event, data, to, namespace) sends to a room or sid
+        self.emit = None
+        self.flush_ms = flush_ms
+        self.max_pending = max_pending
+        self._viewers = {}        # patient_id -> subscribed dashboard sids
+        self._subscriptions = {}  # dashboard sid -> patient ids
+        self._devices = {}        # device sid -> patient_id
+        self._device_sids = {}    # patient_id -> device sids
+        self._pending = {}        # patient_id -> [(arrival, payload bytes, blocks, samples)]
+        self._lock = threading.Lock()
+        self._running = False
+        self._blocks = metrics.registry.counter('ecg_blocks_total', 'ECG blocks from devices by outcome', ('outcome',))
+        self._samples = metrics.registry.counter('ecg_samples_relayed_total', 'ECG samples relayed to dashboards')
+        self._frames = metrics.registry.counter('ecg_frames_total', 'ECG frames sent to patient rooms')
+        self._viewed = metrics.registry.gauge('ecg_viewed_patients', 'Patients with at least one live ECG viewer')
+        self._relay_seconds = metrics.registry.histogram(
+            'ecg_relay_seconds', 'Time from a block arriving to its frame being sent')
+
+    def _demand(self, patient_id, streaming, sids=None):
+        if self.emit is None:
+            return
+        for sid in sids if sids is not None else list(self._device_sids.get(patient_id, ())):
+            self.emit('ecg_demand', {'streaming': streaming}, to=sid, namespace=ECG_NAMESPACE)
+
+    # Devices
+
+    def connect_device(self, sid, patient_id):
+        with self._lock:
+            self._devices[sid] = patient_id
+            self._device_sids.setdefault(patient_id, set()).add(sid)
+            streaming = patient_id in self._viewers
+        self._demand(patient_id, streaming, [sid])
+
+    def disconnect_device(self, sid):
+        with self._lock:
+            patient_id = self._devices.pop(sid, None)
+            sids = self._device_sids.get(patient_id)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._device_sids[patient_id]
+
+    def add_blocks(self, sid, data):
+        """Buffer a device's blocks for the next flush; returns the number of blocks kept"""
+        patient_id = self._devices.get(sid)
+        if patient_id is None or patient_id not in self._viewers:
+            self._blocks.inc('unviewed')
+            return 0
+        arrival = time.time()
+        try:
+            blocks = list(iter_blocks(data))
+        except (TypeError, ValueError):
+            self._blocks.inc('invalid')
+            return 0
+        if not blocks or len(blocks) > FRAME_MAX_BLOCKS:
+            self._blocks.inc('invalid')
+            return 0
+        if any(t0 == 0 for _, t0, _, _ in blocks):
+            # Devices without a synced clock: the last sample is taken to have arrived just now
+            data = bytearray(data)
+            for offset, t0, rate, count in blocks:
+                if t0 == 0:
+                    BLOCK_HEADER.pack_into(data, offset, arrival * 1000 - count * 1000 / rate, rate, count)
+            data = bytes(data)
+        with self._lock:
+            pending = self._pending.setdefault(patient_id, [])
+            pending.append((arrival, data, len(blocks), sum(count for _, _, _, count in blocks)))
+            if len(pending) > self.max_pending:
+                del pending[0]
+                self._blocks.inc('overflow')
+        self._blocks.inc('relayed', amount=len(blocks))
+        return len(blocks)
+
+    # Dashboards
+
+    def subscribe(self, sid, patient_id):
+        with self._lock:
+            viewers = self._viewers.setdefault(patient_id, set())
+            first = not viewers
+            viewers.add(sid)
+            self._subscriptions.setdefault(sid, set()).add(patient_id)
+            self._viewed.set(value=len(self._viewers))
+        if first:
+            self._demand(patient_id, True)
+
+    def unsubscribe(self, sid, patient_id=None):
+        """Stop relaying to a dashboard for one patient, or for all of them (disconnect)"""
+        stopped = []
+        with self._lock:
+            patient_ids = self._subscriptions.get(sid, set())
+            for pk in [patient_id] if patient_id is not None else list(patient_ids):
+                patient_ids.discard(pk)
+                viewers = self._viewers.get(pk)
+                if viewers is None:
+                    continue
+                viewers.discard(sid)
+                if not viewers:
+                    del self._viewers[pk]
+                    self._pending.pop(pk, None)
+                    stopped.append(pk)
+            if not patient_ids:
+                self._subscriptions.pop(sid, None)
+            self._viewed.set(value=len(self._viewers))
+        for pk in stopped:
+            self._demand(pk, False)
+
+    # Relay
+
+    def flush(self):
+        """Send each viewed patient's buffered blocks as one frame; returns the number of frames"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.emit is None:
+            return 0
+        now = time.time()
+        frames = 0
+        for patient_id, payloads in pending.items():
+            for entries in group_frames(payloads):
+                frame = b''.join([FRAME_HEADER.pack(patient_id, now * 1000, sum(entry[2] for entry in entries))]
+                                 + [entry[1] for entry in entries])
+                self.emit('ecg', frame, to=ecg_room(patient_id), namespace='/')
+                frames += 1
+            self._samples.inc(amount=sum(entry[3] for entry in payloads))
+            for arrival, *_ in payloads:
+                self._relay_seconds.observe(value=now - arrival)
+        self._frames.inc(amount=frames)
+        return frames
+
+    def run(self, sleep=time.sleep):
+        """Background loop flushing every ECG_FLUSH_MS"""
+        self._running = True
+        while self._running:
+            sleep(self.flush_ms / 1000)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'ECG relay error: {e}')
+
+    def stop(self):
+        self._running = False
+
+
+# Create global ECG relay instance
+ecg_relay = EcgRelay()
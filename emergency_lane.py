@@ -0,0 +1,149 @@
+"""
+Fast path for critical device events (falls, emergency button).
+
+Critical events get their own endpoint instead of waiting for the next
+30-second reading. The lane pushes the event to clinicians first and only
+then persists it from a background worker that drains a priority queue.
+The same priorities order the ingest pipeline's worker queues, where
+readings flagged as emergencies go ahead of routine ones.
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from metrics import metrics
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_ROUTINE = 10
+
+EMERGENCY_DEDUP_SECONDS = float(os.getenv('EMERGENCY_DEDUP_SECONDS', 60))
+DEVICE_CACHE_TTL = float(os.getenv('EMERGENCY_DEVICE_CACHE_TTL', 60))
+
+EVENT_KINDS = {
+    'fall': ('fall_detection', 'Phát hiện té ngã'),
+    'emergency_button': ('emergency_button', 'Nút cảnh báo khẩn cấp được nhấn'),
+}
+
+
+class PriorityWorkQueue:
+    """Background worker running callables in priority order (lower first), FIFO within a priority"""
+
+    def __init__(self, name, maxsize=10000):
+        self.name = name
+        self._queue = queue.PriorityQueue(maxsize=maxsize)
+        self._counter = itertools.count()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._wait = metrics.registry.histogram(
+            'work_queue_wait_seconds', 'Time jobs spend queued before running', ('queue', 'priority'))
+        self._failures = metrics.registry.counter(
+            'work_queue_failures_total', 'Jobs that raised', ('queue',))
+
+    def submit(self, priority, func, *args):
+        # Started on first use so jobs can never sit in a queue nobody drains
+        self.start()
+        self._queue.put_nowait((priority, next(self._counter), time.perf_counter(), func, args))
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-worker', daemon=True)
+                self._thread.start()
+
+    def join(self):
+        """Block until everything queued so far has run"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            priority, _, enqueued, func, args = self._queue.get()
+            self._wait.observe(self.name, str(priority), value=time.perf_counter() - enqueued)
+            try:
+                func(*args)
+            except Exception as e:
+                self._failures.inc(self.name)
+                print(f'{self.name} job failed: {e}')
+            finally:
+                self._queue.task_done()
+
+
+class EmergencyLane:
+    def __init__(self, work_queue):
+        self.work_queue = work_queue
+        # Wired by the app: patient_lookup(device_id) -> patient dict or None,
+        # publish(event) pushes to clinicians, persist(event) writes the alert and reading
+        self.patient_lookup = None
+        self.publish = None
+        self.persist = None
+        self._patients = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+        self._handled = metrics.registry.counter(
+            'emergency_events_total', 'Critical events received on the fast path', ('kind',))
+        self._emit_latency = metrics.registry.histogram(
+            'emergency_emit_seconds', 'Request arrival to socket emit for critical events')
+
+    def patient_for(self, device_id):
+        """Patient wearing the device, cached for DEVICE_CACHE_TTL"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._patients.get(device_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        patient = self.patient_lookup(device_id)
+        if patient is not None:
+            with self._lock:
+                self._patients[device_id] = (now + DEVICE_CACHE_TTL, patient)
+        return patient
+
+    def handle(self, data, patient, received_at=None):
+        """Emit a critical event for `patient` immediately and queue its persistence; returns the event"""
+        received_at = received_at or time.perf_counter()
+        kind = data.get('event')
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"Unknown emergency event '{kind}'")
+
+        alert_type, label = EVENT_KINDS[kind]
+        message = f"Bệnh nhân {patient['name']} cảnh báo: {label}"
+        if kind == 'fall' and data.get('fall_confidence') is not None:
+            message += f" (độ tin cậy: {float(data['fall_confidence']):.1%})"
+        event = {
+            'event_id': str(data.get('event_id') or uuid.uuid4()),
+            'kind': kind,
+            'alert_type': alert_type,
+            'device_id': data['device_id'],
+            'device_pk': patient['device_id'],
+            'patient_id': patient['id'],
+            'patient_name': patient['name'],
+            'room_number': patient.get('room_number'),
+            'ward': patient['ward'],
+            'message': message,
+            'fall_confidence': data.get('fall_confidence'),
+            'gps_lat': data.get('gps_lat'),
+            'gps_lng': data.get('gps_lng'),
+            'received_at': datetime.utcnow(),
+        }
+
+        self.publish(event)
+        self._emit_latency.observe(value=time.perf_counter() - received_at)
+        self._handled.inc(kind)
+        with self._lock:
+            self._recent[(data['device_id'], kind)] = time.monotonic()
+        self.work_queue.submit(PRIORITY_EMERGENCY, self.persist, event)
+        return event
+
+    def recently_reported(self, device_id, kind):
+        """True if the fast path already raised this kind of event for the device within the dedup window"""
+        with self._lock:
+            reported = self._recent.get((device_id, kind))
+        return reported is not None and time.monotonic() - reported < EMERGENCY_DEDUP_SECONDS
+
+
+# Create global persistence queue and emergency lane instances
+persistence_queue = PriorityWorkQueue('persistence')
+emergency_lane = EmergencyLane(persistence_queue)
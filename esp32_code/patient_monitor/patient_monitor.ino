@@ -16,6 +16,7 @@ const char* password = "YOUR_WIFI_PASSWORD";  // ⚠️ CẬP NHẬT MẬT KHẨ
 
 // Server configuration - CẬP NHẬT IP DOCKER HOST
 const char* serverURL = "http://192.168.1.100:5000/api/sensor_data";  // ⚠️ CẬP NHẬT IP ADDRESS THỰC TẾ CỦA MÁY TÍNH
+const char* emergencyURL = "http://192.168.1.100:5000/api/emergency_event";  // Kênh ưu tiên cho té ngã / nút khẩn cấp
 const char* deviceID = "ESP32_PATIENT_MONITOR_001";  // ID thiết bị duy nhất
 
 // Pin definitions - Định nghĩa chân cho các cảm biến thực tế (ĐÃ SỬA XUNG ĐỘT I2C)
@@ -118,10 +119,15 @@ unsigned long lastSensorRead = 0;
 unsigned long lastGPSRead = 0;
 unsigned long lastDataSend = 0;
 unsigned long lastDisplayUpdate = 0;
+
+// Mã gói tin: server bỏ qua gói gửi lại đã được lưu (khởi động + số thứ tự)
+uint32_t bootID = 0;
+unsigned long messageSeq = 0;
 unsigned long lastFallCheck = 0;
 
 void setup() {
     Serial.begin(115200);
+    bootID = esp_random();
     Serial.println("ESP32 Patient Monitor Starting...");
     Serial.println("Sử dụng các cảm biến thực tế:");
     Serial.println("- GPS NEO-6M: Định vị vị trí");
@@ -582,10 +588,12 @@ void sendDataToServer() {
     HTTPClient http;
     http.begin(serverURL);
     http.addHeader("Content-Type", "application/json");
+    http.setFollowRedirects(HTTPC_STRICT_FOLLOW_REDIRECTS);  // Server shard chuyển hướng (307) về shard của khoa
     
     // Tạo JSON payload đầy đủ
     StaticJsonDocument<800> doc;
     doc["device_id"] = deviceID;
+    doc["message_id"] = String(bootID, HEX) + "-" + String(++messageSeq);
     
     // Dấu hiệu sinh tồn
     doc["heart_rate"] = currentReading.heartRate;
@@ -628,6 +636,11 @@ void sendDataToServer() {
     Serial.println("JSON: " + jsonString);
     
     int httpResponseCode = http.POST(jsonString);
+    if (httpResponseCode < 0 || httpResponseCode == 503) {
+        // Gửi lại đúng gói tin (cùng message_id) một lần; server không lưu trùng
+        delay(1000);
+        httpResponseCode = http.POST(jsonString);
+    }
     
     if (httpResponseCode > 0) {
         String response = http.getString();
@@ -687,6 +700,12 @@ void setStatusLED(String status) {
 
 // Kích hoạt chế độ khẩn cấp
 void triggerEmergency(String reason) {
+    // Gửi ngay lập tức, trước khi còi kêu (còi chặn vòng lặp ~2 giây) và không chờ
+    // chu kỳ gửi dữ liệu 30 giây; cảnh báo do server trả về thì không cần gửi lại
+    if (useFlaskAPIUpload && reason != "SERVER_ALERT") {
+        sendEmergencyAlert(reason);
+    }
+    
     if (!emergencyMode) {
         emergencyMode = true;
         emergencyStartTime = millis();
@@ -699,11 +718,6 @@ void triggerEmergency(String reason) {
             digitalWrite(BUZZER_PIN, LOW);
             delay(200);
         }
-        
-        // Gửi cảnh báo khẩn cấp lên Flask server
-        if (useFlaskAPIUpload) {
-            sendEmergencyAlert(reason);
-        }
     }
 }
 
@@ -714,23 +728,22 @@ void sendEmergencyAlert(String reason) {
     }
     
     HTTPClient http;
-    http.begin(serverURL);
+    http.begin(emergencyURL);
     http.addHeader("Content-Type", "application/json");
+    http.setFollowRedirects(HTTPC_STRICT_FOLLOW_REDIRECTS);
+    http.setTimeout(2000);
     
-    StaticJsonDocument<400> emergencyDoc;
+    StaticJsonDocument<256> emergencyDoc;
     emergencyDoc["device_id"] = deviceID;
-    emergencyDoc["emergency"] = true;
-    emergencyDoc["emergency_reason"] = reason;
-    emergencyDoc["timestamp"] = millis();
-    
-    // Bao gồm dấu hiệu sinh tồn hiện tại
-    emergencyDoc["heart_rate"] = currentReading.heartRate;
-    emergencyDoc["temperature"] = currentReading.bodyTemperature;
-    emergencyDoc["fall_detected"] = currentReading.fallDetected;
-    emergencyDoc["ecg_leads_connected"] = currentReading.ecgLeadsConnected;
-    emergencyDoc["gps_lat"] = currentReading.gpsLatitude;
-    emergencyDoc["gps_lng"] = currentReading.gpsLongitude;
-    emergencyDoc["room_detected"] = currentReading.roomDetected;
+    emergencyDoc["event"] = reason == "FALL_DETECTED" ? "fall" : "emergency_button";
+    emergencyDoc["event_id"] = String(deviceID) + "-" + String(millis());
+    if (reason == "FALL_DETECTED") {
+        emergencyDoc["fall_confidence"] = currentReading.fallConfidence;
+    }
+    if (currentReading.gpsLatitude != 0 || currentReading.gpsLongitude != 0) {
+        emergencyDoc["gps_lat"] = currentReading.gpsLatitude;
+        emergencyDoc["gps_lng"] = currentReading.gpsLongitude;
+    }
     
     String emergencyJson;
     serializeJson(emergencyDoc, emergencyJson);
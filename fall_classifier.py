@@ -0,0 +1,207 @@
+"""
+Server-side fall classifier for raw accelerometer windows.
+
+Devices may attach a short window of accelerometer samples to a reading:
+
+    "accel_window": {"rate_hz": 50, "samples": [[ax, ay, az], ...]}   # in g, up to ACCEL_MAX_SECONDS
+
+A fall shows up as a drop towards free fall, a hard impact with a steep
+jerk, then stillness in a new orientation (lying). Those features are
+computed with NumPy for many windows at once, and a logistic score over them
+gives the fall confidence. Requests are collected into micro-batches (up to
+FALL_BATCH_SIZE windows or FALL_BATCH_WAIT_MS) and classified on a small
+thread pool; NumPy releases the GIL for the heavy parts.
+"""
+
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from metrics import metrics
+
+FALL_THRESHOLD = float(os.getenv('FALL_THRESHOLD', 0.5))
+FALL_BATCH_SIZE = int(os.getenv('FALL_BATCH_SIZE', 256))
+FALL_BATCH_WAIT_MS = float(os.getenv('FALL_BATCH_WAIT_MS', 5))
+FALL_WORKERS = int(os.getenv('FALL_WORKERS', 2))
+FALL_TIMEOUT = float(os.getenv('FALL_TIMEOUT', 1.0))
+ACCEL_MAX_SECONDS = float(os.getenv('ACCEL_MAX_SECONDS', 10))
+
+FEATURES = ('impact', 'freefall', 'jerk', 'stillness', 'tilt')
+
+# Logistic model over the normalized features (tuned with benchmarks/fall_eval.py)
+WEIGHTS = {'impact': 2.0, 'freefall': 1.5, 'jerk': 1.0, 'stillness': 2.0, 'tilt': 3.0}
+BIAS = -8.0
+
+
+def parse_window(window):
+    """(rate_hz, samples as an (n, 3) float32 array) from the payload field; ValueError if malformed"""
+    import numpy as np
+
+    try:
+        rate = float(window['rate_hz'])
+        samples = np.asarray(window['samples'], dtype=np.float32)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid accel_window: {e}')
+    if not 10 <= rate <= 1000:
+        raise ValueError('accel_window rate_hz must be between 10 and 1000')
+    if samples.ndim != 2 or samples.shape[1] != 3:
+        raise ValueError('accel_window samples must be [x, y, z] triples')
+    if not rate <= len(samples) <= rate * ACCEL_MAX_SECONDS:
+        raise ValueError(f'accel_window must hold 1 to {ACCEL_MAX_SECONDS:g} seconds of samples')
+    if not np.isfinite(samples).all():
+        raise ValueError('accel_window samples must be finite numbers')
+    return rate, samples
+
+
+def window_features(windows, rate):
+    """
+    Normalized features (n, len(FEATURES)) of n equally long windows (n, length, 3)
+    sampled at `rate` Hz; every feature is roughly 0 (daily activity) .. 1 (fall).
+    """
+    import numpy as np
+
+    n, length, _ = windows.shape
+    magnitude = np.sqrt(np.einsum('nlk,nlk->nl', windows, windows))
+    index = np.arange(length)[None, :]
+    peak_at = magnitude.argmax(axis=1)[:, None]
+    peak = magnitude.max(axis=1)
+
+    # Lowest magnitude in the second before the impact (free fall reads ~0 g)
+    before = (index < peak_at) & (index >= peak_at - int(rate))
+    lowest = np.where(before, magnitude, np.inf).min(axis=1)
+    lowest = np.where(np.isfinite(lowest), lowest, 1.0)
+
+    jerk = np.abs(np.diff(magnitude, axis=1)).max(axis=1) * rate
+
+    # Movement after the impact has settled (half a second later)
+    after = index > peak_at + int(rate * 0.5)
+    after_count = after.sum(axis=1)
+    enough_after = after_count >= max(2, int(rate * 0.5))
+    after_count = np.maximum(after_count, 1)
+    after_mean = np.where(after, magnitude, 0).sum(axis=1) / after_count
+    after_var = np.where(after, (magnitude - after_mean[:, None]) ** 2, 0).sum(axis=1) / after_count
+    stillness = np.where(enough_after, np.clip(1 - np.sqrt(after_var) / 0.3, 0, 1), 0)
+
+    # Orientation change between the gravity direction before and after the impact
+    settled_before = index < peak_at - int(rate * 0.5)
+    before_vector = np.einsum('nl,nlk->nk', settled_before.astype(np.float32), windows)
+    after_vector = np.einsum('nl,nlk->nk', after.astype(np.float32), windows)
+    norms = np.linalg.norm(before_vector, axis=1) * np.linalg.norm(after_vector, axis=1)
+    cosine = np.einsum('nk,nk->n', before_vector, after_vector) / np.where(norms > 0, norms, 1)
+    angle = np.degrees(np.arccos(np.clip(cosine, -1, 1)))
+    tilt = np.where((norms > 0) & enough_after, np.clip(angle / 60, 0, 1.5), 0)
+
+    return np.stack([
+        np.clip((peak - 1.5) / 2.0, 0, 1.5),
+        np.clip((1 - lowest) / 0.7, 0, 1),
+        np.clip(jerk / 50.0, 0, 1.5),
+        stillness,
+        tilt,
+    ], axis=1)
+
+
+def score_features(features):
+    """Fall probability of each feature row"""
+    import numpy as np
+
+    weights = np.array([WEIGHTS[name] for name in FEATURES], dtype=np.float64)
+    return 1 / (1 + np.exp(-(features @ weights + BIAS)))
+
+
+def classify_windows(windows):
+    """Fall probability of each (rate_hz, samples) window, in order; windows of equal shape are batched"""
+    import numpy as np
+
+    groups = {}
+    for position, (rate, samples) in enumerate(windows):
+        groups.setdefault((rate, len(samples)), []).append(position)
+    probabilities = [0.0] * len(windows)
+    for (rate, _), positions in groups.items():
+        batch = np.stack([windows[p][1] for p in positions])
+        for position, probability in zip(positions, score_features(window_features(batch, rate)).tolist()):
+            probabilities[position] = probability
+    return probabilities
+
+
+class FallClassifier:
+    """Micro-batching front of classify_windows for request threads"""
+
+    def __init__(self, batch_size=FALL_BATCH_SIZE, batch_wait=FALL_BATCH_WAIT_MS / 1000, workers=FALL_WORKERS):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._pool = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._windows = metrics.registry.counter(
+            'fall_classifier_windows_total', 'Accelerometer windows classified', ('result',))
+        self._batch_sizes = metrics.registry.histogram(
+            'fall_classifier_batch_size', 'Windows per classifier batch', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+        self._latency = metrics.registry.histogram(
+            'fall_classifier_seconds', 'Submit to result time of a window')
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fall-classifier')
+                self._thread = threading.Thread(target=self._collect, name='fall-classifier-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, rate, samples):
+        """Future resolving to the fall probability of one parsed window"""
+        self.start()
+        future = Future()
+        self._queue.put((rate, samples, future, time.perf_counter()))
+        return future
+
+    def classify(self, window, timeout=FALL_TIMEOUT):
+        """(fall_detected, confidence) for an accel_window payload field; ValueError/TimeoutError on failure"""
+        try:
+            rate, samples = parse_window(window)
+        except ValueError:
+            self._windows.inc('invalid')
+            raise
+        try:
+            probability = self.submit(rate, samples).result(timeout=timeout)
+        except FutureTimeoutError:
+            self._windows.inc('timeout')
+            raise TimeoutError(f'Fall classifier did not answer within {timeout}s')
+        detected = probability >= FALL_THRESHOLD
+        self._windows.inc('fall' if detected else 'no_fall')
+        return detected, round(probability, 3)
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch):
+        self._batch_sizes.observe(value=len(batch))
+        try:
+            probabilities = classify_windows([(rate, samples) for rate, samples, _, _ in batch])
+        except Exception as e:
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+        now = time.perf_counter()
+        for (_, _, future, submitted), probability in zip(batch, probabilities):
+            self._latency.observe(value=now - submitted)
+            future.set_result(probability if math.isfinite(probability) else 0.0)
+
+
+# Create global fall classifier instance
+fall_classifier = FallClassifier()
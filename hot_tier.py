@@ -0,0 +1,354 @@
+"""
+In-memory hot tier of the last HOT_TIER_HOURS of readings per patient.
+
+Chart and history queries for recent ranges are answered from compact
+columnar arrays (one typed array per field, timestamps as epoch
+microseconds) instead of the database. Ingestion in this process appends
+committed readings; start-up warms the window for this shard's patients.
+A series only answers ranges it fully covers (`since`): older ranges,
+patients this process does not ingest and patients evicted to stay under
+HOT_TIER_MAX_MB fall through to the database.
+"""
+
+import math
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database_config import SensorReading, database_service
+from metrics import metrics
+
+HOT_TIER_HOURS = float(os.getenv('HOT_TIER_HOURS', 24))
+HOT_TIER_MAX_MB = float(os.getenv('HOT_TIER_MAX_MB', 256))
+HOT_TIER_FETCH_ROWS = int(os.getenv('HOT_TIER_FETCH_ROWS', 10000))
+
+# Columns and their array typecodes. Floats hold NaN for NULL; float32 is plenty for vitals, GPS needs float64.
+# Booleans are -1/0/1 (NULL/false/true); strings are indexes into the tier's shared string table.
+FLOAT_FIELDS = (
+    'heart_rate', 'body_temperature', 'oxygen_saturation', 'respiratory_rate',
+    'blood_pressure_systolic', 'blood_pressure_diastolic', 'room_temperature', 'humidity',
+    'ecg_value', 'fall_confidence',
+)
+DOUBLE_FIELDS = ('gps_latitude', 'gps_longitude', 'gps_accuracy')
+BOOL_FIELDS = ('ecg_leads_connected', 'fall_detected', 'emergency_button_pressed')
+STRING_FIELDS = ('ecg_status', 'room_detected', 'alert_level')
+
+COLUMNS = (
+    [(field, 'f') for field in FLOAT_FIELDS] + [(field, 'd') for field in DOUBLE_FIELDS]
+    + [(field, 'b') for field in BOOL_FIELDS] + [(field, 'H') for field in STRING_FIELDS]
+)
+FIELDS = tuple(field for field, _ in COLUMNS)
+
+# id and timestamp are int64 each
+ROW_BYTES = 16 + sum(array(code).itemsize for _, code in COLUMNS)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _micros(value):
+    """Epoch microseconds for a naive UTC datetime"""
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def iter_window(since, patient_ids=None, fetch_rows=HOT_TIER_FETCH_ROWS):
+    """
+    Stream readings since `since` as dicts in (patient_id, timestamp) order.
+    Always reads the primary: a lagging replica could miss rows that
+    ingestion in this process has already committed.
+    """
+    query = select(
+        SensorReading.patient_id, SensorReading.id, SensorReading.timestamp,
+        *(getattr(SensorReading, field) for field in FIELDS)
+    ).where(SensorReading.timestamp >= since).order_by(SensorReading.patient_id, SensorReading.timestamp, SensorReading.id)
+    if patient_ids is not None:
+        query = query.where(SensorReading.patient_id.in_(list(patient_ids)))
+
+    keys = ('patient_id', 'id', 'timestamp') + FIELDS
+    with database_service.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=fetch_rows).execute(query)
+        while True:
+            rows = result.fetchmany(fetch_rows)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(keys, row))
+
+
+class PatientSeries:
+    """One patient's readings as parallel typed arrays sorted by timestamp"""
+
+    def __init__(self, since):
+        # Epoch microseconds from which this series holds every committed reading
+        self.since = since
+        self.timestamps = array('q')
+        self.ids = array('q')
+        self.columns = {field: array(code) for field, code in COLUMNS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return len(self.ids) * ROW_BYTES
+
+    def add(self, reading, encode_string):
+        ts = _micros(reading['timestamp'])
+        values = []
+        for field in FLOAT_FIELDS + DOUBLE_FIELDS:
+            value = reading.get(field)
+            values.append(math.nan if value is None else value)
+        for field in BOOL_FIELDS:
+            value = reading.get(field)
+            values.append(-1 if value is None else int(bool(value)))
+        for field in STRING_FIELDS:
+            values.append(encode_string(reading.get(field)))
+
+        # Readings arrive nearly in time order, so this is an append except across concurrent commits;
+        # rows sharing a timestamp are kept in id order for the (timestamp, id) cursor
+        index = bisect_right(self.timestamps, ts)
+        while index and self.timestamps[index - 1] == ts and self.ids[index - 1] > reading['id']:
+            index -= 1
+        if index == len(self.timestamps):
+            self.timestamps.append(ts)
+            self.ids.append(reading['id'])
+            for field, value in zip(FIELDS, values):
+                self.columns[field].append(value)
+        else:
+            self.timestamps.insert(index, ts)
+            self.ids.insert(index, reading['id'])
+            for field, value in zip(FIELDS, values):
+                self.columns[field].insert(index, value)
+
+    def prune(self, cutoff):
+        """Drop readings older than `cutoff` (epoch microseconds)"""
+        count = bisect_left(self.timestamps, cutoff)
+        if count:
+            del self.timestamps[:count]
+            del self.ids[:count]
+            for column in self.columns.values():
+                del column[:count]
+        self.since = max(self.since, cutoff)
+        return count
+
+    def row(self, index, patient_id, strings):
+        reading = {
+            'id': self.ids[index],
+            'patient_id': patient_id,
+            'timestamp': _EPOCH + timedelta(microseconds=self.timestamps[index]),
+        }
+        for field in FLOAT_FIELDS:
+            value = self.columns[field][index]
+            # Back to the shortest decimal that round-trips through float32, i.e. the value as stored
+            reading[field] = None if value != value else float(f'{value:.7g}')
+        for field in DOUBLE_FIELDS:
+            value = self.columns[field][index]
+            reading[field] = None if value != value else value
+        for field in BOOL_FIELDS:
+            value = self.columns[field][index]
+            reading[field] = None if value < 0 else bool(value)
+        for field in STRING_FIELDS:
+            reading[field] = strings[self.columns[field][index]]
+        return reading
+
+    def rows(self, start, patient_id, strings, limit=None, after=None):
+        """Readings since `start` (epoch microseconds), newest first; after=(epoch microseconds, id) is a cursor"""
+        end = len(self.timestamps)
+        first = bisect_left(self.timestamps, start)
+        if after is not None:
+            # Readings sharing the cursor's timestamp are newer only if their id is higher
+            first = max(first, bisect_left(self.timestamps, after[0]))
+            while first < end and self.timestamps[first] == after[0] and self.ids[first] <= after[1]:
+                first += 1
+        if limit is not None:
+            first = max(first, end - limit)
+        if first >= end:
+            return []
+        # Decode column by column over the slice, then zip into dicts
+        newest_first = slice(end - 1, first - 1 if first else None, -1)
+        columns = [
+            self.ids[newest_first].tolist(),
+            [patient_id] * (end - first),
+            [_EPOCH + timedelta(microseconds=ts) for ts in self.timestamps[newest_first]],
+        ]
+        for field in FLOAT_FIELDS:
+            columns.append([None if value != value else float(f'{value:.7g}')
+                            for value in self.columns[field][newest_first]])
+        for field in DOUBLE_FIELDS:
+            columns.append([None if value != value else value for value in self.columns[field][newest_first]])
+        for field in BOOL_FIELDS:
+            columns.append([None if value < 0 else value == 1 for value in self.columns[field][newest_first]])
+        for field in STRING_FIELDS:
+            columns.append([strings[code] for code in self.columns[field][newest_first]])
+        keys = ('id', 'patient_id', 'timestamp') + FIELDS
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+
+class HotTier:
+    def __init__(self, hours=HOT_TIER_HOURS, max_bytes=HOT_TIER_MAX_MB * 1024 * 1024):
+        self.hours = hours
+        self.max_bytes = max_bytes
+        # Least recently queried first, evicted first when over budget
+        self._series = OrderedDict()
+        self._rows = 0
+        self._strings = [None]
+        self._string_codes = {None: 0}
+        self._lock = threading.Lock()
+        self._queries = metrics.registry.counter(
+            'hot_tier_queries_total', 'Reading range queries by source', ('source',))
+        self._evictions = metrics.registry.counter('hot_tier_evictions_total', 'Patient series evicted for memory')
+        self._bytes = metrics.registry.gauge('hot_tier_bytes', 'Memory held by hot tier columns')
+        self._patients = metrics.registry.gauge('hot_tier_patients', 'Patients with an in-memory series')
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.hours > 0
+
+    def _window_start(self):
+        return _micros(datetime.utcnow() - timedelta(hours=self.hours))
+
+    def _encode_string(self, value):
+        code = self._string_codes.get(value)
+        if code is None:
+            code = self._string_codes[value] = len(self._strings)
+            self._strings.append(value)
+        return code
+
+    def _update_gauges(self):
+        self._bytes.set(value=self._rows * ROW_BYTES)
+        self._patients.set(value=len(self._series))
+
+    def _enforce_budget(self):
+        while self._series and self._rows * ROW_BYTES > self.max_bytes:
+            _, series = self._series.popitem(last=False)
+            self._rows -= len(series)
+            self._evictions.inc()
+
+    def apply(self, readings):
+        """Append committed readings (dicts with patient_id, id, timestamp and the column fields)"""
+        if not self.enabled or not readings:
+            return
+        with self._lock:
+            cutoff = self._window_start()
+            touched = set()
+            for reading in readings:
+                patient_id = reading['patient_id']
+                series = self._series.get(patient_id)
+                if series is None:
+                    # Nothing older is known to be in memory; fill() loads the rest on the first query
+                    series = self._series[patient_id] = PatientSeries(_micros(reading['timestamp']))
+                series.add(reading, self._encode_string)
+                self._rows += 1
+                touched.add(patient_id)
+            # Prune lazily: only once a series holds a few minutes past the window
+            for patient_id in touched:
+                series = self._series[patient_id]
+                if series.timestamps[0] < cutoff - 300 * 1000000:
+                    self._rows -= series.prune(cutoff)
+            self._enforce_budget()
+            self._update_gauges()
+
+    def _install(self, patient_id, readings, since):
+        """Replace a patient's series with rows loaded since `since`, keeping live rows the load missed"""
+        series = PatientSeries(since)
+        with self._lock:
+            for reading in readings:
+                series.add(reading, self._encode_string)
+            live = self._series.pop(patient_id, None)
+            if live is not None:
+                self._rows -= len(live)
+                loaded = set(series.ids)
+                for index, reading_id in enumerate(live.ids):
+                    if reading_id not in loaded and live.timestamps[index] >= since:
+                        series.add(live.row(index, patient_id, self._strings), self._encode_string)
+            self._series[patient_id] = series
+            self._rows += len(series)
+            self._enforce_budget()
+            self._update_gauges()
+
+    def warm(self, patient_ids, batch_size=500):
+        """Load the window for these patients from the database; returns the number of readings loaded"""
+        if not self.enabled:
+            return 0
+        patient_ids = sorted(set(patient_ids))
+        loaded = 0
+        for offset in range(0, len(patient_ids), batch_size):
+            batch = patient_ids[offset:offset + batch_size]
+            since = self._window_start()
+            by_patient = {patient_id: [] for patient_id in batch}
+            for reading in iter_window(_EPOCH + timedelta(microseconds=since), batch):
+                by_patient[reading['patient_id']].append(reading)
+            for patient_id, readings in by_patient.items():
+                self._install(patient_id, readings, since)
+                loaded += len(readings)
+        return loaded
+
+    def readings(self, patient_id, hours=24, limit=None, after=None):
+        """
+        Readings of the last `hours` (after the (timestamp, id) cursor `after`),
+        newest first, or None when the database has to answer
+        """
+        if not self.enabled or hours > self.hours:
+            self._queries.inc('database')
+            return None
+        start = _micros(datetime.utcnow() - timedelta(hours=hours))
+        with self._lock:
+            series = self._series.get(patient_id)
+            if series is None:
+                # Not ingested by this process (another shard, or evicted): memory may be incomplete
+                self._queries.inc('database')
+                return None
+            covered = series.since <= start
+        if not covered:
+            # Series started by ingestion after start-up; load the rest of the window once
+            self._queries.inc('fill')
+            self.warm([patient_id])
+        with self._lock:
+            series = self._series.get(patient_id)
+            if series is None:
+                self._queries.inc('database')
+                return None
+            self._series.move_to_end(patient_id)
+            self._queries.inc('memory')
+            if after is not None:
+                after = (_micros(after[0]), after[1])
+            return series.rows(start, patient_id, self._strings, limit, after)
+
+    def forget(self, patient_id):
+        with self._lock:
+            series = self._series.pop(patient_id, None)
+            if series is not None:
+                self._rows -= len(series)
+            self._update_gauges()
+
+    def report(self):
+        """Memory per patient, largest first"""
+        with self._lock:
+            patients = [
+                {
+                    'patient_id': patient_id,
+                    'rows': len(series),
+                    'bytes': series.nbytes,
+                    'since': (_EPOCH + timedelta(microseconds=series.since)).isoformat(),
+                }
+                for patient_id, series in self._series.items()
+            ]
+            total_rows = self._rows
+        patients.sort(key=lambda patient: -patient['bytes'])
+        return {
+            'window_hours': self.hours,
+            'max_bytes': int(self.max_bytes),
+            'row_bytes': ROW_BYTES,
+            'rows': total_rows,
+            'bytes': total_rows * ROW_BYTES,
+            'patients': patients,
+        }
+
+
+# Create global hot tier instance
+hot_tier = HotTier()
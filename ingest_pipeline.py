@@ -0,0 +1,576 @@
+"""
+Multi-process ingest for /api/sensor_data.
+
+Under async_mode='threading' every reading is decoded, filtered, checked
+against the alert rules and turned into socket payloads on a request thread,
+so the GIL keeps ingest on one core however many the host has. With
+INGEST_WORKERS > 0 the request thread only reads the raw body and hands it
+to a worker process:
+
+    acceptor (request thread)  ->  batch over a pipe  ->  worker process
+        decode JSON, patient lookup (cached), fall classifier, position
+        tracker, plausibility filter, alert rules, one INSERT transaction
+        for the whole batch, socket payloads
+    <-  results over a pipe  <-  receiver thread in the web process
+        heartbeats, socket emits, notifications, summaries, HTTP response
+
+Readings flagged as emergencies (fall, emergency button; see admission.peek_payload)
+overtake queued routine readings: each worker has a priority queue and only
+INGEST_BATCHES_IN_FLIGHT batches are handed to its pipe at a time, so the
+backlog waits where it can still be reordered.
+
+Readings are assigned to workers by device_id on a consistent-hash ring, so
+the per-device filter history and per-patient position track live in one
+process and see readings in order (an emergency reading may overtake its own
+device's queued routine ones). Workers are started with `spawn` so they
+inherit no threads, locks or DB connections from the web process; a worker
+that dies fails its in-flight readings and is replaced. Worker-side metrics
+stay in the worker; the pipeline's own metrics are recorded here.
+
+A reading that times out is answered 503 but may still be written. Devices
+send a message_id that they keep across retries, unique per device in
+sensor_readings, so the retry is acknowledged as a duplicate rather than
+stored twice.
+
+The stage helpers below are also used by the in-thread path in app.py.
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from emergency_lane import PRIORITY_EMERGENCY, PRIORITY_ROUTINE
+from metrics import metrics
+from serializers import serialize_alert, serialize_reading
+
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 0))          # 0 = handle readings on the request thread
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 64))
+INGEST_BATCH_WAIT_MS = float(os.getenv('INGEST_BATCH_WAIT_MS', 2))
+INGEST_TIMEOUT = float(os.getenv('INGEST_TIMEOUT', 5))
+INGEST_BATCHES_IN_FLIGHT = int(os.getenv('INGEST_BATCHES_IN_FLIGHT', 2))
+INGEST_PATIENT_CACHE_TTL = float(os.getenv('INGEST_PATIENT_CACHE_TTL', 30))
+
+EMERGENCY_KINDS = ('fall', 'emergency_button')
+
+# Answer to a payload whose message_id is already stored; apply_ingest_results skips it
+DUPLICATE_RESULT = {'status': 200, 'body': {'status': 'duplicate'}, 'duplicate': True}
+
+
+def detect_fall_from_sensor(fall_signal):
+    """
+    Process fall detection signal from Run MHsensor series
+    Returns (fall_detected: bool, confidence: float)
+    """
+    try:
+        if fall_signal:
+            return True, 0.9  # High confidence for digital fall sensor
+        return False, 0.0
+    except (TypeError, ValueError):
+        return False, 0.0
+
+
+def payload_message_id(data):
+    """The device's id for this payload (kept across its retries), or None"""
+    message_id = data.get('message_id')
+    return str(message_id)[:64] if message_id not in (None, '') else None
+
+
+def reading_from_payload(data, patient):
+    """Sensor reading dict from a device payload; fall and location fields are filled in by the caller"""
+    return {
+        'patient_id': patient['id'],
+        'device_id': patient['device_id'],
+        'message_id': payload_message_id(data),
+
+        # Vital signs from MH-ETLive
+        'heart_rate': data.get('heart_rate'),  # From MH-ETLive
+        'oxygen_saturation': data.get('oxygen_saturation'),  # From MH-ETLive
+        'blood_pressure_systolic': data.get('bp_systolic'),
+        'blood_pressure_diastolic': data.get('bp_diastolic'),
+        'respiratory_rate': data.get('respiratory_rate'),
+
+        # Body temperature from DS18B20
+        'body_temperature': data.get('body_temperature'),  # From DS18B20
+
+        # Room environment from DHT11
+        'room_temperature': data.get('room_temperature'),  # From DHT11
+        'humidity': data.get('humidity'),  # From DHT11
+
+        # ECG data from AD8232
+        'ecg_value': data.get('ecg_value'),  # From AD8232
+        'ecg_leads_connected': data.get('ecg_leads_connected', False),
+        'ecg_status': data.get('ecg_status', 'Normal'),
+        'ecg_data': data.get('ecg_data'),  # ECG data buffer
+
+        # Fall detection from Run MHsensor series
+        'fall_detected': False,
+        'fall_confidence': 0.0,
+
+        # GPS location from NEO-6M
+        'gps_latitude': data.get('gps_lat'),
+        'gps_longitude': data.get('gps_lng'),
+        'gps_accuracy': data.get('gps_accuracy'),
+        'room_detected': 'Unknown',
+        'location_confidence': 0.0,
+
+        # Emergency button
+        'emergency_button_pressed': data.get('emergency_button_pressed', False),
+
+        # Device status
+        'battery_level': data.get('battery_level'),
+        'signal_strength': data.get('signal_strength')
+    }
+
+
+def vital_alert(patient, reading, alert_level, alert_messages):
+    """Alert dict for a reading's rule messages, or None"""
+    if not alert_messages:
+        return None
+    return {
+        'patient_id': patient['id'],
+        'device_id': patient['device_id'],
+        'alert_type': 'fall_detection' if reading['fall_detected'] else 'vital_signs',
+        'message': f"Bệnh nhân {patient['name']} cảnh báo: " + "; ".join(alert_messages),
+        'severity': alert_level,
+        'is_acknowledged': False
+    }
+
+
+def geofence_alert(patient, fence, room):
+    """Alert dict for a geofence rule (left the ward, entered a restricted area)"""
+    return {
+        'patient_id': patient['id'],
+        'device_id': patient['device_id'],
+        'alert_type': 'gps_location',
+        'message': f"Bệnh nhân {patient['name']} {fence.get('message') or fence['name']} (vị trí: {room})",
+        'severity': fence.get('severity', 'warning'),
+        'is_acknowledged': False
+    }
+
+
+class IngestWorker:
+    """The ingest stages for one batch of raw bodies, run inside a worker process"""
+
+    def __init__(self):
+        from alert_rules import alert_rules
+        from database_config import database_service
+        from plausibility import plausibility_filter
+        from position_tracker import position_tracker
+        from sharding import ward_router
+
+        self.database_service = database_service
+        self.alert_rules = alert_rules
+        self.plausibility_filter = plausibility_filter
+        self.position_tracker = position_tracker
+        self.ward_router = ward_router
+        self._patients = {}
+
+    def patient_for(self, device_id):
+        """Patient wearing the device, cached for INGEST_PATIENT_CACHE_TTL"""
+        now = time.monotonic()
+        cached = self._patients.get(device_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        patient = self.database_service.get_patient_by_device_id(device_id)
+        if patient is not None:
+            self._patients[device_id] = (now + INGEST_PATIENT_CACHE_TTL, patient)
+        return patient
+
+    def forget(self, device_id=None, patient_id=None):
+        if device_id is not None:
+            self._patients.pop(device_id, None)
+            self.plausibility_filter.forget(device_id)
+        if patient_id is not None:
+            self._patients = {key: entry for key, entry in self._patients.items() if entry[1]['id'] != patient_id}
+            self.position_tracker.forget(patient_id)
+
+    def process(self, items):
+        """[(token, raw body, reported emergency kinds)] -> [(token, result dict)]"""
+        from fall_classifier import FALL_THRESHOLD, classify_windows, parse_window
+
+        results = []
+        accepted = []
+        for token, body, reported in items:
+            try:
+                data = json.loads(body)
+                device_id = data.get('device_id')
+            except (ValueError, AttributeError):
+                results.append((token, {'status': 400, 'body': {'error': 'Invalid JSON body'}}))
+                continue
+            try:
+                patient = self.patient_for(device_id)
+            except Exception as e:
+                results.append((token, {'status': 500, 'body': {'error': str(e)}}))
+                continue
+            if not patient:
+                results.append((token, {'status': 404, 'body': {'error': 'Patient not found for device ID'}}))
+                continue
+            owner_url = self.ward_router.redirect_url(patient['ward'], '/api/sensor_data')
+            if owner_url:
+                results.append((token, {'status': 307, 'location': owner_url}))
+                continue
+            reading = reading_from_payload(data, patient)
+            if 'fall_detected' in data:
+                reading['fall_detected'], reading['fall_confidence'] = detect_fall_from_sensor(data['fall_detected'])
+            accepted.append((token, data, patient, reading, reported))
+
+        # A device retrying after a 503 resends the same message_id, and the first copy may already be
+        # stored: acknowledge it without a second reading (before the filter and tracker see it twice)
+        keys = [(patient['device_id'], reading['message_id']) for _, _, patient, reading, _ in accepted
+                if reading['message_id']]
+        if keys:
+            try:
+                stored = self.database_service.get_stored_message_ids(keys)
+            except Exception as e:
+                return results + [(token, {'status': 500, 'body': {'error': str(e)}}) for token, *_ in accepted]
+            fresh = []
+            for item in accepted:
+                key = (item[2]['device_id'], item[3]['message_id'])
+                if item[3]['message_id'] and key in stored:
+                    results.append((item[0], DUPLICATE_RESULT))
+                    continue
+                stored.add(key)
+                fresh.append(item)
+            accepted = fresh
+
+        # Accelerometer windows of the whole batch go through the classifier together
+        windows, owners = [], []
+        for position, (_, data, _, _, _) in enumerate(accepted):
+            if data.get('accel_window'):
+                try:
+                    windows.append(parse_window(data['accel_window']))
+                    owners.append(position)
+                except ValueError as e:
+                    print(f"Fall classifier skipped for {data.get('device_id')}: {e}")
+        if windows:
+            for position, probability in zip(owners, classify_windows(windows)):
+                reading = accepted[position][3]
+                reading['fall_detected'] = reading['fall_detected'] or probability >= FALL_THRESHOLD
+                reading['fall_confidence'] = max(reading['fall_confidence'], round(probability, 3))
+
+        # Same for GPS fixes: one vectorized tracker update
+        located = [position for position, (_, data, _, _, _) in enumerate(accepted)
+                   if data.get('gps_lat') is not None and data.get('gps_lng') is not None]
+        fences = {}
+        if located:
+            now = time.time()
+            tracked = self.position_tracker.update(
+                [accepted[p][2]['id'] for p in located],
+                [accepted[p][1]['gps_lat'] for p in located],
+                [accepted[p][1]['gps_lng'] for p in located],
+                [accepted[p][1].get('gps_accuracy') for p in located],
+                [now] * len(located))
+            for position, track in zip(located, tracked):
+                reading = accepted[position][3]
+                reading['room_detected'], reading['location_confidence'] = track['room'], track['confidence']
+                fences[position] = track['events']
+
+        readings, alerts, outcomes = [], [], []
+        timestamp = datetime.utcnow()
+        for position, (token, data, patient, reading, reported) in enumerate(accepted):
+            rejected = self.plausibility_filter.process(
+                data.get('device_id'), [reading], patient['device_calibration'])[0]
+            reading['alert_level'], reading['is_emergency'], messages = self.alert_rules.evaluate(reading, reported)
+            reading['timestamp'] = timestamp
+            reading_alerts = [alert for alert in [vital_alert(patient, reading, reading['alert_level'], messages)]
+                              if alert]
+            reading_alerts += [geofence_alert(patient, fence, reading['room_detected'])
+                               for fence in fences.get(position, ())]
+            for alert in reading_alerts:
+                alert['created_at'] = timestamp
+            readings.append(reading)
+            alerts.extend(reading_alerts)
+            outcomes.append((token, data, patient, reading, rejected, reading_alerts))
+
+        try:
+            self._write(readings, alerts)
+        except IntegrityError:
+            # Another copy of a message was stored since the check (e.g. by a replaced worker)
+            outcomes = self._write_each(outcomes, results)
+        except Exception as e:
+            print(f'Ingest batch write failed: {e}')
+            return results + [(token, {'status': 500, 'body': {'error': str(e)}}) for token, *_ in outcomes]
+
+        for token, data, patient, reading, rejected, reading_alerts in outcomes:
+            # Geofence alerts first, then the reading, then its vital/fall alert, as on the in-thread path
+            events = [('alert_created', serialize_alert(alert)) for alert in reading_alerts
+                      if alert['alert_type'] == 'gps_location']
+            events.append(('reading', {
+                'patient_id': patient['id'],
+                'patient_name': patient['name'],
+                'reading': serialize_reading(reading)
+            }))
+            events += [('alert_created', serialize_alert(alert)) for alert in reading_alerts
+                       if alert['alert_type'] != 'gps_location']
+            results.append((token, {
+                'status': 200,
+                'body': {
+                    'status': 'success',
+                    'alert_level': reading['alert_level'],
+                    'fall_detected': reading['fall_detected'],
+                    'room_detected': reading['room_detected'],
+                    'rejected': rejected
+                },
+                'ward': patient['ward'],
+                'heartbeat': (patient['device_id'], data.get('device_id'), patient['id'], patient['ward'],
+                              data.get('battery_level'), data.get('signal_strength')),
+                'events': events,
+                'alerts': reading_alerts,
+                'reading': reading,
+            }))
+        return results
+
+    def _write(self, readings, alerts):
+        reading_ids, alert_ids = self.database_service.create_readings_and_alerts(readings, alerts)
+        for reading, reading_id in zip(readings, reading_ids):
+            reading['id'] = reading_id
+        for alert, alert_id in zip(alerts, alert_ids):
+            alert['id'] = alert_id
+
+    def _write_each(self, outcomes, results):
+        """Write outcomes one transaction each; duplicates are answered in `results`, the rest returned"""
+        written = []
+        for outcome in outcomes:
+            token, reading, reading_alerts = outcome[0], outcome[3], outcome[5]
+            try:
+                self._write([reading], reading_alerts)
+            except IntegrityError:
+                results.append((token, DUPLICATE_RESULT))
+                continue
+            except Exception as e:
+                results.append((token, {'status': 500, 'body': {'error': str(e)}}))
+                continue
+            written.append(outcome)
+        return written
+
+
+def _worker_main(requests, results):
+    # Ctrl-C goes to the whole process group; the web process decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = IngestWorker()
+    while True:
+        try:
+            message = requests.recv()
+        except EOFError:
+            return
+        if message[0] == 'batch':
+            try:
+                results.send(worker.process(message[1]))
+            except Exception as e:
+                print(f'Ingest batch failed: {e}')
+                results.send([(token, {'status': 500, 'body': {'error': str(e)}}) for token, _, _ in message[1]])
+        elif message[0] == 'forget':
+            worker.forget(*message[1:])
+        elif message[0] == 'stop':
+            return
+
+
+class _WorkerHandle:
+    def __init__(self, name):
+        self.name = name
+        self.process = None
+        self.requests = None
+        self.results = None
+        # (priority, sequence, message): emergency readings overtake queued routine ones
+        self.queue = queue.PriorityQueue()
+        self.pending = {}
+        self.lock = threading.Lock()
+        # Batches sent and not answered yet; a short pipe keeps the backlog in the priority queue
+        self.batches = 0
+        self.window = threading.Condition()
+
+
+class IngestPipeline:
+    def __init__(self, workers=INGEST_WORKERS, batch_size=INGEST_BATCH_SIZE,
+                 batch_wait=INGEST_BATCH_WAIT_MS / 1000, timeout=INGEST_TIMEOUT):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        # Wired by the app: on_results(results) runs in the web process for every returned batch,
+        # before the waiting requests are answered
+        self.on_results = None
+        self._handles = {}
+        self._ring = None
+        self._tokens = itertools.count()
+        self._sequence = itertools.count()
+        self._context = multiprocessing.get_context('spawn')
+        self._start_lock = threading.Lock()
+        self._running = False
+
+        self._batch_sizes = metrics.registry.histogram(
+            'ingest_pipeline_batch_size', 'Readings per batch sent to an ingest worker',
+            buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+        self._latency = metrics.registry.histogram(
+            'ingest_pipeline_seconds', 'Hand-off to result time of a reading in the worker pipeline')
+        self._in_flight = metrics.registry.gauge(
+            'ingest_pipeline_in_flight', 'Readings handed to a worker and not answered yet', ('worker',))
+        self._restarts = metrics.registry.counter(
+            'ingest_pipeline_worker_restarts_total', 'Ingest worker processes replaced after dying', ('worker',))
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def start(self):
+        with self._start_lock:
+            if self._running:
+                return
+            from sharding import ConsistentHashRing
+
+            names = [f'ingest-{i}' for i in range(self.workers)]
+            self._ring = ConsistentHashRing(names)
+            for name in names:
+                handle = _WorkerHandle(name)
+                self._handles[name] = handle
+                self._spawn(handle)
+                threading.Thread(target=self._send_loop, args=(handle,), name=f'{name}-sender', daemon=True).start()
+            self._running = True
+            print(f'🧵 Ingest pipeline started with {self.workers} worker process(es)')
+
+    def _spawn(self, handle):
+        requests_out, requests_in = self._context.Pipe()
+        results_out, results_in = self._context.Pipe()
+        handle.process = self._context.Process(
+            target=_worker_main, args=(requests_in, results_in), name=handle.name, daemon=True)
+        handle.process.start()
+        # The child's ends are only needed in the child
+        requests_in.close()
+        results_in.close()
+        handle.requests = requests_out
+        handle.results = results_out
+        threading.Thread(target=self._receive_loop, args=(handle, results_out),
+                         name=f'{handle.name}-receiver', daemon=True).start()
+
+    def _put(self, handle, priority, message):
+        handle.queue.put((priority, next(self._sequence), message))
+
+    def submit(self, body, device_id, reported=(), emergency=False):
+        """Future resolving to the result dict of one raw reading body; emergency readings go first"""
+        self.start()
+        handle = self._handles[self._ring.node_for(str(device_id))]
+        future = Future()
+        token = next(self._tokens)
+        with handle.lock:
+            handle.pending[token] = (future, time.perf_counter())
+        self._in_flight.inc(handle.name)
+        self._put(handle, PRIORITY_EMERGENCY if emergency else PRIORITY_ROUTINE, ('read', token, body, tuple(reported)))
+        return future
+
+    def process(self, body, device_id, reported=(), emergency=False):
+        """Result dict of one reading ({'status', 'body'} or {'status': 307, 'location'}); TimeoutError if late"""
+        try:
+            return self.submit(body, device_id, reported, emergency).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f'Ingest worker did not answer within {self.timeout}s')
+
+    def forget(self, device_id=None, patient_id=None):
+        """Drop cached patient/filter/track state for a device or patient in every worker"""
+        if not self._running:
+            return
+        for handle in self._handles.values():
+            self._put(handle, PRIORITY_ROUTINE, ('forget', device_id, patient_id))
+
+    def stop(self):
+        with self._start_lock:
+            self._running = False
+            for handle in self._handles.values():
+                self._put(handle, PRIORITY_ROUTINE, ('stop',))
+            for handle in self._handles.values():
+                handle.process.join(timeout=5)
+
+    def _send_loop(self, handle):
+        while True:
+            # Take the next reading only once the worker has room, so one queued meanwhile can still overtake
+            with handle.window:
+                while handle.batches >= INGEST_BATCHES_IN_FLIGHT:
+                    handle.window.wait()
+            priority, _, message = handle.queue.get()
+            if message[0] != 'read':
+                self._send(handle, message)
+                continue
+            batch = [message[1:]]
+            # An emergency reading leaves with what is already queued instead of waiting for a fuller batch
+            deadline = time.monotonic() + (0 if priority == PRIORITY_EMERGENCY else self.batch_wait)
+            control = None
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    _, _, message = handle.queue.get(timeout=remaining) if remaining > 0 else handle.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message[0] != 'read':
+                    control = message
+                    break
+                batch.append(message[1:])
+            self._batch_sizes.observe(value=len(batch))
+            with handle.window:
+                handle.batches += 1
+            self._send(handle, ('batch', batch))
+            if control is not None:
+                self._send(handle, control)
+
+    def _send(self, handle, message):
+        try:
+            handle.requests.send(message)
+        except (OSError, ValueError) as e:
+            # Worker gone; the receiver thread fails its pending readings and replaces it
+            if message[0] == 'batch':
+                self._fail(handle, [token for token, _, _ in message[1]], e)
+
+    def _receive_loop(self, handle, results):
+        while True:
+            try:
+                batch = results.recv()
+            except (EOFError, OSError):
+                break
+            with handle.window:
+                handle.batches -= 1
+                handle.window.notify()
+            try:
+                if self.on_results:
+                    self.on_results([result for _, result in batch])
+            except Exception as e:
+                print(f'Ingest result handling failed: {e}')
+            now = time.perf_counter()
+            with handle.lock:
+                resolved = [(handle.pending.pop(token, (None, None)), result) for token, result in batch]
+            for (future, submitted), result in resolved:
+                if future is not None:
+                    self._latency.observe(value=now - submitted)
+                    self._in_flight.dec(handle.name)
+                    future.set_result(result)
+
+        if not self._running:
+            return
+        print(f'❌ Ingest worker {handle.name} exited (code {handle.process.exitcode}), restarting')
+        with handle.lock:
+            tokens = list(handle.pending)
+        self._fail(handle, tokens, RuntimeError(f'Ingest worker {handle.name} died'))
+        with handle.window:
+            handle.batches = 0
+            handle.window.notify_all()
+        self._restarts.inc(handle.name)
+        self._spawn(handle)
+
+    def _fail(self, handle, tokens, error):
+        with handle.lock:
+            futures = [handle.pending.pop(token, (None, None))[0] for token in tokens]
+        for future in futures:
+            if future is not None and not future.done():
+                self._in_flight.dec(handle.name)
+                future.set_exception(error)
+
+
+# Create global ingest pipeline instance
+ingest_pipeline = IngestPipeline()
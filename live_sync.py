@@ -0,0 +1,199 @@
+"""
+Server-driven sync protocol for dashboards over Socket.IO.
+
+Events are partitioned by ward: each ward has its own sequence numbers and
+backlog, and is pushed to its own room (plus the all-wards room).
+
+Clients send 'sync_request' with the wards they follow (none = all) and the
+last sequence number they applied per ward. The hub answers with either a
+'sync_replay' of the missed events (when they are still in the backlogs) or
+a full 'sync_snapshot'. After that every change is pushed as a 'sync_event'
+carrying its 'ward' and a per-ward monotonically increasing 'seq', so a
+client that sees a gap asks again with its last seqs and catches up.
+
+Event types: reading, alert_created, alert_acknowledged, device_status, emergency.
+
+With ward sharding a client may be connected to a shard that does not own the
+wards it follows. When SYNC_RELAY_URL (Redis) is set, every shard relays the
+events it numbers over Redis pub/sub; the others mirror them into their own
+backlogs with the owner's sequence numbers and push them to their clients.
+Events raised on a shard for a foreign ward (e.g. an acknowledgement) are
+forwarded to the owner, which numbers and publishes them.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from metrics import metrics
+from sharding import ward_router, ward_room
+
+SYNC_BACKLOG = int(os.getenv('SYNC_BACKLOG', 2000))
+SYNC_RELAY_URL = os.getenv('SYNC_RELAY_URL')
+SYNC_RELAY_CHANNEL = os.getenv('SYNC_RELAY_CHANNEL', 'sync_events')
+SYNC_RELAY_RETRY = float(os.getenv('SYNC_RELAY_RETRY', 2))
+
+# Socket.IO room of authenticated clients following every ward
+CLINICIANS_ROOM = 'clinicians'
+
+
+class _Partition:
+    __slots__ = ('seq', 'backlog')
+
+    def __init__(self, backlog):
+        self.seq = 0
+        self.backlog = deque(maxlen=backlog)
+
+
+class SyncHub:
+    def __init__(self, backlog=SYNC_BACKLOG, relay_url=SYNC_RELAY_URL, router=ward_router):
+        self.socketio = None
+        self.snapshot_builder = None
+        self.backlog = backlog
+        self.relay_url = relay_url
+        self.router = router
+        # Tells this process's own messages apart when they come back from the channel
+        self.origin = uuid.uuid4().hex
+        self._redis = None
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self._events = metrics.registry.counter(
+            'sync_events_total', 'Events pushed to dashboards', ('type',))
+        self._resyncs = metrics.registry.counter(
+            'sync_requests_total', 'Client sync requests by outcome', ('outcome',))
+        self._relayed = metrics.registry.counter(
+            'sync_relay_messages_total', 'Messages exchanged with other shards by result', ('result',))
+
+    def init_app(self, socketio, snapshot_builder):
+        """snapshot_builder(wards) returns the dashboard state of `wards` (None = all) as a JSON-serializable dict"""
+        self.socketio = socketio
+        self.snapshot_builder = snapshot_builder
+
+    def publish(self, event_type, data, ward):
+        """Assign the ward's next sequence number to an event and push it to clients"""
+        if self.relay_url and not self.router.is_local(ward):
+            # The owning shard numbers the ward's events; ours reach clients when it relays them back
+            self._send({'forward': {'type': event_type, 'data': data, 'ward': ward}})
+            return None
+        with self._lock:
+            partition = self._partitions.get(ward)
+            if partition is None:
+                partition = self._partitions[ward] = _Partition(self.backlog)
+            partition.seq += 1
+            event = {'ward': ward, 'seq': partition.seq, 'type': event_type, 'data': data}
+            partition.backlog.append(event)
+        self._events.inc(event_type)
+        self._emit(event)
+        if self.relay_url:
+            self._send({'event': event})
+        return event['seq']
+
+    def mirror(self, event):
+        """Take in an event numbered by the shard that owns its ward and push it to this shard's clients"""
+        with self._lock:
+            partition = self._partitions.get(event['ward'])
+            if partition is None or event['seq'] <= partition.seq:
+                # First event seen from this ward, or its owner restarted and numbers from 1 again
+                partition = self._partitions[event['ward']] = _Partition(self.backlog)
+            elif event['seq'] > partition.seq + 1:
+                # Relay messages were lost: clients behind this point get a snapshot
+                partition.backlog.clear()
+            partition.seq = event['seq']
+            partition.backlog.append(event)
+        self._events.inc(event['type'])
+        self._emit(event)
+
+    def _emit(self, event):
+        if self.socketio is not None:
+            self.socketio.emit('sync_event', event, to=[ward_room(event['ward']), CLINICIANS_ROOM])
+
+    def _relay_client(self):
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self.relay_url, socket_connect_timeout=1)
+        return self._redis
+
+    def _send(self, message):
+        try:
+            self._relay_client().publish(SYNC_RELAY_CHANNEL, json.dumps(dict(message, origin=self.origin), default=str))
+            self._relayed.inc('sent')
+        except Exception as e:
+            self._relayed.inc('error')
+            print(f'Sync relay publish failed: {e}')
+
+    def receive(self, message):
+        """Handle a message from the relay channel"""
+        if message.get('origin') == self.origin:
+            return
+        if 'forward' in message:
+            forward = message['forward']
+            if self.router.is_local(forward['ward']):
+                self.publish(forward['type'], forward['data'], forward['ward'])
+        elif not self.router.is_local(message['event']['ward']):
+            self.mirror(message['event'])
+        self._relayed.inc('received')
+
+    def run_relay(self):
+        """Background loop: subscribe to the relay channel, reconnecting after errors"""
+        while True:
+            try:
+                pubsub = self._relay_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(SYNC_RELAY_CHANNEL)
+                print('📡 Sync relay subscribed')
+                for message in pubsub.listen():
+                    self.receive(json.loads(message['data']))
+            except Exception as e:
+                self._relayed.inc('error')
+                print(f'Sync relay disconnected: {e}')
+            time.sleep(SYNC_RELAY_RETRY)
+
+    def seqs(self, wards=None):
+        """Current sequence number per ward"""
+        with self._lock:
+            return {ward: partition.seq for ward, partition in self._partitions.items()
+                    if wards is None or ward in wards}
+
+    def events_since(self, ward, last_seq):
+        """Return the ward's events after last_seq, or None if some of them already left the backlog"""
+        with self._lock:
+            partition = self._partitions.get(ward)
+            seq = partition.seq if partition else 0
+            if last_seq > seq:
+                return None
+            if last_seq == seq:
+                return []
+            if not partition.backlog or partition.backlog[0]['seq'] > last_seq + 1:
+                return None
+            return [event for event in partition.backlog if event['seq'] > last_seq]
+
+    def handle_sync_request(self, last_seqs=None, wards=None):
+        """Build the response to a client's sync request as (event name, payload)"""
+        if last_seqs is not None:
+            events = []
+            # Wards the client knows but this process does not (e.g. after a restart) force a snapshot
+            known = set(self.seqs(wards)) | {ward for ward in last_seqs if wards is None or ward in wards}
+            for ward in known:
+                missed = self.events_since(ward, int(last_seqs.get(ward, 0)))
+                if missed is None:
+                    events = None
+                    break
+                events.extend(missed)
+            if events is not None:
+                self._resyncs.inc('replay')
+                return 'sync_replay', {'seqs': self.seqs(wards), 'events': events}
+
+        self._resyncs.inc('snapshot')
+        # Read seqs before building: events racing with the build are replayed on top,
+        # and applying a reading or alert twice is harmless on the client
+        seqs = self.seqs(wards)
+        snapshot = self.snapshot_builder(wards)
+        snapshot['seqs'] = seqs
+        return 'sync_snapshot', snapshot
+
+
+# Create global sync hub instance
+sync_hub = SyncHub()
@@ -0,0 +1,300 @@
+"""
+Request and database instrumentation for the Patient Monitor app.
+
+Collects per-route query counts, DB time, serialization time and total
+latency, and exports everything on /metrics in Prometheus text format.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+logger = logging.getLogger('patient_monitor.metrics')
+
+# Slow-query logging is opt-in: set SLOW_QUERY_LOG_MS to a threshold in milliseconds
+SLOW_QUERY_LOG_MS = os.getenv('SLOW_QUERY_LOG_MS')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, (list(s[0]), s[1], s[2])) for labels, s in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (self.name + '_bucket',
+                       _format_labels(self.labelnames, labels, ('le', _format_value(float(bound)))),
+                       cumulative)
+            yield self.name + '_sum', _format_labels(self.labelnames, labels), total
+            yield self.name + '_count', _format_labels(self.labelnames, labels), count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render all metrics in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for sample_name, labels, value in metric.samples():
+                lines.append(f'{sample_name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class _RequestStats:
+    __slots__ = ('start', 'queries', 'db_time', 'serialization_time', 'render_starts', 'recorded')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.render_starts = []
+        self.recorded = False
+
+
+def _current_stats():
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+class InstrumentedJSONProvider(DefaultJSONProvider):
+    """JSON provider that charges jsonify() time to the request's serialization histogram"""
+
+    def response(self, *args, **kwargs):
+        stats = _current_stats()
+        if stats is None:
+            return super().response(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            stats.serialization_time += time.perf_counter() - started
+
+
+class Metrics:
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.slow_query_threshold = float(SLOW_QUERY_LOG_MS) / 1000.0 if SLOW_QUERY_LOG_MS else None
+
+        self.requests_total = self.registry.counter(
+            'http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status'))
+        self.request_latency = self.registry.histogram(
+            'http_request_duration_seconds', 'Total request latency', ('route', 'method'))
+        self.request_queries = self.registry.histogram(
+            'http_request_db_queries', 'SQL statements executed per request', ('route',), buckets=COUNT_BUCKETS)
+        self.request_db_time = self.registry.histogram(
+            'http_request_db_seconds', 'Time spent in the database per request', ('route',))
+        self.request_serialization_time = self.registry.histogram(
+            'http_request_serialization_seconds', 'Time spent rendering templates and JSON per request', ('route',))
+        self.background_queries = self.registry.counter(
+            'db_background_queries_total', 'SQL statements executed outside of a request')
+        self.slow_queries = self.registry.counter(
+            'db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_LOG_MS', ('caller',))
+
+    # Flask wiring
+    def init_app(self, app):
+        app.json = InstrumentedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def metrics_view(self):
+        return Response(self.registry.render(), mimetype='text/plain; version=0.0.4')
+
+    # Request signals
+    @staticmethod
+    def _route_label():
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    def _before_request(self):
+        g._request_stats = _RequestStats()
+
+    def _after_request(self, response):
+        self._record(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        # after_request is skipped for unhandled exceptions, record those as 500s here
+        self._record(500)
+
+    def _record(self, status):
+        stats = _current_stats()
+        if stats is None or stats.recorded:
+            return
+        stats.recorded = True
+        route = self._route_label()
+        if route == '/metrics':
+            return
+        elapsed = time.perf_counter() - stats.start
+        self.requests_total.inc(route, request.method, str(status))
+        self.request_latency.observe(route, request.method, value=elapsed)
+        self.request_queries.observe(route, value=stats.queries)
+        self.request_db_time.observe(route, value=stats.db_time)
+        self.request_serialization_time.observe(route, value=stats.serialization_time)
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = _current_stats()
+        if stats is not None:
+            stats.render_starts.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = _current_stats()
+        if stats is not None and stats.render_starts:
+            stats.serialization_time += time.perf_counter() - stats.render_starts.pop()
+
+    # SQLAlchemy events
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+
+        stats = _current_stats()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+        else:
+            self.background_queries.inc()
+
+        if self.slow_query_threshold is not None and elapsed >= self.slow_query_threshold:
+            caller = _find_service_caller()
+            self.slow_queries.inc(caller)
+            # Parameters are deliberately left out, they may contain patient data
+            logger.warning('Slow query (%.1f ms) from %s: %s', elapsed * 1000, caller, ' '.join(statement.split()))
+
+
+def _find_service_caller():
+    """Return 'DatabaseService.method' for the service method that issued the current query"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if owner is not None and type(owner).__name__ == 'DatabaseService':
+            return f'DatabaseService.{frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+# Create global metrics instance
+metrics = Metrics()
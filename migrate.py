@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Patient Monitor schema migrations (see migrations/).
+
+    python migrate.py status
+    python migrate.py upgrade --dry-run
+    python migrate.py upgrade [--target 5] [--batch-size 5000] [--batch-sleep 0.5]
+
+Uses DATABASE_URL like the app; `flask init-db` runs the same upgrade.
+"""
+
+import argparse
+import sys
+
+from migrations import MIGRATION_BATCH_SIZE, MIGRATION_BATCH_SLEEP, MigrationRunner
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='List migrations and whether they are applied')
+    upgrade = commands.add_parser('upgrade', help='Apply pending migrations')
+    upgrade.add_argument('--target', type=int, help='Stop after this version')
+    upgrade.add_argument('--dry-run', action='store_true', help='Print the statements instead of running them')
+    upgrade.add_argument('--batch-size', type=int, default=MIGRATION_BATCH_SIZE, help='Rows per backfill batch')
+    upgrade.add_argument('--batch-sleep', type=float, default=MIGRATION_BATCH_SLEEP,
+                         help='Seconds to pause between backfill batches')
+    args = parser.parse_args()
+
+    from database_config import database_service
+    runner = MigrationRunner(database_service.engine)
+
+    if args.command == 'status':
+        for version, name, applied in runner.status():
+            print(f"{'✅' if applied else '⏳'} {version:04d} {name}")
+        return
+
+    try:
+        runner.upgrade(target=args.target, dry_run=args.dry_run, batch_size=args.batch_size,
+                       batch_sleep=args.batch_sleep)
+    except Exception as e:
+        print(f'❌ Migration failed: {e}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
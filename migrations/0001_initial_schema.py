@@ -0,0 +1,7 @@
+"""Core tables (only those missing; databases created by the old scripts keep theirs)"""
+
+from database_config import Base
+
+
+def upgrade(op):
+    op.create_tables(Base.metadata, ['users', 'esp32_devices', 'patients', 'sensor_readings', 'alerts'])
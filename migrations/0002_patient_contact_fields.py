@@ -0,0 +1,7 @@
+"""Patient phone, email and medical_id (previously update_database.py / simple_migration.py / docker_migration.py)"""
+
+
+def upgrade(op):
+    op.add_column('patients', 'phone', 'VARCHAR(20)')
+    op.add_column('patients', 'email', 'VARCHAR(100)')
+    op.add_column('patients', 'medical_id', 'VARCHAR(50)')
@@ -0,0 +1,14 @@
+"""Ward of patients and devices, used for ward sharding"""
+
+
+def upgrade(op):
+    op.add_column('patients', 'ward', 'VARCHAR(50)')
+    op.add_column('esp32_devices', 'ward', 'VARCHAR(50)')
+    op.create_index('ix_patients_ward', 'patients', ['ward'])
+    op.create_index('ix_esp32_devices_ward', 'esp32_devices', ['ward'])
+    # A device belongs to the ward of the patient wearing it
+    op.backfill(
+        'esp32_devices',
+        'ward = (SELECT p.ward FROM patients p WHERE p.device_id = esp32_devices.id)',
+        'ward IS NULL AND EXISTS (SELECT 1 FROM patients p WHERE p.device_id = esp32_devices.id AND p.ward IS NOT NULL)'
+    )
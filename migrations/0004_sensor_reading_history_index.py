@@ -0,0 +1,5 @@
+"""Per-patient (timestamp, id) index for history and latest-reading queries on sensor_readings"""
+
+
+def upgrade(op):
+    op.create_index('ix_sensor_readings_patient_timestamp_id', 'sensor_readings', ['patient_id', 'timestamp', 'id'])
@@ -0,0 +1,8 @@
+"""Keyset pagination indexes for the alert feed and bulk acknowledgement"""
+
+
+def upgrade(op):
+    op.create_index('ix_alerts_created_id', 'alerts', ['created_at', 'id'])
+    op.create_index('ix_alerts_ack_created_id', 'alerts', ['is_acknowledged', 'created_at', 'id'])
+    op.create_index('ix_alerts_patient_created_id', 'alerts', ['patient_id', 'created_at', 'id'])
+    op.create_index('ix_alerts_type_created_id', 'alerts', ['alert_type', 'created_at', 'id'])
@@ -0,0 +1,7 @@
+"""Stored per-patient 24-hour summaries (see patient_summary.py)"""
+
+from database_config import Base
+
+
+def upgrade(op):
+    op.create_tables(Base.metadata, ['patient_summaries'])
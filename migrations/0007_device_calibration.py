@@ -0,0 +1,5 @@
+"""Per-device calibration offsets applied before plausibility filtering"""
+
+
+def upgrade(op):
+    op.add_column('esp32_devices', 'calibration', 'TEXT')
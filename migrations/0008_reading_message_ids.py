@@ -0,0 +1,6 @@
+"""Device message ids on sensor_readings, unique per device, so retried payloads are stored once"""
+
+
+def upgrade(op):
+    op.add_column('sensor_readings', 'message_id', 'VARCHAR(64)')
+    op.create_index('ix_sensor_readings_device_message', 'sensor_readings', ['device_id', 'message_id'], unique=True)
@@ -0,0 +1,7 @@
+"""Run history of the background job scheduler (see scheduler.py)"""
+
+from database_config import Base
+
+
+def upgrade(op):
+    op.create_tables(Base.metadata, ['job_runs'])
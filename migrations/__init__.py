@@ -0,0 +1,219 @@
+"""
+Versioned schema migrations.
+
+Each module in this package named NNNN_description.py defines `upgrade(op)`
+and is applied once, in version order; applied versions are recorded in the
+schema_migrations table. Migrations run statement by statement in autocommit
+mode through `Operations`, whose operations are idempotent and safe on a live
+database:
+    - short lock_timeout with retries, so DDL never queues behind long queries
+    - CREATE INDEX CONCURRENTLY on PostgreSQL (no write lock on big tables)
+    - backfills in small id-range batches with progress output and throttling
+A migration interrupted halfway can simply be run again. With dry_run=True
+every statement is printed instead of executed.
+"""
+
+import importlib
+import os
+import pkgutil
+import re
+import time
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv('MIGRATION_LOCK_TIMEOUT_MS', 5000))
+MIGRATION_LOCK_RETRIES = int(os.getenv('MIGRATION_LOCK_RETRIES', 10))
+MIGRATION_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', 10000))
+MIGRATION_BATCH_SLEEP = float(os.getenv('MIGRATION_BATCH_SLEEP', 0.1))
+
+# Only one runner at a time across all workers (PostgreSQL advisory lock key)
+ADVISORY_LOCK_KEY = 7340219
+
+VERSION_TABLE_DDL = (
+    'CREATE TABLE IF NOT EXISTS schema_migrations ('
+    'version INTEGER PRIMARY KEY, '
+    'name VARCHAR(200) NOT NULL, '
+    'applied_at TIMESTAMP NOT NULL, '
+    'duration_ms INTEGER)'
+)
+
+_MODULE_NAME = re.compile(r'^(\d{4})_(\w+)$')
+
+
+def discover():
+    """[(version, name, module)] of every migration in this package, in version order"""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(info.name)
+        if match:
+            found.append((int(match.group(1)), match.group(2), importlib.import_module(f'{__name__}.{info.name}')))
+    versions = [version for version, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f'Duplicate migration versions in {versions}')
+    return sorted(found, key=lambda item: item[0])
+
+
+def _is_lock_timeout(error):
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == '55P03'
+
+
+class Operations:
+    """Lock-safe schema operations available to a migration's upgrade(op)"""
+
+    def __init__(self, connection, dry_run=False, batch_size=MIGRATION_BATCH_SIZE, batch_sleep=MIGRATION_BATCH_SLEEP):
+        self.connection = connection
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.batch_sleep = batch_sleep
+        self.dialect = connection.dialect.name
+        if self.dialect == 'postgresql' and not dry_run:
+            connection.execute(text(f"SET lock_timeout = '{MIGRATION_LOCK_TIMEOUT_MS}ms'"))
+
+    @property
+    def postgresql(self):
+        return self.dialect == 'postgresql'
+
+    def execute(self, sql, params=None):
+        """Run one statement (autocommit), retrying when it times out waiting for a lock"""
+        if self.dry_run:
+            print(f'   [dry-run] {sql}' + (f'  {params}' if params else ''))
+            return None
+        for attempt in range(1, MIGRATION_LOCK_RETRIES + 1):
+            try:
+                return self.connection.execute(text(sql), params or {})
+            except OperationalError as e:
+                if not _is_lock_timeout(e) or attempt == MIGRATION_LOCK_RETRIES:
+                    raise
+                print(f'   ⏳ Lock not available, retrying ({attempt}/{MIGRATION_LOCK_RETRIES})')
+                time.sleep(min(2 ** attempt * 0.1, 5))
+
+    def scalar(self, sql, params=None):
+        return self.connection.execute(text(sql), params or {}).scalar()
+
+    def has_table(self, table):
+        return inspect(self.connection).has_table(table)
+
+    def has_column(self, table, column):
+        return self.has_table(table) and column in {c['name'] for c in inspect(self.connection).get_columns(table)}
+
+    def create_tables(self, metadata, tables):
+        """Create the given model tables that do not exist yet"""
+        missing = [metadata.tables[name] for name in tables if not self.has_table(name)]
+        for table in missing:
+            print(f'   ➕ Create table {table.name}')
+        if missing and not self.dry_run:
+            metadata.create_all(bind=self.connection, tables=missing)
+
+    def add_column(self, table, column, type_sql):
+        """Add a nullable column without a default (a catalog-only change on PostgreSQL)"""
+        if self.has_column(table, column):
+            return
+        print(f'   ➕ Add column {table}.{column}')
+        self.execute(f'ALTER TABLE {table} ADD COLUMN {column} {type_sql}')
+
+    def create_index(self, name, table, columns, unique=False):
+        """Create an index without blocking writes (CONCURRENTLY on PostgreSQL)"""
+        unique_sql = 'UNIQUE ' if unique else ''
+        if not self.postgresql:
+            self.execute(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+            return
+        # An interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would keep
+        invalid = self.scalar(
+            'SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name',
+            {'name': name})
+        if invalid:
+            print(f'   🧹 Dropping invalid index {name} from an interrupted build')
+            self.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+        elif invalid is False:
+            return
+        print(f'   ➕ Create index {name} on {table} ({", ".join(columns)})')
+        self.execute(f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+    def backfill(self, table, set_sql, where_sql, params=None, batch_size=None):
+        """
+        UPDATE table SET set_sql WHERE where_sql, in id ranges of batch_size rows,
+        one short transaction each, sleeping batch_sleep between batches.
+        """
+        batch_size = batch_size or self.batch_size
+        statement = f'UPDATE {table} SET {set_sql} WHERE id >= :batch_start AND id < :batch_end AND ({where_sql})'
+        if self.dry_run:
+            self.execute(statement, params)
+            if self.has_table(table):
+                low, high = self.connection.execute(text(f'SELECT MIN(id), MAX(id) FROM {table}')).one()
+                batches = (high - low) // batch_size + 1 if low is not None else 0
+                print(f'   [dry-run] {batches} batch(es) of {batch_size} ids over {table}')
+            return 0
+        low, high = self.connection.execute(text(f'SELECT MIN(id), MAX(id) FROM {table}')).one()
+        if low is None:
+            return 0
+
+        updated = 0
+        started = time.monotonic()
+        for batch_start in range(low, high + 1, batch_size):
+            result = self.execute(statement, dict(params or {}, batch_start=batch_start, batch_end=batch_start + batch_size))
+            updated += result.rowcount
+            done = min(batch_start + batch_size, high + 1) - low
+            total = high + 1 - low
+            elapsed = time.monotonic() - started
+            eta = elapsed / done * (total - done)
+            print(f'   ⏩ {table}: {done}/{total} ids ({done / total:.0%}), {updated} rows updated, ETA {eta:.0f}s')
+            if self.batch_sleep and batch_start + batch_size <= high:
+                time.sleep(self.batch_sleep)
+        return updated
+
+
+class MigrationRunner:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _connect(self):
+        return self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+    def applied_versions(self, connection, create=True):
+        if create:
+            connection.execute(text(VERSION_TABLE_DDL))
+        elif not inspect(connection).has_table('schema_migrations'):
+            return set()
+        return {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+    def status(self):
+        """[(version, name, applied)] for every known migration"""
+        with self._connect() as connection:
+            applied = self.applied_versions(connection, create=False)
+        return [(version, name, version in applied) for version, name, _ in discover()]
+
+    def current_version(self):
+        with self._connect() as connection:
+            applied = self.applied_versions(connection, create=False)
+        return max(applied, default=0)
+
+    def upgrade(self, target=None, dry_run=False, batch_size=MIGRATION_BATCH_SIZE, batch_sleep=MIGRATION_BATCH_SLEEP):
+        """Apply pending migrations up to `target` (default: all); returns the versions applied"""
+        with self._connect() as connection:
+            postgresql = connection.dialect.name == 'postgresql'
+            if postgresql:
+                connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+            try:
+                applied = self.applied_versions(connection, create=not dry_run)
+                pending = [(v, n, m) for v, n, m in discover() if v not in applied and (target is None or v <= target)]
+                if not pending:
+                    print('✅ Schema is up to date')
+                    return []
+                op = Operations(connection, dry_run=dry_run, batch_size=batch_size, batch_sleep=batch_sleep)
+                for version, name, module in pending:
+                    print(f"🔄 {'[dry-run] ' if dry_run else ''}Migration {version:04d} {name}")
+                    started = time.monotonic()
+                    module.upgrade(op)
+                    if not dry_run:
+                        connection.execute(
+                            text('INSERT INTO schema_migrations (version, name, applied_at, duration_ms) '
+                                 'VALUES (:version, :name, :applied_at, :duration_ms)'),
+                            {'version': version, 'name': name, 'applied_at': datetime.utcnow(),
+                             'duration_ms': int((time.monotonic() - started) * 1000)})
+                    print(f'✅ Migration {version:04d} done in {time.monotonic() - started:.1f}s')
+                return [version for version, _, _ in pending]
+            finally:
+                if postgresql:
+                    connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
@@ -0,0 +1,366 @@
+"""
+Per-patient 24-hour summary maintained incrementally by ingestion.
+
+Each committed reading and alert is folded into fixed 5-minute buckets
+(count/sum/min/max per vital, alert counts per severity), so the patient
+detail page reads a bounded number of buckets instead of every reading of
+the last day. Summaries live in memory and are flushed to the
+patient_summaries table periodically; a process that does not ingest a
+patient (another shard, or after a restart) loads the stored row and keeps
+it for SUMMARY_CACHE_TTL before reloading.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database_config import Alert, SensorReading
+from metrics import metrics
+
+SUMMARY_WINDOW_HOURS = 24
+SUMMARY_BUCKET_SECONDS = int(os.getenv('SUMMARY_BUCKET_SECONDS', 300))
+SUMMARY_CACHE_TTL = float(os.getenv('SUMMARY_CACHE_TTL', 30))
+SUMMARY_FLUSH_INTERVAL = float(os.getenv('SUMMARY_FLUSH_INTERVAL', 30))
+# Reading/alert ids remembered per patient to drop the ones a rebuild or reload already counted
+SUMMARY_RECENT_IDS = int(os.getenv('SUMMARY_RECENT_IDS', 64))
+
+VITALS = (
+    'heart_rate', 'body_temperature', 'oxygen_saturation', 'respiratory_rate',
+    'blood_pressure_systolic', 'blood_pressure_diastolic', 'room_temperature', 'humidity',
+)
+SEVERITIES = ('warning', 'critical')
+
+# Reading fields kept as the patient's latest reading
+LATEST_FIELDS = VITALS + (
+    'id', 'timestamp', 'ecg_value', 'ecg_leads_connected', 'ecg_status', 'fall_detected', 'fall_confidence',
+    'room_detected', 'gps_latitude', 'gps_longitude', 'gps_accuracy', 'emergency_button_pressed', 'alert_level',
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(value):
+    """Seconds since epoch for a naive UTC datetime"""
+    return (value - _EPOCH).total_seconds()
+
+
+class RecentIds:
+    """The last SUMMARY_RECENT_IDS ids added, in arrival order"""
+
+    def __init__(self, ids=(), size=SUMMARY_RECENT_IDS):
+        self._order = deque(maxlen=size)
+        self._ids = set()
+        for value in ids:
+            self.add(value)
+
+    def add(self, value):
+        """False if `value` is already among the recent ids"""
+        if value in self._ids:
+            return False
+        if len(self._order) == self._order.maxlen:
+            self._ids.discard(self._order[0])
+        self._order.append(value)
+        self._ids.add(value)
+        return True
+
+    def __iter__(self):
+        return iter(self._order)
+
+
+class PatientSummary:
+    def __init__(self, patient_id):
+        self.patient_id = patient_id
+        # {bucket start (epoch seconds): [{vital: [count, sum, min, max]}, {severity: count}]}
+        self.buckets = {}
+        self.last_fall_at = None
+        self.latest = None
+        # Latest ids folded in, so a reading in both a rebuild (or stored row) and the commit
+        # stream is counted once. Not a running max: commits do not arrive in id order, and a
+        # late one (another ingest worker, the emergency persistence queue) must still count.
+        self.reading_ids = RecentIds()
+        self.alert_ids = RecentIds()
+
+    def _bucket(self, when):
+        start = int(_epoch(when)) // SUMMARY_BUCKET_SECONDS * SUMMARY_BUCKET_SECONDS
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = [{}, {}]
+            self._prune(start)
+        return bucket
+
+    def _prune(self, newest):
+        oldest = newest - SUMMARY_WINDOW_HOURS * 3600
+        for start in [s for s in self.buckets if s <= oldest]:
+            del self.buckets[start]
+
+    def add_reading(self, reading):
+        if not self.reading_ids.add(reading['id']):
+            return
+        vitals = self._bucket(reading['timestamp'])[0]
+        for name in VITALS:
+            value = reading.get(name)
+            if value is None:
+                continue
+            stats = vitals.get(name)
+            if stats is None:
+                vitals[name] = [1, value, value, value]
+            else:
+                stats[0] += 1
+                stats[1] += value
+                stats[2] = min(stats[2], value)
+                stats[3] = max(stats[3], value)
+        if reading.get('fall_detected') and (self.last_fall_at is None or reading['timestamp'] > self.last_fall_at):
+            self.last_fall_at = reading['timestamp']
+        if self.latest is None or reading['timestamp'] >= self.latest['timestamp']:
+            self.latest = reading
+
+    def add_alert(self, alert_id, severity, created_at):
+        if not self.alert_ids.add(alert_id):
+            return
+        alerts = self._bucket(created_at)[1]
+        alerts[severity] = alerts.get(severity, 0) + 1
+
+    def to_dict(self, now=None):
+        now = now or datetime.utcnow()
+        end = int(_epoch(now)) // SUMMARY_BUCKET_SECONDS * SUMMARY_BUCKET_SECONDS
+        starts = range(end - (SUMMARY_WINDOW_HOURS * 3600 // SUMMARY_BUCKET_SECONDS - 1) * SUMMARY_BUCKET_SECONDS,
+                       end + SUMMARY_BUCKET_SECONDS, SUMMARY_BUCKET_SECONDS)
+
+        totals = {name: [0, 0.0, None, None] for name in VITALS}
+        alerts = {severity: 0 for severity in SEVERITIES}
+        sparklines = {name: [] for name in VITALS}
+        for start in starts:
+            vitals, bucket_alerts = self.buckets.get(start, ({}, {}))
+            for name in VITALS:
+                stats = vitals.get(name)
+                if stats is None:
+                    sparklines[name].append(None)
+                    continue
+                total = totals[name]
+                total[0] += stats[0]
+                total[1] += stats[1]
+                total[2] = stats[2] if total[2] is None else min(total[2], stats[2])
+                total[3] = stats[3] if total[3] is None else max(total[3], stats[3])
+                sparklines[name].append(round(stats[1] / stats[0], 2))
+            for severity, count in bucket_alerts.items():
+                alerts[severity] = alerts.get(severity, 0) + count
+
+        return {
+            'patient_id': self.patient_id,
+            'window_hours': SUMMARY_WINDOW_HOURS,
+            'bucket_seconds': SUMMARY_BUCKET_SECONDS,
+            'series_start': datetime.fromtimestamp(starts[0], timezone.utc).isoformat(),
+            'vitals': {
+                name: {
+                    'count': count,
+                    'avg': round(total / count, 2) if count else None,
+                    'min': low,
+                    'max': high,
+                }
+                for name, (count, total, low, high) in totals.items()
+            },
+            'alerts': alerts,
+            'last_fall_at': self.last_fall_at,
+            'seconds_since_fall': (now - self.last_fall_at).total_seconds() if self.last_fall_at else None,
+            'latest_reading': self.latest,
+            'sparklines': sparklines,
+        }
+
+    def dumps(self):
+        def encode(value):
+            return value.isoformat() if isinstance(value, datetime) else value
+        return json.dumps({
+            'buckets': [[start, vitals, alerts] for start, (vitals, alerts) in self.buckets.items()],
+            'last_fall_at': encode(self.last_fall_at),
+            'reading_ids': list(self.reading_ids),
+            'alert_ids': list(self.alert_ids),
+            'latest': {k: encode(v) for k, v in self.latest.items()} if self.latest else None,
+        })
+
+    @classmethod
+    def loads(cls, patient_id, data):
+        state = json.loads(data)
+        summary = cls(patient_id)
+        summary.buckets = {int(start): [vitals, alerts] for start, vitals, alerts in state['buckets']}
+        summary.reading_ids = RecentIds(state.get('reading_ids', ()))
+        summary.alert_ids = RecentIds(state.get('alert_ids', ()))
+        if state.get('last_fall_at'):
+            summary.last_fall_at = datetime.fromisoformat(state['last_fall_at'])
+        if state.get('latest'):
+            summary.latest = dict(state['latest'], timestamp=datetime.fromisoformat(state['latest']['timestamp']))
+        return summary
+
+
+class SummaryStore:
+    def __init__(self):
+        # Wired by the app: loader(patient_id) -> stored JSON or None, rebuilder(patient_id, since)
+        # -> (readings, [(alert_id, severity, created_at)]) for a cold start,
+        # writer({patient_id: json}) persists a batch
+        self.loader = None
+        self.rebuilder = None
+        self.writer = None
+        self._summaries = {}
+        self._expires = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._running = False
+        self._requests = metrics.registry.counter(
+            'patient_summary_requests_total', 'Summary lookups by source', ('source',))
+
+    def _fresh(self, patient_id):
+        """Summary held for patient_id unless it is a cached copy that has to be reloaded"""
+        summary = self._summaries.get(patient_id)
+        expires = self._expires.get(patient_id)
+        if summary is not None and (expires is None or expires > time.monotonic()):
+            return summary
+        return None
+
+    def _load(self, patient_id):
+        """(summary, rebuilt) from the stored row, or rebuilt from the last day; runs without the lock"""
+        data = self.loader(patient_id) if self.loader else None
+        if data:
+            return PatientSummary.loads(patient_id, data), False
+        summary = PatientSummary(patient_id)
+        if not self.rebuilder:
+            return summary, False
+        # Cold start without a stored row: fold in the last day once
+        since = datetime.utcnow() - timedelta(hours=SUMMARY_WINDOW_HOURS)
+        readings, alerts = self.rebuilder(patient_id, since)
+        for reading in readings:
+            summary.add_reading(reading)
+        for alert_id, severity, created_at in alerts:
+            summary.add_alert(alert_id, severity, created_at)
+        return summary, True
+
+    def apply(self, readings, alerts):
+        """Fold committed readings and (patient_id, alert_id, severity, created_at) alerts into the summaries"""
+        patient_ids = {reading['patient_id'] for reading in readings} | {alert[0] for alert in alerts}
+        while True:
+            # Summaries this process does not keep current yet are loaded outside the lock, so one
+            # cold patient does not stall every other commit and page
+            with self._lock:
+                missing = [pk for pk in patient_ids if pk not in self._summaries or pk in self._expires]
+            loaded = {pk: self._load(pk) for pk in missing}
+            with self._lock:
+                for pk, (summary, rebuilt) in loaded.items():
+                    # Another thread may have installed a live summary meanwhile; that one wins
+                    if pk not in self._summaries or pk in self._expires:
+                        self._summaries[pk] = summary
+                        self._expires.pop(pk, None)
+                        if rebuilt:
+                            self._dirty.add(pk)
+                # Forgotten (patient deleted) while loading: load again
+                if any(pk not in self._summaries or pk in self._expires for pk in patient_ids):
+                    continue
+                for reading in readings:
+                    self._summaries[reading['patient_id']].add_reading(reading)
+                    self._dirty.add(reading['patient_id'])
+                for patient_id, alert_id, severity, created_at in alerts:
+                    self._summaries[patient_id].add_alert(alert_id, severity, created_at)
+                    self._dirty.add(patient_id)
+                return
+
+    def get(self, patient_id):
+        with self._lock:
+            summary = self._fresh(patient_id)
+            if summary is not None:
+                self._requests.inc('memory')
+                return summary.to_dict()
+        self._requests.inc('load')
+        loaded, rebuilt = self._load(patient_id)
+        with self._lock:
+            summary = self._fresh(patient_id)
+            if summary is None:
+                summary = self._summaries[patient_id] = loaded
+                # Not updated by this process's ingestion yet, so reload it after a while
+                self._expires[patient_id] = time.monotonic() + SUMMARY_CACHE_TTL
+                if rebuilt:
+                    self._dirty.add(patient_id)
+            return summary.to_dict()
+
+    def forget(self, patient_id):
+        with self._lock:
+            self._summaries.pop(patient_id, None)
+            self._expires.pop(patient_id, None)
+            self._dirty.discard(patient_id)
+
+    def flush(self):
+        """Persist summaries changed since the last flush in one batch"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = {pk: self._summaries[pk].dumps() for pk in dirty if pk in self._summaries}
+        if not rows or self.writer is None:
+            return 0
+        try:
+            self.writer(rows)
+        except Exception:
+            with self._lock:
+                self._dirty.update(rows)
+            raise
+        return len(rows)
+
+    def run(self, sleep=time.sleep):
+        """Background loop flushing every SUMMARY_FLUSH_INTERVAL"""
+        self._running = True
+        while self._running:
+            sleep(SUMMARY_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'Patient summary flush error: {e}')
+
+    def stop(self):
+        self._running = False
+        self.flush()
+
+
+# Create global summary store instance
+summary_store = SummaryStore()
+
+# Other in-memory views fed the same committed readings, e.g. the hot tier (wired by the app)
+reading_listeners = []
+
+
+# Collect inserts per session and apply them only once the transaction commits
+@event.listens_for(SensorReading, 'after_insert')
+def _collect_reading(mapper, connection, target):
+    reading = {field: getattr(target, field) for field in LATEST_FIELDS}
+    reading['patient_id'] = target.patient_id
+    Session.object_session(target).info.setdefault('summary_readings', []).append(reading)
+
+
+@event.listens_for(Alert, 'after_insert')
+def _collect_alert(mapper, connection, target):
+    Session.object_session(target).info.setdefault('summary_alerts', []).append(
+        (target.patient_id, target.id, target.severity, target.created_at))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    readings = session.info.pop('summary_readings', None)
+    alerts = session.info.pop('summary_alerts', None)
+    if readings or alerts:
+        session.info['summary_committed'] = (readings or (), alerts or ())
+
+
+# Applied once the transaction has released its connection: apply() may load a summary from the
+# DB, and doing that while still holding one connection per thread can exhaust the pool
+@event.listens_for(Session, 'after_transaction_end')
+def _apply_after_release(session, transaction):
+    if transaction.parent is None and 'summary_committed' in session.info:
+        readings, alerts = session.info.pop('summary_committed')
+        summary_store.apply(readings, alerts)
+        for listener in reading_listeners:
+            listener(readings)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('summary_readings', None)
+    session.info.pop('summary_alerts', None)
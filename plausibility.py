@@ -0,0 +1,113 @@
+"""
+Preprocessing of raw device samples before they are stored and alerted on.
+
+Each sample goes through three steps:
+    1. calibration: the device's per-vital offset (ESP32Device.calibration) is added
+    2. plausibility: values outside physiological/physical bounds are dropped
+       (a loose MH-ETLive clip reporting HR 0 or SpO2 40, a DHT11 glitch)
+    3. spike rejection: a value further than MAX_STEP from the median of the
+       last SPIKE_WINDOW values of that device is dropped. The window keeps the
+       raw values, so a real change of level is accepted once it persists.
+Dropped values become None, so they are neither stored nor alerted on, and
+are counted per device. Samples of one device are processed in order, one
+at a time or as a batch.
+"""
+
+import os
+import statistics
+import threading
+from collections import deque
+
+from metrics import metrics
+
+SPIKE_WINDOW = int(os.getenv('SPIKE_WINDOW', 3))
+
+# (low, high) outside which a value is a sensor fault, not a patient state
+PLAUSIBLE_RANGES = {
+    'heart_rate': (20, 250),
+    'oxygen_saturation': (50, 100),
+    'body_temperature': (30, 43),
+    'respiratory_rate': (3, 70),
+    'blood_pressure_systolic': (50, 260),
+    'blood_pressure_diastolic': (25, 160),
+    'room_temperature': (0, 50),
+    'humidity': (0, 100),
+}
+
+# Largest believable change from the recent median between two samples
+MAX_STEP = {
+    'heart_rate': 40,
+    'oxygen_saturation': 10,
+    'body_temperature': 1.5,
+    'respiratory_rate': 15,
+    'blood_pressure_systolic': 50,
+    'blood_pressure_diastolic': 35,
+    'room_temperature': 5,
+    'humidity': 20,
+}
+
+
+class PlausibilityFilter:
+    def __init__(self, window=SPIKE_WINDOW):
+        self.window = window
+        self._history = {}
+        self._lock = threading.Lock()
+        self._rejected = metrics.registry.counter(
+            'sensor_samples_rejected_total', 'Sensor values dropped before storage and alerting',
+            ('device', 'vital', 'reason'))
+
+    def _check(self, history, vital, value):
+        """Reason to reject value, or None; records it in the spike window"""
+        low, high = PLAUSIBLE_RANGES[vital]
+        if not low <= value <= high:
+            return 'implausible'
+        recent = history.get(vital)
+        if recent is None:
+            recent = history[vital] = deque(maxlen=self.window - 1)
+        spike = False
+        if self.window > 1 and len(recent) == self.window - 1:
+            spike = abs(value - statistics.median(list(recent) + [value])) > MAX_STEP[vital]
+        recent.append(value)
+        return 'spike' if spike else None
+
+    def process(self, device_id, samples, calibration=None):
+        """
+        Calibrate and filter reading dicts of one device in place, in order.
+        Returns one {vital: reason} of dropped values per sample.
+        """
+        calibration = calibration or {}
+        rejected = []
+        with self._lock:
+            history = self._history.setdefault(device_id, {})
+            for sample in samples:
+                dropped = {}
+                for vital in PLAUSIBLE_RANGES:
+                    value = sample.get(vital)
+                    if value is None:
+                        continue
+                    try:
+                        value = float(value)
+                    except (TypeError, ValueError):
+                        dropped[vital] = 'invalid'
+                        sample[vital] = None
+                        continue
+                    if calibration.get(vital):
+                        value = sample[vital] = round(value + calibration[vital], 2)
+                    reason = self._check(history, vital, value)
+                    if reason:
+                        dropped[vital] = reason
+                        sample[vital] = None
+                rejected.append(dropped)
+        for dropped in rejected:
+            for vital, reason in dropped.items():
+                self._rejected.inc(device_id, vital, reason)
+        return rejected
+
+    def forget(self, device_id):
+        """Drop a device's spike window (e.g. after its sensor was re-attached or recalibrated)"""
+        with self._lock:
+            self._history.pop(device_id, None)
+
+
+# Create global plausibility filter instance
+plausibility_filter = PlausibilityFilter()
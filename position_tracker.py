@@ -0,0 +1,359 @@
+"""
+Per-patient position tracking from the NEO-6M GPS fixes.
+
+Classifying every raw fix into a room on its own makes room_detected flap
+between neighbouring rooms with GPS jitter. Instead each patient has a
+constant-velocity Kalman filter over (east, north) metres, with the fix's
+gps_accuracy as measurement noise, and the room is taken from the smoothed
+position. A new room is only accepted after ROOM_CONFIRM_FIXES consecutive
+fixes agree (hysteresis). Fixes the NEO-6M sends before it has a lock
+(0/0 with accuracy 0) are not tracked, and a fix further from the track
+than a patient can move (TRACK_MAX_SPEED plus the fix and track
+uncertainty) is rejected; after TRACK_MAX_REJECTS rejections in a row the
+track restarts at the latest fix. Geofence rules run on the confirmed position:
+    - 'exit' fences alert when a patient leaves them (patient left the ward)
+    - 'enter' fences alert when a patient enters them (restricted area)
+Alerts use the gps_location alert type.
+
+State is kept as NumPy arrays indexed by a slot per patient (about 200 bytes
+per patient), and update() takes a batch of fixes and runs the filter for
+all of them at once. Rooms and fences are boxes in degrees; GEOFENCE_FILE
+may point at a JSON file {"rooms": {...}, "geofences": [...]} replacing the
+defaults below.
+"""
+
+import json
+import math
+import os
+import threading
+
+from metrics import metrics
+
+ROOM_CONFIRM_FIXES = int(os.getenv('ROOM_CONFIRM_FIXES', 3))
+TRACK_RESET_SECONDS = float(os.getenv('TRACK_RESET_SECONDS', 600))
+# Random acceleration of a walking patient (m/s^2), the filter's process noise
+TRACK_ACCELERATION = float(os.getenv('TRACK_ACCELERATION', 0.05))
+DEFAULT_GPS_ACCURACY = float(os.getenv('DEFAULT_GPS_ACCURACY', 5.0))
+# Fastest plausible patient movement (m/s) and the gate width in standard deviations
+TRACK_MAX_SPEED = float(os.getenv('TRACK_MAX_SPEED', 2.0))
+TRACK_GATE_SIGMAS = 4.0
+TRACK_MAX_REJECTS = int(os.getenv('TRACK_MAX_REJECTS', 3))
+# Speed uncertainty (m/s) of a track that just started; patients on a ward are mostly still
+INITIAL_SPEED_SIGMA = 0.1
+GEOFENCE_FILE = os.getenv('GEOFENCE_FILE')
+
+UNKNOWN_ROOM = 'Phòng Không Xác Định'
+METERS_PER_DEGREE = 111320.0
+
+# name: (lat_min, lat_max, lng_min, lng_max)
+ROOMS = {
+    'Phòng 101': (10.7756, 10.7757, 106.7017, 106.7018),
+    'Phòng 102': (10.7757, 10.7758, 106.7017, 106.7018),
+    'Phòng 103': (10.7758, 10.7759, 106.7017, 106.7018),
+    'Phòng Cấp Cứu': (10.7759, 10.7760, 106.7017, 106.7018),
+    'ICU': (10.7760, 10.7761, 106.7017, 106.7018),
+}
+
+GEOFENCES = [
+    {'name': 'Khu điều trị', 'rule': 'exit', 'severity': 'critical',
+     'box': (10.7755, 10.7762, 106.7016, 106.7019), 'message': 'rời khỏi khu điều trị'},
+]
+
+
+def load_layout(path=GEOFENCE_FILE):
+    """(rooms, geofences) from GEOFENCE_FILE, or the defaults"""
+    if not path:
+        return ROOMS, GEOFENCES
+    with open(path) as f:
+        layout = json.load(f)
+    rooms = {name: tuple(box) for name, box in layout.get('rooms', ROOMS).items()}
+    geofences = [dict(fence, box=tuple(fence['box'])) for fence in layout.get('geofences', GEOFENCES)]
+    for fence in geofences:
+        if fence.get('rule') not in ('exit', 'enter'):
+            raise ValueError(f"Geofence {fence.get('name')} needs rule 'exit' or 'enter'")
+    return rooms, geofences
+
+
+def is_valid_fix(lat, lng, accuracy):
+    """False for the 0/0 position and zero accuracy the firmware reports before a GPS lock"""
+    if lat == 0 and lng == 0:
+        return False
+    return accuracy is None or accuracy > 0
+
+
+def _inside(boxes, lat, lng):
+    """(n, len(boxes)) bool: which boxes contain each point"""
+    import numpy as np
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return ((lat[:, None] >= boxes[None, :, 0]) & (lat[:, None] <= boxes[None, :, 1]) &
+            (lng[:, None] >= boxes[None, :, 2]) & (lng[:, None] <= boxes[None, :, 3]))
+
+
+class PositionTracker:
+    def __init__(self, rooms=None, geofences=None, confirm_fixes=ROOM_CONFIRM_FIXES):
+        if rooms is None or geofences is None:
+            default_rooms, default_geofences = load_layout()
+            rooms = default_rooms if rooms is None else rooms
+            geofences = default_geofences if geofences is None else geofences
+        self.room_names = list(rooms) + [UNKNOWN_ROOM]
+        self.room_boxes = list(rooms.values())
+        self.geofences = geofences
+        self.fence_boxes = [fence['box'] for fence in geofences]
+        self.confirm_fixes = confirm_fixes
+
+        # Local tangent plane around the first fix
+        self.origin = None
+        self._slots = {}
+        self._patients = []
+        # Per-slot state arrays, allocated on the first fix
+        self.x = None                   # east, north, v_east, v_north (m, m/s)
+        self.P = None                   # covariance of x
+        self.t = None                   # last fix, epoch seconds
+        self.room = None                # confirmed room index (-1 none yet)
+        self.candidate = None           # room the latest fixes point to
+        self.candidate_count = None     # consecutive fixes in the candidate room
+        self.fences = None              # confirmed inside each geofence
+        self.rejects = None             # consecutive fixes rejected as implausible jumps
+        self._lock = threading.Lock()
+        self._fixes = metrics.registry.counter('position_fixes_total', 'GPS fixes run through the tracker')
+        self._rejected = metrics.registry.counter(
+            'position_fixes_rejected_total', 'GPS fixes not applied to a track', ('reason',))
+        self._transitions = metrics.registry.counter(
+            'position_room_changes_total', 'Confirmed room changes of tracked patients')
+        self._geofence_events = metrics.registry.counter(
+            'position_geofence_events_total', 'Geofence rules triggered', ('geofence',))
+
+    @property
+    def tracked(self):
+        return len(self._patients)
+
+    def _arrays(self):
+        return (self.x, self.P, self.t, self.room, self.candidate, self.candidate_count, self.fences, self.rejects)
+
+    def state_bytes(self):
+        if self.x is None:
+            return 0
+        return sum(a[:self.tracked].nbytes for a in self._arrays())
+
+    def _grow(self, capacity):
+        import numpy as np
+
+        fresh = (
+            np.zeros((capacity, 4)),
+            np.zeros((capacity, 4, 4)),
+            np.zeros(capacity),
+            np.full(capacity, -1, dtype=np.int16),
+            np.full(capacity, -1, dtype=np.int16),
+            np.zeros(capacity, dtype=np.int16),
+            np.zeros((capacity, len(self.geofences)), dtype=bool),
+            np.zeros(capacity, dtype=np.int16),
+        )
+        if self.x is not None:
+            fresh = tuple(np.concatenate([old, new]) for old, new in zip(self._arrays(), fresh))
+        (self.x, self.P, self.t, self.room, self.candidate, self.candidate_count, self.fences,
+         self.rejects) = fresh
+
+    def _slot(self, patient_id):
+        slot = self._slots.get(patient_id)
+        if slot is not None:
+            return slot, False
+        slot = self._slots[patient_id] = len(self._patients)
+        self._patients.append(patient_id)
+        if self.x is None:
+            self._grow(64)
+        elif slot == len(self.x):
+            self._grow(len(self.x))
+        return slot, True
+
+    def _to_local(self, lat, lng):
+        lat0, lng0 = self.origin
+        return ((lng - lng0) * METERS_PER_DEGREE * math.cos(math.radians(lat0)),
+                (lat - lat0) * METERS_PER_DEGREE)
+
+    def _to_degrees(self, east, north):
+        lat0, lng0 = self.origin
+        return (lat0 + north / METERS_PER_DEGREE,
+                lng0 + east / (METERS_PER_DEGREE * math.cos(math.radians(lat0))))
+
+    def update(self, patient_ids, lats, lngs, accuracies, timestamps):
+        """
+        Run one fix per entry through the filter (a patient may appear more than
+        once; its fixes are applied in order). Returns one dict per fix:
+        {patient_id, room, latitude, longitude, confidence, events}. Fixes
+        without a GPS lock leave the track alone and get the unknown room.
+        """
+        import numpy as np
+
+        results = [None] * len(patient_ids)
+        valid = []
+        for position, (lat, lng, accuracy) in enumerate(zip(lats, lngs, accuracies)):
+            if is_valid_fix(lat, lng, accuracy):
+                valid.append(position)
+            else:
+                results[position] = {'patient_id': patient_ids[position], 'room': UNKNOWN_ROOM, 'latitude': lat,
+                                     'longitude': lng, 'confidence': 0.1, 'events': []}
+        if len(valid) < len(patient_ids):
+            self._rejected.inc('no_fix', amount=len(patient_ids) - len(valid))
+            self._fixes.inc(amount=len(patient_ids) - len(valid))
+            if not valid:
+                return results
+            located = self.update([patient_ids[p] for p in valid], [lats[p] for p in valid],
+                                  [lngs[p] for p in valid], [accuracies[p] for p in valid],
+                                  [timestamps[p] for p in valid])
+            for position, result in zip(valid, located):
+                results[position] = result
+            return results
+
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        accuracies = np.array([a if a else DEFAULT_GPS_ACCURACY for a in accuracies], dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        # Split into rounds in which every patient appears at most once
+        seen = {}
+        rounds = []
+        for position, patient_id in enumerate(patient_ids):
+            n = seen.get(patient_id, 0)
+            seen[patient_id] = n + 1
+            if n == len(rounds):
+                rounds.append([])
+            rounds[n].append(position)
+
+        with self._lock:
+            if self.origin is None and len(lats):
+                self.origin = (float(lats[0]), float(lngs[0]))
+            for positions in rounds:
+                positions = np.array(positions)
+                for position, result in zip(positions, self._update_round(
+                        [patient_ids[p] for p in positions], lats[positions], lngs[positions],
+                        accuracies[positions], timestamps[positions])):
+                    results[position] = result
+        self._fixes.inc(amount=len(patient_ids))
+        return results
+
+    def _update_round(self, patient_ids, lats, lngs, accuracies, timestamps):
+        import numpy as np
+
+        slots, new = zip(*(self._slot(patient_id) for patient_id in patient_ids))
+        slots = np.array(slots)
+        new = np.array(new)
+        east, north = self._to_local(lats, lngs)
+        z = np.stack([east, north], axis=1)
+        r = accuracies ** 2
+
+        dt = np.clip(timestamps - self.t[slots], 0, None)
+        reset = new | (dt > TRACK_RESET_SECONDS)
+        dt = np.where(reset, 0, dt)
+
+        x0 = x = self.x[slots]
+        P0 = P = self.P[slots]
+
+        # Predict: x = F x, P = F P F' + Q (white-noise acceleration)
+        F = np.tile(np.eye(4), (len(slots), 1, 1))
+        F[:, 0, 2] = dt
+        F[:, 1, 3] = dt
+        x = np.einsum('nij,nj->ni', F, x)
+        P = F @ P @ F.transpose(0, 2, 1)
+        q = TRACK_ACCELERATION ** 2
+        dt2, dt3, dt4 = dt ** 2, dt ** 3, dt ** 4
+        for axis in (0, 1):
+            P[:, axis, axis] += q * dt4 / 4
+            P[:, axis, axis + 2] += q * dt3 / 2
+            P[:, axis + 2, axis] += q * dt3 / 2
+            P[:, axis + 2, axis + 2] += q * dt2
+
+        # Update with the position fix: H = [I 0], R = accuracy^2 I
+        S = P[:, :2, :2] + r[:, None, None] * np.eye(2)
+
+        # Gate: a fix further away than the patient can have walked is a glitch, unless
+        # TRACK_MAX_REJECTS of them in a row say the track itself is wrong
+        jump = np.hypot(*(z - x[:, :2]).T)
+        limit = TRACK_MAX_SPEED * dt + TRACK_GATE_SIGMAS * np.sqrt(S[:, 0, 0] + S[:, 1, 1])
+        implausible = ~reset & (jump > limit)
+        rejects = np.where(implausible, self.rejects[slots] + 1, 0)
+        restart = rejects >= TRACK_MAX_REJECTS
+        rejected = implausible & ~restart
+        reset = reset | restart
+        self.rejects[slots] = np.where(restart, 0, rejects)
+        if rejected.any():
+            self._rejected.inc('implausible', amount=int(rejected.sum()))
+        K = P[:, :, :2] @ np.linalg.inv(S)
+        x = x + np.einsum('nij,nj->ni', K, z - x[:, :2])
+        P = P - K @ P[:, :2, :]
+
+        # New or stale tracks start at the fix, at rest
+        if reset.any():
+            x[reset] = 0
+            x[reset, :2] = z[reset]
+            P[reset] = 0
+            P[reset, 0, 0] = P[reset, 1, 1] = r[reset]
+            P[reset, 2, 2] = P[reset, 3, 3] = INITIAL_SPEED_SIGMA ** 2
+
+        # Rejected fixes leave the track (and its clock, so the gate widens) as it was
+        x = np.where(rejected[:, None], x0, x)
+        P = np.where(rejected[:, None, None], P0, P)
+        self.x[slots] = x
+        self.P[slots] = P
+        self.t[slots] = np.where(rejected, self.t[slots], timestamps)
+
+        lat, lng = self._to_degrees(x[:, 0], x[:, 1])
+        inside_rooms = _inside(self.room_boxes, lat, lng)
+        measured = np.where(inside_rooms.any(axis=1), inside_rooms.argmax(axis=1), len(self.room_names) - 1)
+
+        # Hysteresis: the room changes after confirm_fixes consecutive fixes in a new room
+        # (rejected fixes do not count either way)
+        same = measured == self.candidate[slots]
+        counts = np.where(rejected, self.candidate_count[slots], np.where(same, self.candidate_count[slots] + 1, 1))
+        self.candidate[slots] = np.where(rejected, self.candidate[slots], measured)
+        self.candidate_count[slots] = np.minimum(counts, self.confirm_fixes)
+        confirmed = ~rejected & ((counts >= self.confirm_fixes) | (self.room[slots] < 0))
+        changed = confirmed & (self.room[slots] != measured) & (self.room[slots] >= 0)
+        self.room[slots] = np.where(confirmed, measured, self.room[slots])
+        self._transitions.inc(amount=int(changed.sum()))
+
+        # Geofences follow the confirmed (hysteresis-filtered) state too
+        events = [[] for _ in slots]
+        if len(self.geofences):
+            inside_fences = _inside(self.fence_boxes, lat, lng)
+            previous = self.fences[slots]
+            for i, fence in enumerate(self.geofences):
+                now_inside = np.where(confirmed, inside_fences[:, i], previous[:, i])
+                if fence['rule'] == 'exit':
+                    triggered = previous[:, i] & ~now_inside & ~new
+                else:
+                    triggered = ~previous[:, i] & now_inside
+                for k in np.flatnonzero(triggered):
+                    events[k].append(fence)
+                    self._geofence_events.inc(fence['name'])
+                self.fences[slots, i] = now_inside
+
+        sigma = np.sqrt(np.maximum(P[:, 0, 0] + P[:, 1, 1], 0))
+        confidence = np.clip(1 - sigma / 20, 0.1, 0.99)
+        return [
+            {
+                'patient_id': patient_id,
+                'room': self.room_names[self.room[slot]],
+                'latitude': float(lat[k]),
+                'longitude': float(lng[k]),
+                'confidence': round(float(confidence[k]), 2),
+                'events': events[k],
+            }
+            for k, (patient_id, slot) in enumerate(zip(patient_ids, slots))
+        ]
+
+    def forget(self, patient_id):
+        """Stop tracking a patient (the slot is reset and reused on the next fix of that id)"""
+        with self._lock:
+            slot = self._slots.get(patient_id)
+            if slot is not None and self.x is not None:
+                self.t[slot] = 0
+                self.room[slot] = -1
+                self.candidate[slot] = -1
+                self.candidate_count[slot] = 0
+                self.fences[slot] = False
+                self.rejects[slot] = 0
+
+
+# Create global position tracker instance
+position_tracker = PositionTracker()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Replay stored sensor readings through the alert rules (alert_rules.py).
+
+Shows what a rule change would have flagged over a past period, and can
+backfill alert_level / is_emergency on the stored rows:
+
+    python replay.py diff --since 2026-09-01 --rules new_rules.json
+    python replay.py diff --since 2026-09-01 --until 2026-10-01 --patient 12 --output diff.json
+    python replay.py apply --since 2026-09-01 --rules new_rules.json
+
+Readings are streamed with a server-side cursor in id order, converted to
+NumPy columns in chunks, and the chunks are evaluated on a process pool with
+the same vectorized rules. `apply` reads id-keyset pages instead, so no
+read is held open while writing, and updates only rows whose level or
+emergency flag changes, one short transaction per chunk. Uses DATABASE_URL
+like the app.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from alert_rules import FIELDS, LEVELS, AlertRules
+
+REPLAY_CHUNK_ROWS = int(os.getenv('REPLAY_CHUNK_ROWS', 50000))
+
+BOOLEAN_FIELDS = ('ecg_leads_connected', 'fall_detected', 'emergency_button_pressed')
+
+_rules = None
+
+
+def _init_worker(rules_path):
+    global _rules
+    _rules = AlertRules.from_file(rules_path) if rules_path else AlertRules()
+
+
+def evaluate_chunk(chunk):
+    """Changed rows of one chunk: (ids, new levels, new emergency flags, old levels, old flags, patient ids)"""
+    import numpy as np
+
+    ids, patient_ids, old_level, old_emergency, columns = chunk
+    level, is_emergency = _rules.evaluate_columns(columns)
+    changed = (level != old_level) | (is_emergency != old_emergency)
+    return (ids[changed], level[changed], is_emergency[changed], old_level[changed], old_emergency[changed],
+            patient_ids[changed], len(ids), np.bincount(level, minlength=len(LEVELS)))
+
+
+def _to_chunk(rows):
+    import numpy as np
+
+    level_codes = {name: code for code, name in enumerate(LEVELS)}
+    ids, patients, levels, emergencies, *values = zip(*rows)
+    columns = {
+        field: np.array(column, dtype=bool if field in BOOLEAN_FIELDS else np.float64)
+        for field, column in zip(FIELDS, values)
+    }
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(patients, dtype=np.int64),
+        np.array([level_codes.get(level, 0) for level in levels], dtype=np.int8),
+        np.array(emergencies, dtype=bool),
+        columns,
+    )
+
+
+def stream_chunks(engine, since, until, patient_id=None, chunk_rows=REPLAY_CHUNK_ROWS, keyset=False):
+    """
+    Readings in [since, until) as column chunks, in id order. One server-side
+    cursor streams them all, or with keyset=True each chunk is its own short
+    query (id > last id) so no read stays open while rows are being updated.
+    """
+    from sqlalchemy import select
+
+    from database_config import SensorReading
+
+    query = select(
+        SensorReading.id, SensorReading.patient_id, SensorReading.alert_level, SensorReading.is_emergency,
+        *(getattr(SensorReading, field) for field in FIELDS)
+    ).where(SensorReading.timestamp >= since).order_by(SensorReading.id)
+    if until is not None:
+        query = query.where(SensorReading.timestamp < until)
+    if patient_id is not None:
+        query = query.where(SensorReading.patient_id == patient_id)
+
+    if keyset:
+        last_id = 0
+        while True:
+            with engine.connect() as connection:
+                rows = connection.execute(query.where(SensorReading.id > last_id).limit(chunk_rows)).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield _to_chunk(rows)
+        return
+
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(query)
+        while True:
+            rows = result.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield _to_chunk(rows)
+
+
+def write_changes(engine, ids, levels, emergencies):
+    """UPDATE alert_level / is_emergency by primary key in one transaction"""
+    from sqlalchemy import update
+    from sqlalchemy.orm import Session
+
+    from database_config import SensorReading
+
+    rows = [
+        {'id': int(reading_id), 'alert_level': LEVELS[level], 'is_emergency': bool(emergency)}
+        for reading_id, level, emergency in zip(ids.tolist(), levels.tolist(), emergencies.tolist())
+    ]
+    if not rows:
+        return
+    with Session(engine) as session:
+        session.execute(update(SensorReading), rows)
+        session.commit()
+
+
+class ReplayReport:
+    def __init__(self):
+        self.rows = 0
+        self.changed = 0
+        self.levels = [0] * len(LEVELS)
+        self.transitions = Counter()
+        self.emergency = Counter()
+        self.patients = Counter()
+        self.samples = []
+
+    def add(self, result):
+        ids, levels, emergencies, old_levels, old_emergencies, patient_ids, rows, level_counts = result
+        self.rows += rows
+        self.changed += len(ids)
+        self.levels = [a + int(b) for a, b in zip(self.levels, level_counts)]
+        for old, new in zip(old_levels.tolist(), levels.tolist()):
+            if old != new:
+                self.transitions[f'{LEVELS[old]}->{LEVELS[new]}'] += 1
+        for old, new in zip(old_emergencies.tolist(), emergencies.tolist()):
+            if old != new:
+                self.emergency['on' if new else 'off'] += 1
+        for patient_id, level, old in zip(patient_ids.tolist(), levels.tolist(), old_levels.tolist()):
+            if level == 2 and old != 2:
+                self.patients[patient_id] += 1
+        if len(self.samples) < 20:
+            self.samples.extend(
+                {'id': int(i), 'from': LEVELS[o], 'to': LEVELS[n]}
+                for i, o, n in zip(ids[:20].tolist(), old_levels[:20].tolist(), levels[:20].tolist()))
+            del self.samples[20:]
+
+    def to_dict(self, elapsed):
+        return {
+            'rows': self.rows,
+            'changed': self.changed,
+            'levels': dict(zip(LEVELS, self.levels)),
+            'transitions': dict(self.transitions),
+            'is_emergency': dict(self.emergency),
+            'newly_critical_by_patient': dict(self.patients.most_common(20)),
+            'samples': self.samples,
+            'elapsed_s': round(elapsed, 2),
+            'rows_per_minute': round(self.rows / elapsed * 60) if elapsed else None,
+        }
+
+
+def replay(engine, since, until=None, patient_id=None, rules_path=None, workers=None, apply=False,
+           chunk_rows=REPLAY_CHUNK_ROWS):
+    """Replay readings and return the report dict; with apply=True changed rows are written back"""
+    workers = os.cpu_count() if workers is None else workers
+    report = ReplayReport()
+    started = time.perf_counter()
+    last_progress = started
+
+    def collect(result):
+        nonlocal last_progress
+        report.add(result)
+        if apply:
+            write_changes(engine, result[0], result[1], result[2])
+        if time.perf_counter() - last_progress > 5:
+            last_progress = time.perf_counter()
+            rate = report.rows / (last_progress - started) * 60
+            print(f'   ⏩ {report.rows} readings, {report.changed} changed ({rate:,.0f}/min)')
+
+    chunks = stream_chunks(engine, since, until, patient_id, chunk_rows, keyset=apply)
+    if workers <= 1:
+        _init_worker(rules_path)
+        for chunk in chunks:
+            collect(evaluate_chunk(chunk))
+    else:
+        # Keep a bounded number of chunks in flight so memory stays flat; results are collected in order
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules_path,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(evaluate_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    return report.to_dict(time.perf_counter() - started)
+
+
+def _parse_date(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected ISO 8601")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-evaluate stored readings under the alert rules')
+    parser.add_argument('command', choices=('diff', 'apply'),
+                        help='diff: report what would change; apply: also update the rows')
+    parser.add_argument('--since', type=_parse_date, required=True)
+    parser.add_argument('--until', type=_parse_date)
+    parser.add_argument('--patient', type=int)
+    parser.add_argument('--rules', help='JSON thresholds overriding alert_rules.DEFAULT_THRESHOLDS')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Evaluation processes (1 = inline)')
+    parser.add_argument('--chunk-rows', type=int, default=REPLAY_CHUNK_ROWS)
+    parser.add_argument('--output', help='Write the report as JSON here')
+    args = parser.parse_args()
+
+    if args.rules:
+        AlertRules.from_file(args.rules)  # fail before streaming anything
+    from database_config import database_service
+
+    print(f"🔁 Replaying readings since {args.since:%Y-%m-%d %H:%M}"
+          f"{f' until {args.until:%Y-%m-%d %H:%M}' if args.until else ''}"
+          f" under {args.rules or 'the current rules'} ({args.workers} worker(s))")
+    try:
+        report = replay(database_service.engine, args.since, args.until, args.patient, args.rules,
+                        args.workers, apply=args.command == 'apply', chunk_rows=args.chunk_rows)
+    except Exception as e:
+        print(f'❌ Replay failed: {e}')
+        sys.exit(1)
+
+    print(f"✅ {report['rows']} readings in {report['elapsed_s']}s ({report['rows_per_minute']:,}/min), "
+          f"{report['changed']} {'updated' if args.command == 'apply' else 'would change'}")
+    for transition, count in sorted(report['transitions'].items(), key=lambda item: -item[1]):
+        print(f'   {transition:<22} {count}')
+    if report['is_emergency']:
+        print(f"   is_emergency on {report['is_emergency'].get('on', 0)}, off {report['is_emergency'].get('off', 0)}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'💾 Report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
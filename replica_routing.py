@@ -0,0 +1,197 @@
+"""
+Optional read replica routing for DatabaseService.
+
+With DATABASE_REPLICA_URL set, service methods marked @read_only run on the
+replica engine; everything else (and every write) stays on the primary.
+Reads fall back to the primary when:
+    - the current request already wrote something (read-your-writes within a request)
+    - the user wrote something in the last REPLICA_STICKY_SECONDS (carried in the
+      Flask session, so it also holds across workers)
+    - the replica lags more than REPLICA_MAX_LAG_SECONDS or cannot be reached
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from metrics import metrics
+
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 2))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+REPLICA_CONNECT_TIMEOUT = int(os.getenv('REPLICA_CONNECT_TIMEOUT', 2))
+REPLICA_STATEMENT_TIMEOUT_MS = int(os.getenv('REPLICA_STATEMENT_TIMEOUT_MS', 5000))
+
+# Replication lag in seconds; 0 when the replica has replayed everything it received
+# (the replay timestamp alone would grow while the primary is idle)
+LAG_QUERY = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+
+def replica_engine_options(url):
+    """create_engine() arguments that keep a hung replica from stalling its callers"""
+    if make_url(url).get_backend_name() != 'postgresql':
+        return {}
+    return {'connect_args': {
+        'connect_timeout': REPLICA_CONNECT_TIMEOUT,
+        'options': f'-c statement_timeout={REPLICA_STATEMENT_TIMEOUT_MS}',
+    }}
+
+
+_read_only = contextvars.ContextVar('replica_read_only', default=False)
+_force_primary = contextvars.ContextVar('replica_force_primary', default=False)
+_wrote = contextvars.ContextVar('replica_wrote', default=False)
+
+
+class ReplicaRouter:
+    def __init__(self, max_lag=REPLICA_MAX_LAG_SECONDS, check_interval=REPLICA_LAG_CHECK_INTERVAL,
+                 sticky_seconds=REPLICA_STICKY_SECONDS):
+        self.primary = None
+        self.replica = None
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self._lag = None
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+        self._reads = metrics.registry.counter(
+            'db_reads_total', 'Read-only service calls by engine', ('target',))
+        self._lag_gauge = metrics.registry.gauge('db_replica_lag_seconds', 'Last measured replica lag')
+
+    def configure(self, primary, replica=None):
+        self.primary = primary
+        self.replica = replica
+
+    @property
+    def enabled(self):
+        return self.replica is not None
+
+    def replica_lag(self):
+        """Replica lag in seconds (cached for check_interval), or None if it cannot be measured
+
+        One caller at a time refreshes the value; the others keep using the cached
+        one (None before the first check, which sends them to the primary) instead
+        of waiting on a replica that may not answer.
+        """
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._lag
+        if not self._lock.acquire(blocking=False):
+            return self._lag
+        try:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return self._lag
+            try:
+                if self.replica.dialect.name == 'postgresql':
+                    with self.replica.connect() as connection:
+                        lag = connection.execute(LAG_QUERY).scalar()
+                    lag = float(lag) if lag is not None else None
+                else:
+                    # Other backends (e.g. SQLite in development) have no lag to measure
+                    lag = 0.0
+            except Exception as e:
+                print(f'Replica lag check failed: {e}')
+                lag = None
+            self._lag = lag
+            self._checked_at = time.monotonic()
+            self._lag_gauge.set(value=lag if lag is not None else -1)
+            return lag
+        finally:
+            self._lock.release()
+
+    def replica_usable(self):
+        lag = self.replica_lag()
+        return lag is not None and lag <= self.max_lag
+
+    def engine_for_read(self):
+        if self.enabled and not _force_primary.get() and not _wrote.get() and self.replica_usable():
+            self._reads.inc('replica')
+            return self.replica
+        self._reads.inc('primary')
+        return self.primary
+
+    def note_write(self):
+        _wrote.set(True)
+
+    @property
+    def wrote(self):
+        return _wrote.get()
+
+    @contextmanager
+    def primary_only(self):
+        """Run the block's reads on the primary"""
+        token = _force_primary.set(True)
+        try:
+            yield
+        finally:
+            _force_primary.reset(token)
+
+    def init_app(self, app):
+        """Per-request read-your-writes: pin a user to the primary for a while after they wrote"""
+        from flask import session
+        from flask_login import current_user
+
+        @app.before_request
+        def _begin_request():
+            _wrote.set(False)
+            _force_primary.set(session.get('_primary_until', 0) > time.time())
+
+        @app.after_request
+        def _remember_write(response):
+            # Only signed-in users get pinned; device POSTs carry no session to keep
+            if _wrote.get() and self.enabled and current_user.is_authenticated:
+                session['_primary_until'] = time.time() + self.sticky_seconds
+            return response
+
+
+class RoutingSession(Session):
+    """Session that sends reads inside @read_only methods to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if _read_only.get():
+            return replica_router.engine_for_read()
+        return replica_router.primary
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flush(session, flush_context):
+    session.info['replica_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_bulk_statement(orm_execute_state):
+    # Bulk update()/delete()/insert() statements bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info['replica_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _note_commit(session):
+    if session.info.pop('replica_wrote', False):
+        replica_router.note_write()
+
+
+def read_only(method):
+    """Mark a DatabaseService method as safe to serve from the replica"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+# Create global replica router instance
+replica_router = ReplicaRouter()
@@ -0,0 +1,203 @@
+"""
+Response cache with strong ETags for the dashboard views.
+
+A data version counter is bumped after every commit that touched patients,
+alerts, sensor readings or devices. Cached views render once per
+(endpoint, variant, version), keep the rendered body in memory and answer
+conditional GETs with 304 while the version is unchanged, so idle nurse
+stations cost almost nothing. ETags are a digest of the body, so a client
+load-balanced onto another worker still gets a 304 for the same page.
+
+The version is per process unless RESPONSE_CACHE_REDIS_URL is set, in which
+case every worker and shard shares one Redis counter (if Redis is unreachable
+views render uncached). Either way entries expire after RESPONSE_CACHE_TTL
+seconds, which bounds how long a write bumped elsewhere can go unseen.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database_config import Alert, ESP32Device, Patient, SensorReading
+from metrics import metrics
+from replica_routing import replica_router
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 10))
+RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL')
+
+VERSIONED_MODELS = (Patient, Alert, SensorReading, ESP32Device)
+
+
+class DataVersion:
+    def __init__(self):
+        self.value = 0
+        self.bumped_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+            self.bumped_at = time.monotonic()
+            return self.value
+
+    def current(self):
+        """The current version, or None if it cannot be read"""
+        return self.value
+
+    def age(self):
+        """Seconds since the last bump"""
+        return time.monotonic() - self.bumped_at
+
+
+class RedisDataVersion(DataVersion):
+    """Version shared by every worker and shard through a Redis counter"""
+
+    def __init__(self, url, key='response_cache:version'):
+        import redis
+
+        super().__init__()
+        self.key = key
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._errors = metrics.registry.counter(
+            'response_cache_version_errors_total', 'Shared data version reads and bumps that failed')
+
+    def bump(self):
+        try:
+            value = int(self._client.incr(self.key))
+        except Exception as e:
+            self._errors.inc()
+            print(f'Response cache version bump failed: {e}')
+            return None
+        self._observe(value)
+        return value
+
+    def current(self):
+        try:
+            value = int(self._client.get(self.key) or 0)
+        except Exception as e:
+            self._errors.inc()
+            print(f'Response cache version read failed: {e}')
+            return None
+        self._observe(value)
+        return value
+
+    def _observe(self, value):
+        # age() counts from when this process first saw the version, wherever it was bumped
+        with self._lock:
+            if value != self.value:
+                self.value = value
+                self.bumped_at = time.monotonic()
+
+
+class ResponseCache:
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, redis_url=RESPONSE_CACHE_REDIS_URL):
+        self.version = RedisDataVersion(redis_url) if redis_url else DataVersion()
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._requests = metrics.registry.counter(
+            'response_cache_requests_total', 'Cached view lookups', ('endpoint', 'result'))
+
+    def bump(self):
+        """Invalidate every cached view; call after writes that bypass the ORM unit of work"""
+        return self.version.bump()
+
+    @staticmethod
+    def _etag(body):
+        return hashlib.sha1(body).hexdigest()[:16]
+
+    def cached(self, variant=None):
+        """
+        Decorator for GET views whose output depends only on DB state (and `variant()`,
+        e.g. the current user). The view must return a str or Response.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Rendering consumes flashed messages, so those requests must render for real
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+
+                # Read the version before touching the DB: a write that commits while we
+                # render bumps it again and the entry we store is simply never hit
+                version = self.version.current()
+                key = (request.endpoint, variant() if variant else None, request.full_path)
+                now = time.monotonic()
+
+                with self._lock:
+                    entry = self._entries.get(key)
+                    fresh = entry is not None and version is not None and entry[0] == version and entry[1] > now
+                    if fresh:
+                        self._entries.move_to_end(key)
+                if fresh:
+                    _, _, etag, body, status, mimetype = entry
+                    if request.if_none_match.contains(etag):
+                        self._requests.inc(request.endpoint, 'not_modified')
+                        return self._respond(Response(status=304), etag)
+                    self._requests.inc(request.endpoint, 'hit')
+                    return self._respond(Response(body, status=status, mimetype=mimetype), etag)
+
+                self._requests.inc(request.endpoint, 'miss')
+                if replica_router.enabled and self.version.age() < replica_router.max_lag:
+                    # The replica may not have this version's data yet; render from the primary
+                    # so a stale page is never stored under the new version
+                    with replica_router.primary_only():
+                        response = make_response(view(*args, **kwargs))
+                else:
+                    response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                etag = self._etag(body)
+                if version is not None:
+                    with self._lock:
+                        self._entries[key] = (version, now + self.ttl, etag, body, response.status_code, response.mimetype)
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_size:
+                            self._entries.popitem(last=False)
+                # Re-rendered after expiry but unchanged: the client's copy is still good
+                if request.if_none_match.contains(etag):
+                    self._requests.inc(request.endpoint, 'not_modified')
+                    return self._respond(Response(status=304), etag)
+                return self._respond(response, etag)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _respond(response, etag):
+        response.set_etag(etag)
+        # Browsers keep the page but always revalidate, which is a cheap 304 while nothing changed
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+# Create global response cache instance
+response_cache = ResponseCache()
+
+
+@event.listens_for(Session, 'before_flush')
+def _mark_versioned_writes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, VERSIONED_MODELS):
+            session.info['response_cache_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    if session.info.pop('response_cache_dirty', False):
+        response_cache.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_after_rollback(session):
+    session.info.pop('response_cache_dirty', None)
@@ -0,0 +1,403 @@
+"""
+Periodic background jobs (retention, history pruning, ...) run by one worker.
+
+Jobs are registered with an interval or a cron trigger, optional jitter and a
+timeout. Every worker runs the scheduler loop, but only the one holding the
+scheduler advisory lock (pg_try_advisory_lock, kept on a dedicated connection)
+starts jobs; the others retry the lock every SCHEDULER_TICK. When the leader
+dies its connection closes, the lock is released and another worker takes
+over. Every run is recorded in the job_runs table, and a new leader continues
+each job's schedule from its last recorded run, so a failover neither skips
+nor repeats a run (missed runs are coalesced into one). On databases without
+advisory locks (SQLite) the single process is always the leader.
+
+Cron expressions are the usual five fields, minute hour day-of-month month
+day-of-week (0 or 7 = Sunday), in UTC, with *, lists, ranges and /steps.
+
+A job that overruns its timeout is counted and recorded with status
+'timeout', and is not started again until it returns: threads cannot be
+killed, so long jobs should work in bounded batches.
+
+A run is recorded as a 'running' row when it starts, and its worker refreshes
+the row's heartbeat every tick until it finishes, leader or not. A leader does
+not start a job while another worker's run of it is alive, so a leader whose
+lock connection dropped mid-job does not run concurrently with its successor;
+a row without a heartbeat for SCHEDULER_RUN_STALE seconds is marked
+'abandoned'.
+
+Only cluster-wide work belongs here. The device offline sweep and heartbeat
+flush, the summary flush and the hot-tier warm-up act on the memory of the
+process that ingests a shard's devices, so they stay per-process loops.
+"""
+
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from metrics import metrics
+
+SCHEDULER_TICK = float(os.getenv('SCHEDULER_TICK', 5))  # 0 disables the scheduler
+SCHEDULER_JOB_TIMEOUT = float(os.getenv('SCHEDULER_JOB_TIMEOUT', 3600))
+SCHEDULER_RUN_STALE = float(os.getenv('SCHEDULER_RUN_STALE', 60))
+
+# Built-in jobs registered by the app
+READING_RETENTION_DAYS = float(os.getenv('READING_RETENTION_DAYS', 0))  # 0 keeps readings forever
+READING_RETENTION_CRON = os.getenv('READING_RETENTION_CRON', '30 20 * * *')  # 03:30 Asia/Ho_Chi_Minh
+JOB_HISTORY_DAYS = float(os.getenv('JOB_HISTORY_DAYS', 30))
+
+# Only one worker runs jobs across the cluster (PostgreSQL advisory lock key, next to the migrations lock)
+SCHEDULER_LOCK_KEY = 7340220
+
+JOB_DURATION_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        expr, slash, step = part.partition('/')
+        try:
+            step = int(step) if slash else 1
+            if expr == '*':
+                start, end = low, high
+            elif '-' in expr:
+                start, end = (int(value) for value in expr.split('-', 1))
+            else:
+                # "5/15" is 5, 20, 35, 50
+                start = int(expr)
+                end = high if slash else start
+        except ValueError:
+            raise ValueError(f'invalid cron field {field!r}') from None
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f'invalid cron field {field!r}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class IntervalTrigger:
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError('interval must be positive')
+        self.seconds = seconds
+
+    def next_after(self, when):
+        return when + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f'every {self.seconds:g}s'
+
+
+class CronTrigger:
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'cron expression {expression!r} needs 5 fields')
+        self.expression = expression
+        self.minutes = _cron_field(fields[0], 0, 59)
+        self.hours = _cron_field(fields[1], 0, 23)
+        self.days = _cron_field(fields[2], 1, 31)
+        self.months = _cron_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _cron_field(fields[4], 0, 7)}
+        # As in cron, a day matches either day field when both are restricted
+        self._either_day = fields[2] != '*' and fields[4] != '*'
+
+    def _day_matches(self, when):
+        day = when.day in self.days
+        weekday = when.isoweekday() % 7 in self.weekdays
+        return day or weekday if self._either_day else day and weekday
+
+    def next_after(self, when):
+        """First matching minute strictly after `when`"""
+        when = when.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = when + timedelta(days=366 * 8)
+        while when < limit:
+            if when.month not in self.months:
+                when = (when.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(when):
+                when = when.replace(hour=0, minute=0) + timedelta(days=1)
+            elif when.hour not in self.hours:
+                when = when.replace(minute=0) + timedelta(hours=1)
+            elif when.minute not in self.minutes:
+                when += timedelta(minutes=1)
+            else:
+                return when
+        raise ValueError(f'cron expression {self.expression!r} never matches')
+
+    def __str__(self):
+        return f'cron {self.expression}'
+
+
+class Job:
+    def __init__(self, name, func, trigger, jitter=0.0, timeout=SCHEDULER_JOB_TIMEOUT):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.jitter = jitter
+        self.timeout = timeout
+        self.due = None          # scheduled time of the next run (UTC), None until this worker leads
+        self.next_run = None     # due plus jitter
+        self.started = None      # monotonic start of the current run
+        self.scheduled_for = None
+        self.started_at = None
+        self.timed_out = False
+        self.run_id = None       # job_runs row of the current run
+        self.last_run = None     # latest run finished by this worker
+
+
+class Scheduler:
+    def __init__(self, tick=SCHEDULER_TICK, lock_key=SCHEDULER_LOCK_KEY):
+        # Wired by the app: primary engine (leader lock), history_writer(run) records a
+        # finished run, last_runs(names) -> {name: scheduled_for of its latest run},
+        # run_starter(run, stale_before) -> id of a new 'running' row, or None while another
+        # run of the job is alive, run_heartbeat(ids, now) keeps running rows alive
+        self.engine = None
+        self.history_writer = None
+        self.last_runs = None
+        self.run_starter = None
+        self.run_heartbeat = None
+        self.clock = datetime.utcnow
+        self.tick = tick
+        self.lock_key = lock_key
+        self.runner = f'{socket.gethostname()}:{os.getpid()}'
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._connection = None
+        self._leader = False
+        self._running = False
+        self._is_leader = metrics.registry.gauge('scheduler_is_leader', 'Whether this worker runs the scheduled jobs')
+        self._durations = metrics.registry.histogram(
+            'scheduler_job_duration_seconds', 'Duration of scheduled job runs', ('job',), buckets=JOB_DURATION_BUCKETS)
+        self._runs = metrics.registry.counter('scheduler_job_runs_total', 'Scheduled job runs by outcome', ('job', 'status'))
+        self._timeouts = metrics.registry.counter(
+            'scheduler_job_timeouts_total', 'Scheduled job runs that overran their timeout', ('job',))
+        self._last_success = metrics.registry.gauge(
+            'scheduler_job_last_success_timestamp_seconds', 'End of the latest successful run', ('job',))
+
+    @property
+    def enabled(self):
+        return self.tick > 0
+
+    def add_job(self, name, func, every=None, cron=None, jitter=0.0, timeout=SCHEDULER_JOB_TIMEOUT):
+        """Register func() to run every `every` seconds or on a `cron` expression; returns the Job"""
+        if (every is None) == (cron is None):
+            raise ValueError('give exactly one of every= or cron=')
+        trigger = IntervalTrigger(every) if every is not None else CronTrigger(cron)
+        trigger.next_after(self.clock())  # an expression that never matches fails here
+        with self._lock:
+            if name in self._jobs:
+                raise ValueError(f'job {name!r} is already registered')
+            job = self._jobs[name] = Job(name, func, trigger, jitter, timeout)
+        return job
+
+    # Leader election
+
+    def _close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _try_lead(self):
+        if self.engine is None or self.engine.dialect.name != 'postgresql':
+            return True
+        if self._connection is not None:
+            # The lock lives as long as the session; a dropped connection means it is gone
+            try:
+                self._connection.execute(text('SELECT 1'))
+                return True
+            except Exception:
+                self._close()
+        connection = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            acquired = connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': self.lock_key}).scalar()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _hold_leadership(self):
+        """Whether this worker leads, trying to become the leader if not"""
+        try:
+            leader = self._try_lead()
+        except Exception:
+            self._close()
+            self._set_leader(False)
+            raise
+        self._set_leader(leader)
+        return leader
+
+    def _set_leader(self, leader):
+        if leader == self._leader:
+            return
+        self._leader = leader
+        self._is_leader.set(value=1 if leader else 0)
+        print(f'🗓️ Scheduler {self.runner} {"is now the leader" if leader else "lost the leadership"}')
+        # Schedules are (re)loaded from the run history on election
+        with self._lock:
+            for job in self._jobs.values():
+                job.due = job.next_run = None
+
+    def release(self):
+        """Give up the leadership (on shutdown), so another worker can take over at once"""
+        if self._connection is not None:
+            try:
+                self._connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.lock_key})
+            except Exception:
+                pass
+            self._close()
+        self._set_leader(False)
+
+    # Scheduling
+
+    def _jittered(self, job):
+        job.next_run = job.due + timedelta(seconds=random.uniform(0, job.jitter)) if job.jitter else job.due
+
+    def _load_schedules(self, jobs, now):
+        last = self.last_runs([job.name for job in jobs]) if self.last_runs is not None else {}
+        for job in jobs:
+            previous = last.get(job.name)
+            if previous is None:
+                # Never ran: interval jobs start now, cron jobs at their next time
+                job.due = now if isinstance(job.trigger, IntervalTrigger) else job.trigger.next_after(now)
+            else:
+                # Overdue (no leader, or a run missed during failover) runs once now
+                job.due = max(job.trigger.next_after(previous), now)
+            self._jittered(job)
+
+    def run_pending(self):
+        """Start the jobs that are due if this worker leads; returns their names"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        # Runs started while leading are kept alive even after losing the leadership
+        self._heartbeat(jobs)
+        if not self._hold_leadership():
+            return []
+        now = self.clock()
+        unscheduled = [job for job in jobs if job.due is None and job.started is None]
+        if unscheduled:
+            self._load_schedules(unscheduled, now)
+        started = []
+        for job in jobs:
+            if job.started is not None:
+                self._check_timeout(job)
+            elif job.next_run is not None and job.next_run <= now and self._start(job, now):
+                started.append(job.name)
+        return started
+
+    def _heartbeat(self, jobs):
+        run_ids = [job.run_id for job in jobs if job.started is not None and job.run_id is not None]
+        if run_ids and self.run_heartbeat is not None:
+            try:
+                self.run_heartbeat(run_ids, self.clock())
+            except Exception as e:
+                print(f'Job heartbeat failed: {e}')
+
+    def _start(self, job, now):
+        """Start a due job unless another worker is still running it; returns whether it started"""
+        job.run_id = None
+        if self.run_starter is not None:
+            job.run_id = self.run_starter(
+                {'job_name': job.name, 'scheduled_for': job.due, 'started_at': now, 'runner': self.runner},
+                now - timedelta(seconds=SCHEDULER_RUN_STALE))
+            if job.run_id is None:
+                # E.g. the former leader lost its lock connection mid-run; reload the schedule
+                # from the history once that run is recorded
+                print(f'⏸️ Job {job.name} is still running on another worker')
+                self._runs.inc(job.name, 'skipped')
+                job.due = job.next_run = None
+                return False
+        job.scheduled_for = job.due
+        job.started_at = now
+        job.started = time.monotonic()
+        job.timed_out = False
+        # Runs missed while this one was late are coalesced into the next
+        job.due = max(job.trigger.next_after(job.due), now)
+        self._jittered(job)
+        threading.Thread(target=self._execute, args=(job,), name=f'job-{job.name}', daemon=True).start()
+        return True
+
+    def _check_timeout(self, job):
+        if job.timed_out or not job.timeout or time.monotonic() - job.started <= job.timeout:
+            return
+        job.timed_out = True
+        self._timeouts.inc(job.name)
+        print(f'⏱️ Job {job.name} has been running for more than {job.timeout:g}s')
+
+    def _execute(self, job):
+        status, error = 'success', None
+        try:
+            job.func()
+        except Exception as e:
+            status, error = 'error', f'{type(e).__name__}: {e}'
+            print(f'❌ Job {job.name} failed: {error}')
+        duration = time.monotonic() - job.started
+        if status == 'success' and job.timed_out:
+            status = 'timeout'
+        run = {
+            'id': job.run_id,
+            'job_name': job.name,
+            'scheduled_for': job.scheduled_for,
+            'started_at': job.started_at,
+            'finished_at': self.clock(),
+            'duration_ms': int(duration * 1000),
+            'status': status,
+            'error': error,
+            'runner': self.runner,
+        }
+        self._durations.observe(job.name, value=duration)
+        self._runs.inc(job.name, status)
+        if status == 'success':
+            self._last_success.set(job.name, value=time.time())
+        if self.history_writer is not None:
+            try:
+                self.history_writer(run)
+            except Exception as e:
+                print(f'Job history write failed for {job.name}: {e}')
+        job.last_run = run
+        job.started = None
+
+    def report(self):
+        """Registered jobs with their schedule and this worker's latest run of each"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            'runner': self.runner,
+            'leader': self._leader,
+            'jobs': [{
+                'name': job.name,
+                'trigger': str(job.trigger),
+                'jitter': job.jitter,
+                'timeout': job.timeout,
+                'next_run': job.next_run,
+                'running': job.started is not None,
+                'last_run': job.last_run,
+            } for job in jobs],
+        }
+
+    def run(self, sleep=time.sleep):
+        """Background loop: contend for the leadership and start due jobs every SCHEDULER_TICK"""
+        self._running = True
+        while self._running:
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f'Scheduler error: {e}')
+            sleep(self.tick)
+
+    def stop(self):
+        self._running = False
+        self.release()
+
+
+# Create global scheduler instance
+scheduler = Scheduler()
@@ -0,0 +1,79 @@
+"""
+Dict shapes sent to dashboards, shared by the JSON APIs, the socket sync and
+the ingest worker processes (which cannot import the app).
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+# Readings are timestamped before they commit, so a slower writer (another ingest
+# worker, the emergency persistence queue) can commit rows behind a cursor already
+# handed out. Cursor queries re-read this much before the cursor; clients dedupe by id.
+CURSOR_OVERLAP_SECONDS = float(os.getenv('CURSOR_OVERLAP_SECONDS', 60))
+
+
+def to_isoformat(value):
+    """ISO 8601 string for a DB timestamp; naive values are stored in UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def encode_cursor(reading):
+    """`since` cursor for the readings after this one: its timestamp, then its id to break ties"""
+    return f"{to_isoformat(reading['timestamp'])},{reading['id']}"
+
+
+def decode_cursor(value):
+    """(naive UTC timestamp, id) of a `since` cursor; ValueError if malformed"""
+    timestamp, _, reading_id = value.rpartition(',')
+    timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp, int(reading_id)
+
+
+def cursor_window(cursor):
+    """The (timestamp, id) position a query for the readings after `cursor` starts from"""
+    return cursor[0] - timedelta(seconds=CURSOR_OVERLAP_SECONDS), 0
+
+
+def serialize_reading(reading):
+    """Reading fields sent to dashboards, shared by the JSON APIs and the socket sync"""
+    return {
+        'id': reading.get('id'),
+        'timestamp': to_isoformat(reading.get('timestamp')),
+        'heart_rate': reading.get('heart_rate'),
+        'body_temperature': reading.get('body_temperature'),
+        'oxygen_saturation': reading.get('oxygen_saturation'),
+        'blood_pressure_systolic': reading.get('blood_pressure_systolic'),
+        'blood_pressure_diastolic': reading.get('blood_pressure_diastolic'),
+        'respiratory_rate': reading.get('respiratory_rate'),
+        'room_temperature': reading.get('room_temperature'),
+        'humidity': reading.get('humidity'),
+        'ecg_value': reading.get('ecg_value'),
+        'ecg_leads_connected': reading.get('ecg_leads_connected', False),
+        'ecg_status': reading.get('ecg_status'),
+        'fall_detected': reading.get('fall_detected', False),
+        'fall_confidence': reading.get('fall_confidence'),
+        'room_detected': reading.get('room_detected', 'Unknown'),
+        'gps_latitude': reading.get('gps_latitude'),
+        'gps_longitude': reading.get('gps_longitude'),
+        'gps_accuracy': reading.get('gps_accuracy'),
+        'emergency_button_pressed': reading.get('emergency_button_pressed', False),
+        'alert_level': reading.get('alert_level', 'normal')
+    }
+
+
+def serialize_alert(alert):
+    return {
+        'id': alert['id'],
+        'patient_id': alert['patient_id'],
+        'alert_type': alert['alert_type'],
+        'severity': alert['severity'],
+        'message': alert['message'],
+        'is_acknowledged': alert.get('is_acknowledged', False),
+        'created_at': to_isoformat(alert.get('created_at'))
+    }
@@ -0,0 +1,140 @@
+"""
+Ward sharding of ingest, latest-state caches and Socket.IO fan-out.
+
+Every patient and device belongs to a ward. Wards are mapped onto shards (one
+worker group each) with a consistent-hash ring, so adding a shard only moves
+the wards that land on it. A shard ingests, tracks liveness for and numbers
+events of its own wards only; readings for a foreign ward are redirected to
+the owning shard, and live events reach other shards' clients through the
+sync relay (live_sync.py). Cross-ward views fan out to every shard and merge.
+
+Configuration (all optional; without SHARD_NODES everything is local):
+    SHARD_ID        name of this shard
+    SHARD_NODES     "a=http://ingest-a:5000,b=http://ingest-b:5000"
+    WARD_SHARDS     pinned wards that bypass the ring, "icu=a,er=b"
+"""
+
+import bisect
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from database_config import DEFAULT_WARD
+from metrics import metrics
+
+SHARD_ID = os.getenv('SHARD_ID', 'local')
+SHARD_VNODES = int(os.getenv('SHARD_VNODES', 64))
+SHARD_FANOUT_TIMEOUT = float(os.getenv('SHARD_FANOUT_TIMEOUT', 2))
+
+
+def _parse_pairs(value):
+    pairs = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        key, _, val = item.partition('=')
+        pairs[key.strip()] = val.strip()
+    return pairs
+
+
+def ward_room(ward):
+    """Socket.IO room of clients following one ward"""
+    return f'ward:{ward}'
+
+
+class ConsistentHashRing:
+    def __init__(self, nodes=(), vnodes=SHARD_VNODES):
+        self.vnodes = vnodes
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            point = self._hash(f'{node}#{i}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def node_for(self, key):
+        if not self._points:
+            raise LookupError('Hash ring has no nodes')
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class WardRouter:
+    def __init__(self, shard_id=SHARD_ID, nodes=None, pinned=None):
+        self.shard_id = shard_id
+        # {shard name: base URL}; this shard's own URL is not needed
+        self.nodes = nodes if nodes is not None else _parse_pairs(os.getenv('SHARD_NODES'))
+        self.nodes.setdefault(shard_id, None)
+        self.pinned = pinned if pinned is not None else _parse_pairs(os.getenv('WARD_SHARDS'))
+        self.ring = ConsistentHashRing(sorted(self.nodes))
+        self._routed = metrics.registry.counter(
+            'ingest_routed_total', 'Device requests by routing outcome', ('result',))
+        self._pool = None
+
+    @property
+    def sharded(self):
+        return len(self.nodes) > 1
+
+    def shard_for(self, ward):
+        ward = ward or DEFAULT_WARD
+        return self.pinned.get(ward) or self.ring.node_for(ward)
+
+    def is_local(self, ward):
+        return not self.sharded or self.shard_for(ward) == self.shard_id
+
+    def local_wards(self, wards):
+        return [ward for ward in wards if self.is_local(ward)]
+
+    def redirect_url(self, ward, path):
+        """URL on the owning shard for a request this shard should not handle, or None if it is ours"""
+        if self.is_local(ward):
+            self._routed.inc('local')
+            return None
+        self._routed.inc('redirect')
+        return self.nodes[self.shard_for(ward)].rstrip('/') + path
+
+    def fan_out(self, path, local_result, headers=None):
+        """
+        Merge layer for cross-ward views: GET `path` (JSON list) on every other
+        shard in parallel and combine it with this shard's `local_result`.
+        Returns (items, {shard: 'ok' | error}); an unreachable shard only loses its part.
+        """
+        peers = {name: url for name, url in self.nodes.items() if name != self.shard_id and url}
+        status = {self.shard_id: 'ok'}
+        items = list(local_result)
+        if not peers:
+            return items, status
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='shard-fanout')
+
+        def fetch(url):
+            response = requests.get(url.rstrip('/') + path, headers=headers, timeout=SHARD_FANOUT_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+
+        futures = {name: self._pool.submit(fetch, url) for name, url in peers.items()}
+        for name, future in futures.items():
+            try:
+                items.extend(future.result())
+                status[name] = 'ok'
+            except Exception as e:
+                status[name] = str(e)
+        return items, status
+
+
+# Create global ward router instance
+ward_router = WardRouter()
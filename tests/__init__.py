@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# The app reads DATABASE_URL on import; the tests run against a throwaway SQLite file
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
@@ -0,0 +1,32 @@
+import itertools
+
+_numbers = itertools.count(1)
+
+
+def app_module():
+    """The app with a migrated schema and the default admin"""
+    import app as appmod
+    from migrations import MigrationRunner
+
+    appmod.create_app()
+    # Tests that need the background loops start them explicitly
+    appmod.app.config['BACKGROUND_SERVICES'] = False
+    MigrationRunner(appmod.database_service.engine).upgrade()
+    appmod.create_default_admin()
+    return appmod
+
+
+def logged_in_client(appmod):
+    client = appmod.app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+
+def create_patient(appmod, ward=None):
+    """A new device and the patient wearing it; returns the patient dict plus the device's `device_code`"""
+    n = next(_numbers)
+    database_service = appmod.database_service
+    device_pk = database_service.create_device({'device_id': f'TEST-{n}', 'device_name': f'test {n}', 'ward': ward})
+    patient_pk = database_service.create_patient({'name': f'Test {n}', 'esp32_device_id': device_pk,
+                                                  'medical_id': f'MED-TEST-{n}', 'ward': ward})
+    return dict(database_service.get_patient_by_id(patient_pk), device_code=f'TEST-{n}')
@@ -0,0 +1,67 @@
+import json
+import unittest
+from unittest import mock
+
+from admission import TokenBuckets, peek_payload
+
+
+class TokenBucketsTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('admission.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buckets = TokenBuckets(rate=0.5, burst=3)
+
+    def test_burst_then_refill(self):
+        self.assertEqual([self.buckets.try_acquire('d1')[0] for _ in range(4)], [True, True, True, False])
+        self.assertEqual(self.buckets.try_acquire('d1'), (False, 2.0))
+        # Other devices have their own bucket
+        self.assertTrue(self.buckets.try_acquire('d2')[0])
+        self.now += 2
+        self.assertEqual(self.buckets.try_acquire('d1'), (True, 0.0))
+        self.assertFalse(self.buckets.try_acquire('d1')[0])
+
+    def test_refill_is_capped_at_burst(self):
+        self.buckets.try_acquire('d1')
+        self.now += 3600
+        self.assertEqual([self.buckets.try_acquire('d1')[0] for _ in range(4)], [True, True, True, False])
+
+    def test_idle_buckets_are_swept(self):
+        self.buckets.try_acquire('d1')
+        self.now += 61
+        self.buckets.try_acquire('d2')
+        self.assertEqual(set(self.buckets._buckets), {'d2'})
+
+
+class PeekPayloadTest(unittest.TestCase):
+    def body(self, raw_flag):
+        return b'{"device_id": "esp32-1", "heart_rate": 80, "fall_detected": ' + raw_flag + b'}'
+
+    def test_falsy_flags(self):
+        for flag in (b'false', b'0', b'0.0', b'null', b'""', b' false'):
+            with self.subTest(flag=flag):
+                self.assertEqual(peek_payload(self.body(flag)), ('esp32-1', False))
+                # Same answer as decoding the body
+                self.assertFalse(json.loads(self.body(flag))['fall_detected'])
+
+    def test_truthy_flags(self):
+        for flag in (b'true', b'1', b'0.5', b'"yes"'):
+            with self.subTest(flag=flag):
+                self.assertEqual(peek_payload(self.body(flag)), ('esp32-1', True))
+        body = b'{"device_id":"esp32-1","emergency_button_pressed":true}'
+        self.assertEqual(peek_payload(body), ('esp32-1', True))
+
+    def test_escaped_device_id(self):
+        body = json.dumps({'device_id': 'ward "A"\\1', 'fall_detected': True}).encode()
+        self.assertEqual(peek_payload(body), ('ward "A"\\1', True))
+        body = json.dumps({'note': '"device_id": "fake"', 'device_id': 'esp32-1'}).encode()
+        self.assertEqual(peek_payload(body), ('esp32-1', False))
+
+    def test_unparseable_body(self):
+        self.assertEqual(peek_payload(b'not json'), (None, False))
+        self.assertEqual(peek_payload(b'[1, 2]'), (None, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
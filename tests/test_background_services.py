@@ -0,0 +1,44 @@
+import threading
+import unittest
+from unittest import mock
+
+from tests.app_fixtures import app_module
+
+
+class BackgroundServicesTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module()
+        self.addCleanup(self.app.app.config.__setitem__, 'BACKGROUND_SERVICES', False)
+        self.addCleanup(self.app.app.extensions.pop, 'background_services', None)
+        self.app.app.extensions.pop('background_services', None)
+        self.app.app.config['BACKGROUND_SERVICES'] = True
+
+    def test_first_request_starts_services_once(self):
+        # Without `python app.py` (flask run, WSGI servers) the first request starts them
+        with mock.patch.object(self.app, '_start_background_services') as start:
+            client = self.app.app.test_client()
+            threads = [threading.Thread(target=client.get, args=('/health',)) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            client.get('/health')
+        start.assert_called_once_with()
+
+    def test_failed_start_is_retried(self):
+        with mock.patch.object(self.app, '_start_background_services', side_effect=[RuntimeError('db down'), None]) as start:
+            client = self.app.app.test_client()
+            self.assertEqual(client.get('/health').status_code, 500)
+            self.assertEqual(client.get('/health').status_code, 200)
+            client.get('/health')
+        self.assertEqual(start.call_count, 2)
+
+    def test_disabled(self):
+        self.app.app.config['BACKGROUND_SERVICES'] = False
+        with mock.patch.object(self.app, '_start_background_services') as start:
+            self.app.app.test_client().get('/health')
+        start.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
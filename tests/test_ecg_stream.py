@@ -0,0 +1,40 @@
+import unittest
+
+from ecg_stream import FRAME_HEADER, FRAME_MAX_BLOCKS, EcgRelay, iter_blocks, pack_block
+
+
+class EcgRelayTest(unittest.TestCase):
+    def setUp(self):
+        self.frames = []
+        self.relay = EcgRelay(max_pending=8)
+        self.relay.emit = lambda event, data, to, namespace: self.frames.append(data) if event == 'ecg' else None
+        self.relay.connect_device('device', 7)
+        self.relay.subscribe('dashboard', 7)
+
+    def test_empty_payload_is_rejected(self):
+        self.assertEqual(self.relay.add_blocks('device', b''), 0)
+        self.assertEqual(self.relay.flush(), 0)
+        self.assertEqual(self.frames, [])
+
+    def test_block_count_fits_frame_header(self):
+        block = pack_block(1000.0, 250, [1])
+        # Two payloads that together exceed the uint16 block count
+        for _ in range(2):
+            self.assertEqual(self.relay.add_blocks('device', block * (FRAME_MAX_BLOCKS // 2 + 1)), FRAME_MAX_BLOCKS // 2 + 1)
+        self.assertEqual(self.relay.flush(), 2)
+        counts = []
+        for frame in self.frames:
+            patient_id, _, count = FRAME_HEADER.unpack_from(frame)
+            self.assertEqual(patient_id, 7)
+            self.assertEqual(len(list(iter_blocks(frame[FRAME_HEADER.size:]))), count)
+            counts.append(count)
+        self.assertEqual(counts, [FRAME_MAX_BLOCKS // 2 + 1] * 2)
+
+    def test_oversized_payload_is_rejected(self):
+        block = pack_block(1000.0, 250, [1])
+        self.assertEqual(self.relay.add_blocks('device', block * (FRAME_MAX_BLOCKS + 1)), 0)
+        self.assertEqual(self.relay.flush(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
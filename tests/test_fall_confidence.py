@@ -0,0 +1,52 @@
+import json
+import unittest
+from unittest import mock
+
+from sqlalchemy import select
+
+from tests.app_fixtures import app_module, create_patient, logged_in_client
+
+
+class FallConfidenceTest(unittest.TestCase):
+    """The digital fall bit keeps its confidence when the classifier is less sure"""
+
+    def setUp(self):
+        self.app = app_module()
+        self.patient = create_patient(self.app)
+
+    def body(self, message_id):
+        return json.dumps({'device_id': self.patient['device_code'], 'message_id': message_id,
+                           'fall_detected': True,
+                           'accel_window': {'rate_hz': 50, 'samples': [[0, 0, 1]] * 50}}).encode()
+
+    def stored_confidence(self):
+        from database_config import SensorReading
+
+        db = self.app.database_service.SessionLocal()
+        try:
+            return db.scalars(select(SensorReading.fall_confidence)
+                              .where(SensorReading.patient_id == self.patient['id'])
+                              .order_by(SensorReading.id.desc())).first()
+        finally:
+            db.close()
+
+    def test_worker_path(self):
+        from ingest_pipeline import IngestWorker
+
+        with mock.patch('fall_classifier.classify_windows', return_value=[0.2]):
+            result = dict(IngestWorker().process([(1, self.body('boot-1'), ())]))[1]
+        self.assertTrue(result['reading']['fall_detected'])
+        self.assertEqual(result['reading']['fall_confidence'], 0.9)
+
+    def test_in_thread_path(self):
+        from fall_classifier import fall_classifier
+
+        client = logged_in_client(self.app)
+        with mock.patch.object(fall_classifier, 'classify', return_value=(False, 0.2)):
+            response = client.post('/api/sensor_data', data=self.body('boot-2'), content_type='application/json')
+        self.assertTrue(response.get_json()['fall_detected'])
+        self.assertEqual(self.stored_confidence(), 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
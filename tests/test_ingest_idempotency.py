@@ -0,0 +1,64 @@
+import json
+import unittest
+from unittest import mock
+
+from sqlalchemy import func, select
+
+from tests.app_fixtures import app_module, create_patient, logged_in_client
+
+
+class IngestIdempotencyTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module()
+        from ingest_pipeline import IngestWorker
+
+        self.worker = IngestWorker()
+        self.patient = create_patient(self.app)
+
+    def body(self, message_id, heart_rate=80):
+        return json.dumps({'device_id': self.patient['device_code'], 'message_id': message_id,
+                           'heart_rate': heart_rate}).encode()
+
+    def stored(self):
+        from database_config import SensorReading
+
+        db = self.app.database_service.SessionLocal()
+        try:
+            return db.scalar(select(func.count()).where(SensorReading.patient_id == self.patient['id']))
+        finally:
+            db.close()
+
+    def test_retry_after_timeout_is_stored_once(self):
+        first = dict(self.worker.process([(1, self.body('boot-1'), ())]))
+        self.assertNotIn('duplicate', first[1])
+        # The acceptor answered 503 meanwhile; the device resends the same message
+        retried = dict(self.worker.process([(2, self.body('boot-1'), ()), (3, self.body('boot-2'), ())]))
+        self.assertTrue(retried[2]['duplicate'])
+        self.assertEqual(retried[3]['status'], 200)
+        self.assertNotIn('duplicate', retried[3])
+        self.assertEqual(self.stored(), 2)
+
+    def test_copies_in_one_batch_are_stored_once(self):
+        results = dict(self.worker.process([(1, self.body('boot-1'), ()), (2, self.body('boot-1'), ())]))
+        self.assertNotIn('duplicate', results[1])
+        self.assertTrue(results[2]['duplicate'])
+        self.assertEqual(self.stored(), 1)
+
+    def test_unique_index_catches_copy_stored_after_check(self):
+        self.worker.process([(1, self.body('boot-1'), ())])
+        with mock.patch.object(self.worker.database_service, 'get_stored_message_ids', return_value=set()):
+            results = dict(self.worker.process([(2, self.body('boot-1'), ()), (3, self.body('boot-2'), ())]))
+        self.assertTrue(results[2]['duplicate'])
+        self.assertIsNotNone(results[3]['reading']['id'])
+        self.assertEqual(self.stored(), 2)
+
+    def test_in_thread_path_acknowledges_retry(self):
+        client = logged_in_client(self.app)
+        for _ in range(2):
+            response = client.post('/api/sensor_data', data=self.body('boot-1'), content_type='application/json')
+        self.assertEqual(response.get_json(), {'status': 'duplicate'})
+        self.assertEqual(self.stored(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import threading
+import time
+import unittest
+
+from ingest_pipeline import INGEST_BATCHES_IN_FLIGHT, IngestPipeline, _WorkerHandle
+from sharding import ConsistentHashRing
+
+
+class RecordingPipe:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+class IngestPriorityTest(unittest.TestCase):
+    def test_emergency_reading_overtakes_queued_routine_readings(self):
+        pipeline = IngestPipeline(workers=1, batch_size=1, batch_wait=0)
+        handle = _WorkerHandle('ingest-0')
+        handle.requests = RecordingPipe()
+        pipeline._handles = {handle.name: handle}
+        pipeline._ring = ConsistentHashRing([handle.name])
+        pipeline._running = True
+
+        # The worker is busy with earlier batches while a backlog builds up
+        handle.batches = INGEST_BATCHES_IN_FLIGHT
+        for _ in range(3):
+            pipeline.submit(b'routine', 'DEV-1')
+        pipeline.submit(b'fall', 'DEV-2', emergency=True)
+        threading.Thread(target=pipeline._send_loop, args=(handle,), daemon=True).start()
+        with handle.window:
+            handle.batches = 0
+            handle.window.notify_all()
+
+        deadline = time.monotonic() + 5
+        while len(handle.requests.messages) < INGEST_BATCHES_IN_FLIGHT and time.monotonic() < deadline:
+            time.sleep(0.01)
+        bodies = [batch[0][1] for _, batch in handle.requests.messages]
+        self.assertEqual(bodies, [b'fall'] + [b'routine'] * (INGEST_BATCHES_IN_FLIGHT - 1))
+        # No more than INGEST_BATCHES_IN_FLIGHT batches go out before the worker answers
+        time.sleep(0.05)
+        self.assertEqual(len(handle.requests.messages), INGEST_BATCHES_IN_FLIGHT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import unittest
+
+from live_sync import SyncHub
+from sharding import WardRouter
+
+
+def relayed_hubs():
+    """Two shards' hubs: 'a' owns icu, 'b' owns er, linked by an in-memory relay channel"""
+    nodes = {'a': None, 'b': 'http://b'}
+    pinned = {'icu': 'a', 'er': 'b'}
+    hubs = {name: SyncHub(relay_url='redis://relay', router=WardRouter(name, dict(nodes), pinned))
+            for name in nodes}
+    for hub in hubs.values():
+        hub._send = lambda message, hub=hub: [
+            other.receive(json.loads(json.dumps(dict(message, origin=hub.origin)))) for other in hubs.values()]
+    return hubs['a'], hubs['b']
+
+
+class SyncRelayTest(unittest.TestCase):
+    def test_foreign_shard_mirrors_owner_sequence(self):
+        a, b = relayed_hubs()
+        a.publish('reading', {'id': 1}, 'icu')
+        a.publish('reading', {'id': 2}, 'icu')
+        self.assertEqual(b.seqs(), {'icu': 2})
+        self.assertEqual([e['data']['id'] for e in b.events_since('icu', 0)], [1, 2])
+
+        # A client of shard b that saw seq 1 replays from b's mirror
+        event_name, payload = b.handle_sync_request({'icu': 1}, ['icu'])
+        self.assertEqual(event_name, 'sync_replay')
+        self.assertEqual([e['seq'] for e in payload['events']], [2])
+
+    def test_foreign_ward_event_is_numbered_by_owner(self):
+        a, b = relayed_hubs()
+        a.publish('reading', {'id': 1}, 'icu')
+        self.assertIsNone(b.publish('alert_acknowledged', {'alert_ids': [5]}, 'icu'))
+        self.assertEqual(a.seqs(), {'icu': 2})
+        self.assertEqual(b.seqs(), {'icu': 2})
+        self.assertEqual(b.events_since('icu', 1)[0]['type'], 'alert_acknowledged')
+
+    def test_lost_relay_message_forces_snapshot(self):
+        a, b = relayed_hubs()
+        a.publish('reading', {'id': 1}, 'icu')
+        send = a._send
+        a._send = lambda message: None
+        a.publish('reading', {'id': 2}, 'icu')
+        a._send = send
+        a.publish('reading', {'id': 3}, 'icu')
+        self.assertEqual(b.seqs(), {'icu': 3})
+        self.assertIsNone(b.events_since('icu', 1))
+        self.assertEqual(len(b.events_since('icu', 2)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import MigrationRunner, discover
+
+
+class MigrationRunnerTest(unittest.TestCase):
+    def setUp(self):
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        self.engine = create_engine(f'sqlite:///{path}')
+        self.addCleanup(self.engine.dispose)
+        self.runner = MigrationRunner(self.engine)
+        self.versions = [version for version, _, _ in discover()]
+
+    def tables(self):
+        return set(inspect(self.engine).get_table_names())
+
+    def test_dry_run_changes_nothing(self):
+        self.assertEqual(self.runner.upgrade(dry_run=True), self.versions)
+        self.assertEqual(self.tables(), set())
+        self.assertEqual(self.runner.current_version(), 0)
+        self.assertTrue(all(not applied for _, _, applied in self.runner.status()))
+
+    def test_rerun_is_a_no_op(self):
+        self.assertEqual(self.runner.upgrade(target=self.versions[1]), self.versions[:2])
+        self.assertEqual(self.runner.upgrade(), self.versions[2:])
+        tables = self.tables()
+        self.assertIn('sensor_readings', tables)
+        self.assertEqual(self.runner.upgrade(), [])
+        self.assertEqual(self.runner.upgrade(dry_run=True), [])
+        self.assertEqual(self.tables(), tables)
+        self.assertEqual(self.runner.current_version(), self.versions[-1])
+        with self.engine.connect() as connection:
+            recorded = connection.execute(text('SELECT version FROM schema_migrations ORDER BY version')).scalars()
+            self.assertEqual(list(recorded), self.versions)
+
+    def test_schema_created_by_models_is_adopted(self):
+        # Databases made with `flask init-db` already have every table and column
+        from database_config import Base
+
+        Base.metadata.create_all(self.engine)
+        tables = self.tables()
+        self.assertEqual(self.runner.upgrade(), self.versions)
+        self.assertEqual(self.tables() - {'schema_migrations'}, tables)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from benchmarks.notify_bench import StandIn, start_http, start_smtp
+from notifications import NotificationDispatcher, SmtpChannel, WebhookChannel, _on_shift
+
+ALERT = {'id': 1, 'patient_id': 1, 'alert_type': 'fall', 'severity': 'critical', 'message': 'Té ngã'}
+
+
+class FlakyStandIn(StandIn):
+    """Refuses the first `failures` messages, then accepts"""
+
+    def __init__(self, failures=0, latency=0.0):
+        super().__init__(latency, 0.0)
+        self.failures = failures
+
+    def handle_message(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.failed < self.failures:
+                self.failed += 1
+                return False
+            self.accepted += 1
+            return True
+
+
+class DispatcherTest(unittest.TestCase):
+    def dispatcher(self, stand_in, channel='sms', per_minute=600, burst=10, retry_base=0.05):
+        if channel == 'email':
+            server = start_smtp(stand_in)
+            channels = [SmtpChannel(f'smtp://127.0.0.1:{server.server_address[1]}', pool_size=1)]
+        else:
+            server = start_http(stand_in)
+            channels = [WebhookChannel(channel, f'http://127.0.0.1:{server.server_address[1]}/send', pool_size=1)]
+        self.addCleanup(server.shutdown)
+        self.addCleanup(channels[0].close)
+        dispatcher = NotificationDispatcher(
+            channels, [{'name': 'on call', 'email': 'oncall@bv.local', 'sms': '+84900000001'}],
+            retry_base=retry_base, per_minute={channel: per_minute}, burst=burst)
+        self.outcomes = []
+        dispatcher.on_result = lambda delivery, outcome: self.outcomes.append((outcome, delivery.attempts))
+        return dispatcher
+
+    def test_failed_sends_are_retried_with_backoff(self):
+        for channel in ('sms', 'email'):
+            with self.subTest(channel=channel):
+                stand_in = FlakyStandIn(failures=2)
+                dispatcher = self.dispatcher(stand_in, channel)
+                # Longest jitter, so the waits are the full backoff: 0.05s then 0.1s
+                with mock.patch('notifications.random.uniform', side_effect=lambda low, high: high) as uniform:
+                    started = time.monotonic()
+                    dispatcher.notify(ALERT)
+                    self.assertTrue(dispatcher.join(timeout=10))
+                elapsed = time.monotonic() - started
+                self.assertGreaterEqual(elapsed, 0.15)
+                self.assertLess(elapsed, 1)
+                self.assertEqual([call.args for call in uniform.call_args_list], [(0, 0.05), (0, 0.1)])
+                self.assertEqual(self.outcomes, [('sent', 3)])
+                self.assertEqual((stand_in.failed, stand_in.accepted), (2, 1))
+
+    def test_gateway_4xx_is_not_retried(self):
+        stand_in = FlakyStandIn(failures=5)
+        stand_in.refused_status = 400
+        dispatcher = self.dispatcher(stand_in)
+        dispatcher.notify(ALERT)
+        self.assertTrue(dispatcher.join(timeout=10))
+        self.assertEqual(self.outcomes, [('rejected', 1)])
+        self.assertEqual(stand_in.failed, 1)
+
+    def test_recipient_cap(self):
+        stand_in = FlakyStandIn()
+        dispatcher = self.dispatcher(stand_in, per_minute=0.01, burst=2)
+        for alert_id in range(3):
+            dispatcher.notify(dict(ALERT, id=alert_id))
+        self.assertTrue(dispatcher.join(timeout=10))
+        self.assertEqual(sorted(outcome for outcome, _ in self.outcomes), ['rate_limited', 'sent', 'sent'])
+        self.assertEqual(stand_in.accepted, 2)
+
+    def test_join_waits_for_every_outcome(self):
+        stand_in = FlakyStandIn(latency=0.3)
+        dispatcher = self.dispatcher(stand_in)
+        dispatcher.notify(ALERT)
+        self.assertFalse(dispatcher.join(timeout=0.05))
+        self.assertTrue(dispatcher.join(timeout=10))
+        self.assertEqual(self.outcomes, [('sent', 1)])
+
+        # Alerts nobody receives and ones below the severity threshold settle too
+        dispatcher.roster = []
+        dispatcher.notify(ALERT)
+        dispatcher.notify(dict(ALERT, severity='warning'))
+        self.assertTrue(dispatcher.join(timeout=10))
+        self.assertEqual(dispatcher._outstanding, 0)
+
+    def test_join_counts_concurrent_notifies(self):
+        dispatcher = self.dispatcher(FlakyStandIn())
+        threads = [threading.Thread(target=dispatcher.notify, args=(dict(ALERT, id=i),)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(dispatcher.join(timeout=10))
+        self.assertEqual(len(self.outcomes), 5)
+
+
+class OnShiftTest(unittest.TestCase):
+    # 2024-01-05 is a Friday
+    NIGHT = {'wards': ['ICU'], 'from': '19:00', 'to': '07:00', 'days': [4]}
+
+    def test_overnight_shift(self):
+        self.assertTrue(_on_shift(self.NIGHT, 'ICU', datetime(2024, 1, 5, 19, 0)))
+        self.assertTrue(_on_shift(self.NIGHT, 'ICU', datetime(2024, 1, 5, 23, 59)))
+        # Saturday morning is still Friday's shift
+        self.assertTrue(_on_shift(self.NIGHT, 'ICU', datetime(2024, 1, 6, 6, 59)))
+        self.assertFalse(_on_shift(self.NIGHT, 'ICU', datetime(2024, 1, 6, 7, 0)))
+        self.assertFalse(_on_shift(self.NIGHT, 'ICU', datetime(2024, 1, 5, 12, 0)))
+        # Friday morning belongs to Thursday's shift, which is not listed
+        self.assertFalse(_on_shift(self.NIGHT, 'ICU', datetime(2024, 1, 5, 3, 0)))
+        self.assertFalse(_on_shift(self.NIGHT, 'ER', datetime(2024, 1, 5, 23, 0)))
+
+    def test_day_shift_and_defaults(self):
+        day = {'from': '07:00', 'to': '19:00', 'days': [4]}
+        self.assertTrue(_on_shift(day, 'ER', datetime(2024, 1, 5, 7, 0)))
+        self.assertFalse(_on_shift(day, 'ER', datetime(2024, 1, 5, 19, 0)))
+        self.assertFalse(_on_shift(day, 'ER', datetime(2024, 1, 6, 12, 0)))
+        self.assertTrue(_on_shift({}, 'ER', datetime(2024, 1, 6, 23, 59)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import unittest
+from datetime import datetime
+
+from patient_summary import PatientSummary, SummaryStore
+
+
+def reading(reading_id, patient_id=1, **values):
+    return dict({'id': reading_id, 'patient_id': patient_id, 'timestamp': datetime.utcnow()}, **values)
+
+
+class SummaryStoreLockTest(unittest.TestCase):
+    def test_cold_load_does_not_block_other_patients(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def rebuilder(patient_id, since):
+            if patient_id == 1:
+                started.set()
+                release.wait(5)
+            return [], []
+
+        store = SummaryStore()
+        store.rebuilder = rebuilder
+        store.apply([reading(1, patient_id=2, heart_rate=70.0)], [])
+        cold = threading.Thread(target=store.apply, args=([reading(2, patient_id=1, heart_rate=80.0)], []))
+        cold.start()
+        self.assertTrue(started.wait(5))
+
+        # Patient 2 is served while patient 1 is still loading
+        done = threading.Event()
+        threading.Thread(target=lambda: (store.apply([reading(3, patient_id=2, heart_rate=72.0)], []),
+                                         store.get(2), done.set())).start()
+        self.assertTrue(done.wait(2))
+        self.assertEqual(store.get(2)['vitals']['heart_rate']['count'], 2)
+
+        release.set()
+        cold.join(5)
+        self.assertEqual(store.get(1)['vitals']['heart_rate']['count'], 1)
+
+
+class SummaryDedupeTest(unittest.TestCase):
+    def test_late_commit_with_lower_id_is_counted(self):
+        summary = PatientSummary(1)
+        summary.add_reading(reading(11, heart_rate=80.0))
+        # Committed after 11, e.g. an emergency reading from the persistence queue
+        summary.add_reading(reading(10, fall_detected=True, heart_rate=120.0))
+        stats = summary.to_dict()
+        self.assertEqual(stats['vitals']['heart_rate']['count'], 2)
+        self.assertEqual(stats['vitals']['heart_rate']['max'], 120.0)
+        self.assertIsNotNone(stats['last_fall_at'])
+
+        summary.add_alert(7, 'critical', datetime.utcnow())
+        summary.add_alert(6, 'warning', datetime.utcnow())
+        self.assertEqual(summary.to_dict()['alerts'], {'warning': 1, 'critical': 1})
+
+    def test_rebuild_and_stream_overlap_counts_once(self):
+        rebuilt = [reading(1, heart_rate=70.0), reading(2, heart_rate=72.0)]
+        store = SummaryStore()
+        store.rebuilder = lambda patient_id, since: (rebuilt, [(5, 'warning', datetime.utcnow())])
+        # Reading 2 and alert 5 were committed while the rebuild ran, so the stream delivers them too
+        store.apply([rebuilt[1], reading(3, heart_rate=74.0)], [(1, 5, 'warning', datetime.utcnow())])
+        stats = store.get(1)
+        self.assertEqual(stats['vitals']['heart_rate']['count'], 3)
+        self.assertEqual(stats['alerts']['warning'], 1)
+
+    def test_stored_row_keeps_recent_ids(self):
+        summary = PatientSummary(1)
+        summary.add_reading(reading(4, heart_rate=70.0))
+        loaded = PatientSummary.loads(1, summary.dumps())
+        loaded.add_reading(reading(4, heart_rate=70.0))
+        loaded.add_reading(reading(3, heart_rate=90.0))
+        self.assertEqual(loaded.to_dict()['vitals']['heart_rate']['count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
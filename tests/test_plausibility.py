@@ -0,0 +1,47 @@
+import unittest
+
+from plausibility import PlausibilityFilter
+
+
+class PlausibilityFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.filter = PlausibilityFilter(window=3)
+
+    def test_out_of_range_values_are_dropped(self):
+        samples = [{'heart_rate': 0, 'oxygen_saturation': 40, 'body_temperature': 36.8},
+                   {'heart_rate': 'n/a'}]
+        rejected = self.filter.process('esp32-1', samples)
+        self.assertEqual(rejected, [{'heart_rate': 'implausible', 'oxygen_saturation': 'implausible'},
+                                    {'heart_rate': 'invalid'}])
+        self.assertEqual(samples[0], {'heart_rate': None, 'oxygen_saturation': None, 'body_temperature': 36.8})
+        self.assertIsNone(samples[1]['heart_rate'])
+
+    def test_single_spike_is_dropped(self):
+        samples = [{'heart_rate': value} for value in (72, 74, 150, 73)]
+        rejected = self.filter.process('esp32-1', samples)
+        self.assertEqual(rejected, [{}, {}, {'heart_rate': 'spike'}, {}])
+        self.assertEqual([sample['heart_rate'] for sample in samples], [72, 74, None, 73])
+
+    def test_persisting_level_change_is_accepted(self):
+        self.filter.process('esp32-1', [{'heart_rate': 72}, {'heart_rate': 74}])
+        # One sample at a time, as readings arrive: the second high value is believed
+        first, second = {'heart_rate': 130}, {'heart_rate': 132}
+        self.assertEqual(self.filter.process('esp32-1', [first]), [{'heart_rate': 'spike'}])
+        self.assertEqual(self.filter.process('esp32-1', [second]), [{}])
+        self.assertEqual(second['heart_rate'], 132)
+
+    def test_devices_have_separate_windows(self):
+        self.filter.process('esp32-1', [{'heart_rate': 72}, {'heart_rate': 74}])
+        self.assertEqual(self.filter.process('esp32-2', [{'heart_rate': 130}]), [{}])
+        self.filter.forget('esp32-1')
+        self.assertEqual(self.filter.process('esp32-1', [{'heart_rate': 130}]), [{}])
+
+    def test_calibration_is_applied_before_checks(self):
+        sample = {'body_temperature': 36.2, 'heart_rate': 248}
+        rejected = self.filter.process('esp32-1', [sample], {'body_temperature': 0.45, 'heart_rate': 5})
+        self.assertEqual(rejected, [{'heart_rate': 'implausible'}])
+        self.assertEqual(sample, {'body_temperature': 36.65, 'heart_rate': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
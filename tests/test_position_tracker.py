@@ -0,0 +1,62 @@
+import unittest
+
+from position_tracker import GEOFENCES, ROOMS, TRACK_MAX_REJECTS, UNKNOWN_ROOM, PositionTracker
+
+ROOM_101 = (10.77565, 106.70175)
+
+
+class PositionTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.tracker = PositionTracker(rooms=ROOMS, geofences=GEOFENCES)
+        self.clock = 1_000_000.0
+
+    def fix(self, lat, lng, accuracy=2.5, patient_id=1):
+        self.clock += 30
+        return self.tracker.update([patient_id], [lat], [lng], [accuracy], [self.clock])[0]
+
+    def settle(self, fixes=10):
+        for _ in range(fixes):
+            result = self.fix(*ROOM_101)
+        self.assertEqual(result['room'], 'Phòng 101')
+
+    def test_fixes_without_lock_after_reboot_keep_the_track(self):
+        self.settle()
+        for _ in range(10):
+            result = self.fix(0.0, 0.0, accuracy=0.0)
+            self.assertEqual(result['room'], UNKNOWN_ROOM)
+            self.assertEqual(result['events'], [])
+        result = self.fix(*ROOM_101)
+        self.assertEqual(result['room'], 'Phòng 101')
+        self.assertEqual(result['events'], [])
+
+    def test_first_fixes_without_lock_do_not_start_a_track(self):
+        for _ in range(5):
+            self.assertEqual(self.fix(0.0, 0.0, accuracy=0.0)['room'], UNKNOWN_ROOM)
+        self.assertEqual(self.tracker.tracked, 0)
+        self.assertEqual(self.fix(*ROOM_101)['room'], 'Phòng 101')
+
+    def test_single_far_glitch_is_rejected(self):
+        self.settle()
+        result = self.fix(ROOM_101[0] + 0.02, ROOM_101[1])
+        self.assertEqual(result['room'], 'Phòng 101')
+        self.assertEqual(result['events'], [])
+        self.assertAlmostEqual(result['latitude'], ROOM_101[0], places=4)
+
+    def test_track_started_from_a_bad_fix_restarts(self):
+        self.fix(ROOM_101[0] + 0.5, ROOM_101[1] + 0.5)
+        for _ in range(TRACK_MAX_REJECTS + self.tracker.confirm_fixes):
+            result = self.fix(*ROOM_101)
+        self.assertEqual(result['room'], 'Phòng 101')
+        self.assertAlmostEqual(result['latitude'], ROOM_101[0], places=4)
+
+    def test_leaving_the_ward_still_alerts(self):
+        self.settle()
+        events = []
+        outside = (ROOM_101[0] - 0.0004, ROOM_101[1])  # about 45 m south of the treatment area
+        for _ in range(TRACK_MAX_REJECTS + 2 * self.tracker.confirm_fixes):
+            events += self.fix(*outside)['events']
+        self.assertEqual([fence['name'] for fence in events], ['Khu điều trị'])
+
+
+if __name__ == '__main__':
+    unittest.main()
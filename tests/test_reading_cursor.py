@@ -0,0 +1,60 @@
+import unittest
+from urllib.parse import quote
+from datetime import datetime, timedelta
+
+from hot_tier import PatientSeries, _micros
+from tests.app_fixtures import app_module, create_patient, logged_in_client
+
+
+class LateCommitTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = app_module()
+        cls.client = logged_in_client(cls.app)
+
+    def insert(self, patient, timestamp):
+        reading_ids, _ = self.app.database_service.create_readings_and_alerts([{
+            'patient_id': patient['id'], 'device_id': patient['device_id'], 'timestamp': timestamp,
+            'heart_rate': 80.0, 'alert_level': 'normal',
+        }], [])
+        return reading_ids[0]
+
+    def poll(self, patient, cursor):
+        response = self.client.get(f"/api/patient_readings/{patient['id']}?hours=24&since={quote(cursor or '')}")
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_reading_committed_behind_the_cursor_is_returned(self):
+        patient = create_patient(self.app)
+        now = datetime.utcnow()
+        first = self.insert(patient, now)
+        page = self.poll(patient, None)
+        self.assertEqual([r['id'] for r in page['readings']], [first])
+
+        # Stamped before `first` but committed after the client's poll
+        late = self.insert(patient, now - timedelta(seconds=5))
+        again = self.poll(patient, page['cursor'])
+        self.assertIn(late, [r['id'] for r in again['readings']])
+        # The cursor does not move backwards
+        self.assertEqual(again['cursor'], page['cursor'])
+
+    def test_patients_status_cursor_overlaps(self):
+        patient = create_patient(self.app)
+        self.insert(patient, datetime.utcnow())
+        cursor = self.client.get('/api/patients_status?since=').get_json()['cursor']
+        patients = self.client.get(f'/api/patients_status?since={quote(cursor)}').get_json()['patients']
+        self.assertIn(patient['id'], [p['id'] for p in patients])
+
+
+class HotTierOrderTest(unittest.TestCase):
+    def test_same_timestamp_rows_are_kept_in_id_order(self):
+        ts = datetime.utcnow()
+        series = PatientSeries(_micros(ts - timedelta(hours=1)))
+        for reading_id in (5, 3, 4):
+            series.add({'id': reading_id, 'timestamp': ts}, lambda value: 0)
+        rows = series.rows(_micros(ts - timedelta(hours=1)), 1, [None], after=(_micros(ts), 3))
+        self.assertEqual([row['id'] for row in rows], [5, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from flask import Flask
+from flask_login import LoginManager, UserMixin, login_user
+
+from replica_routing import ReplicaRouter, replica_engine_options
+
+
+class HungReplica:
+    """Replica engine whose connections block until released"""
+
+    def __init__(self):
+        self.dialect = SimpleNamespace(name='postgresql')
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def connect(self):
+        self.entered.set()
+        self.release.wait(5)
+        raise ConnectionError('replica unreachable')
+
+
+class ReplicaLagTest(unittest.TestCase):
+    def test_hung_check_does_not_block_other_readers(self):
+        replica = HungReplica()
+        router = ReplicaRouter(check_interval=60)
+        router.configure(object(), replica)
+        checker = threading.Thread(target=router.replica_lag)
+        checker.start()
+        self.assertTrue(replica.entered.wait(5))
+
+        started = time.monotonic()
+        self.assertIsNone(router.replica_lag())
+        self.assertFalse(router.replica_usable())
+        self.assertLess(time.monotonic() - started, 1)
+        replica.release.set()
+        checker.join()
+
+    def test_postgres_replica_gets_timeouts(self):
+        options = replica_engine_options('postgresql://replica/health')['connect_args']
+        self.assertIn('connect_timeout', options)
+        self.assertIn('statement_timeout', options['options'])
+        self.assertEqual(replica_engine_options('sqlite:///replica.db'), {})
+
+
+class ReadYourWritesTest(unittest.TestCase):
+    def setUp(self):
+        router = ReplicaRouter()
+        router.configure(object(), object())
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        login_manager = LoginManager(app)
+        login_manager.user_loader(lambda user_id: UserMixin() if user_id == '1' else None)
+        router.init_app(app)
+
+        @app.route('/write', methods=['POST'])
+        def write():
+            router.note_write()
+            return 'ok'
+
+        @app.route('/login', methods=['POST'])
+        def login():
+            user = UserMixin()
+            user.id = '1'
+            login_user(user)
+            return 'ok'
+
+        self.client = app.test_client()
+
+    def test_device_write_sets_no_cookie(self):
+        response = self.client.post('/write')
+        self.assertNotIn('Set-Cookie', response.headers)
+
+    def test_signed_in_write_pins_user(self):
+        self.client.post('/login')
+        with self.client.session_transaction() as session:
+            self.assertNotIn('_primary_until', session)
+        self.client.post('/write')
+        with self.client.session_transaction() as session:
+            self.assertGreater(session['_primary_until'], time.time())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from flask import Flask
+
+from response_cache import DataVersion, ResponseCache
+
+
+class SharedVersion(DataVersion):
+    """Stands in for the Redis counter: bumped by another process, or unreachable"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def current(self):
+        return None if self.down else self.value
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(ttl=60)
+        self.renders = 0
+        self.body = 'v1'
+        app = Flask(__name__)
+        app.secret_key = 'test'
+
+        @app.route('/view')
+        @self.cache.cached()
+        def view():
+            self.renders += 1
+            return self.body
+
+        self.client = app.test_client()
+
+    def test_unchanged_version_is_served_from_cache(self):
+        etag = self.client.get('/view').headers['ETag'].strip('"')
+        self.assertEqual(self.client.get('/view', headers={'If-None-Match': f'"{etag}"'}).status_code, 304)
+        self.assertEqual(self.client.get('/view').data, b'v1')
+        self.assertEqual(self.renders, 1)
+
+    def test_entries_expire_after_ttl(self):
+        # A write in another process never bumps this one's version
+        self.cache.ttl = 0
+        etag = self.client.get('/view').headers['ETag'].strip('"')
+        self.assertEqual(self.client.get('/view', headers={'If-None-Match': f'"{etag}"'}).status_code, 304)
+        self.body = 'v2'
+        response = self.client.get('/view', headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual((response.status_code, response.data), (200, b'v2'))
+        self.assertEqual(self.renders, 3)
+
+    def test_shared_version_bump_and_outage(self):
+        self.cache.version = SharedVersion()
+        self.client.get('/view')
+        self.cache.version.value += 1
+        self.body = 'v2'
+        self.assertEqual(self.client.get('/view').data, b'v2')
+
+        self.cache.version.down = True
+        self.body = 'v3'
+        self.assertEqual(self.client.get('/view').data, b'v3')
+        self.assertEqual(self.client.get('/view').data, b'v3')
+        self.assertEqual(self.renders, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
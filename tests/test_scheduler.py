@@ -0,0 +1,82 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+from scheduler import SCHEDULER_RUN_STALE, Scheduler
+from tests.app_fixtures import app_module
+
+
+def wait_finished(job):
+    deadline = time.monotonic() + 5
+    while job.started is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class SchedulerRunGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module()
+        from database_config import JobRun
+
+        database_service = self.app.database_service
+        db = database_service.SessionLocal()
+        db.execute(delete(JobRun).where(JobRun.job_name == 'guarded'))
+        db.commit()
+        db.close()
+        self.now = datetime(2026, 1, 1, 12, 0)
+        # Two workers that both believe they lead (SQLite has no leader lock)
+        self.old, self.new = (self.scheduler(runner) for runner in ('old-leader', 'new-leader'))
+
+    def scheduler(self, runner):
+        database_service = self.app.database_service
+        scheduler = Scheduler(tick=5)
+        scheduler.runner = runner
+        scheduler.clock = lambda: self.now
+        scheduler.history_writer = database_service.record_job_run
+        scheduler.last_runs = database_service.get_last_job_runs
+        scheduler.run_starter = database_service.start_job_run
+        scheduler.run_heartbeat = database_service.heartbeat_job_runs
+        scheduler._hold_leadership()
+        return scheduler
+
+    def statuses(self):
+        return sorted(run['status'] for run in self.app.database_service.get_job_runs('guarded'))
+
+    def test_successor_waits_for_running_job(self):
+        release = threading.Event()
+        ran = []
+        old_job = self.old.add_job('guarded', lambda: (ran.append('old'), release.wait(5)), every=3600)
+        new_job = self.new.add_job('guarded', lambda: ran.append('new'), every=3600)
+        # The successor's schedule says the job is due, e.g. loaded before the old leader's run was recorded
+        new_job.due = new_job.next_run = self.now
+
+        self.assertEqual(self.old.run_pending(), ['guarded'])
+        self.assertEqual(self.new.run_pending(), [])
+        self.assertEqual(self.statuses(), ['running'])
+
+        # Long past the stale limit, the old worker's heartbeats keep its run alive
+        self.now += timedelta(seconds=SCHEDULER_RUN_STALE * 3)
+        self.old.run_pending()
+        new_job.due = new_job.next_run = self.now
+        self.assertEqual(self.new.run_pending(), [])
+
+        release.set()
+        wait_finished(old_job)
+        self.assertEqual(ran, ['old'])
+        self.assertEqual(self.statuses(), ['success'])
+
+    def test_run_without_heartbeats_is_abandoned(self):
+        new_job = self.new.add_job('guarded', lambda: None, every=3600)
+        self.app.database_service.start_job_run(
+            {'job_name': 'guarded', 'scheduled_for': self.now, 'started_at': self.now, 'runner': 'old-leader'},
+            self.now - timedelta(seconds=SCHEDULER_RUN_STALE))
+        self.now += timedelta(hours=1)
+        self.assertEqual(self.new.run_pending(), ['guarded'])
+        wait_finished(new_job)
+        self.assertEqual(self.statuses(), ['abandoned', 'success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
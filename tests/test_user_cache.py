@@ -0,0 +1,47 @@
+import unittest
+
+from tests.app_fixtures import app_module
+
+
+class UserCacheInvalidationTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module()
+        from database_config import User
+        from user_cache import user_cache
+
+        self.User = User
+        self.user_cache = user_cache
+        self.user_id = self.app.database_service.get_user_by_username('admin')['id']
+        self.addCleanup(user_cache.invalidate, self.user_id)
+
+    def test_role_change_invalidates_on_commit(self):
+        self.user_cache.put(self.user_id, {'id': self.user_id, 'role': 'admin'})
+        db = self.app.database_service.SessionLocal()
+        try:
+            user = db.get(self.User, self.user_id)
+            role = user.role
+            user.role = 'nurse'
+            db.flush()
+            # Not committed yet: a reload now would read the old row
+            self.assertIsNotNone(self.user_cache.get(self.user_id))
+            db.commit()
+            self.assertIsNone(self.user_cache.get(self.user_id))
+            user.role = role
+            db.commit()
+        finally:
+            db.close()
+
+    def test_rolled_back_change_keeps_entry(self):
+        self.user_cache.put(self.user_id, {'id': self.user_id, 'role': 'admin'})
+        db = self.app.database_service.SessionLocal()
+        try:
+            db.get(self.User, self.user_id).role = 'nurse'
+            db.flush()
+            db.rollback()
+        finally:
+            db.close()
+        self.assertIsNotNone(self.user_cache.get(self.user_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from tests.app_fixtures import app_module, logged_in_client
+
+
+class WardValidationTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module()
+        self.client = logged_in_client(self.app)
+
+    def test_bulk_acknowledge_rejects_malformed_wards(self):
+        for wards in ('icu', [1], [None], {'icu': True}, ['icu', '']):
+            response = self.client.post('/api/alerts/acknowledge', json={'alert_type': 'low_battery', 'wards': wards})
+            self.assertEqual(response.status_code, 400, wards)
+        response = self.client.post('/api/alerts/acknowledge', json={'alert_type': 'low_battery', 'wards': ['icu']})
+        self.assertEqual(response.status_code, 200)
+
+    def test_sync_request_rejects_malformed_wards(self):
+        socket = self.app.socketio.test_client(self.app.app, flask_test_client=self.client)
+        for data in ({'wards': 'icu'}, {'wards': [3]}, {'last_seqs': {'icu': 'x'}}, ['icu']):
+            socket.get_received()
+            socket.emit('sync_request', data)
+            self.assertEqual([message['name'] for message in socket.get_received()], ['sync_error'], data)
+        socket.emit('sync_request', {'wards': ['icu'], 'last_seqs': None})
+        self.assertEqual([message['name'] for message in socket.get_received()], ['sync_snapshot'])
+        socket.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main()
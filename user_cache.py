@@ -0,0 +1,98 @@
+"""
+Per-process cache of logged-in users for the Flask-Login user loader.
+
+Entries are read-only snapshots of the dict returned by
+DatabaseService.get_user_by_id, kept for a short TTL with an LRU size cap.
+Changes to a user's password or role made through the ORM invalidate the
+entry as soon as they commit; changes made by another process are picked up when the
+TTL expires.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database_config import User
+from metrics import metrics
+
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+
+# Columns whose change must be visible on the very next request
+SECURITY_COLUMNS = ('password_hash', 'role', 'username', 'email')
+
+
+class UserCache:
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._requests = metrics.registry.counter(
+            'user_cache_requests_total', 'User loader cache lookups', ('result',))
+
+    def get(self, user_id):
+        """Return the cached snapshot for user_id, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self._requests.inc('hit')
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+        self._requests.inc('miss')
+        return None
+
+    def put(self, user_id, user_data):
+        """Store an immutable snapshot of user_data and return it"""
+        snapshot = MappingProxyType(dict(user_data))
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Create global user cache instance
+user_cache = UserCache()
+
+
+# Collect changed users per session and invalidate them only once the transaction commits:
+# invalidating at flush time lets a concurrent request re-cache the old row before the commit
+@event.listens_for(User, 'after_update')
+def _collect_security_change(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in SECURITY_COLUMNS):
+        Session.object_session(target).info.setdefault('user_cache_invalidate', set()).add(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _collect_delete(mapper, connection, target):
+    Session.object_session(target).info.setdefault('user_cache_invalidate', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop('user_cache_invalidate', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('user_cache_invalidate', None)